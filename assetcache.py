@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+
+
+# Shared resources such as the font and the sprite atlas, each built by a
+# loader registered under a name. A state can ask for the next state's assets
+# while it is still running, which builds them on a background thread; once
+# built they are kept for the rest of the session, however often the states
+# switch back and forth. Whatever must not run on that thread, like converting
+# surfaces for the display, goes in the asset's finisher, which runs on the
+# thread that first gets it
+class AssetCache:
+  loaders: dict[str, Callable[[], Any]]
+  finishers: dict[str, Callable[[Any], Any]]
+  # Milliseconds each loader took, wherever it ran
+  load_times: dict[str, float]
+
+  def __init__(self) -> None:
+    self.loaders = {}
+    self.finishers = {}
+    self.load_times = {}
+    self._loaded: dict[str, Any] = {}
+    self._pending: dict[str, Future] = {}
+    self._executor: ThreadPoolExecutor | None = None
+
+  def register(self, name: str, loader: Callable[[], Any],
+               finisher: Callable[[Any], Any] | None = None) -> None:
+    self.loaders[name] = loader
+    if finisher is not None:
+      self.finishers[name] = finisher
+
+  def is_loaded(self, name: str) -> bool:
+    return name in self._loaded
+
+  def preload(self, names: Iterable[str]) -> None:
+    for name in names:
+      if name in self._loaded or name in self._pending:
+        continue
+      if self._executor is None:
+        # Started on first use, so runs that never preload never get the thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="assets")
+      self._pending[name] = self._executor.submit(self._load, name)
+
+  # Waits for a preload still in flight, or loads right here if nobody asked
+  # for the asset before
+  def get(self, name: str) -> Any:
+    if name in self._loaded:
+      return self._loaded[name]
+    future = self._pending.pop(name, None)
+    asset = self._load(name) if future is None else future.result()
+    finisher = self.finishers.get(name)
+    if finisher is not None:
+      start = time.perf_counter()
+      asset = finisher(asset)
+      self.load_times[name] += (time.perf_counter() - start) * 1000.0
+    self._loaded[name] = asset
+    return asset
+
+  def _load(self, name: str) -> Any:
+    start = time.perf_counter()
+    asset = self.loaders[name]()
+    self.load_times[name] = (time.perf_counter() - start) * 1000.0
+    return asset
+
+  def close(self) -> None:
+    if self._executor is not None:
+      self._executor.shutdown(wait=True, cancel_futures=True)
+      self._executor = None
+    self._pending.clear()
@@ -1,22 +1,145 @@
 import pygame
 import random
-from logger import log_event
+from typing import ClassVar
+from eventbus import EventBus
 from circleshape import CircleShape
-from constants import OBJ_LINE_WIDTH, ASTEROID_MIN_RADIUS, ASTEROID_SPEED_SCALE_FACTOR
+from mesh import (
+  Mesh,
+  asteroid_outline,
+  polygon_intersects_circle,
+  circle_time_of_impact,
+  polygon_time_of_impact,
+)
+from constants import (
+  OBJ_LINE_WIDTH,
+  ASTEROID_MIN_RADIUS,
+  ASTEROID_SPEED_SCALE_FACTOR,
+  POLYGON_ASTEROIDS_ENABLED,
+  ASTEROID_SHAPE_VARIANTS,
+  ASTEROID_EDGE_MODE,
+  WORLD_WIDTH,
+  WORLD_HEIGHT,
+  PLAY_AREA_MARGIN,
+)
 
 
 class Asteroid(CircleShape):
+  rng: ClassVar[random.Random] = random.Random()
+  bus: ClassVar[EventBus] = EventBus()
+  # Where asteroids may roam; set by the game
+  play_area: ClassVar[pygame.Rect] = pygame.Rect(0, 0, WORLD_WIDTH, WORLD_HEIGHT).inflate(
+    2 * PLAY_AREA_MARGIN, 2 * PLAY_AREA_MARGIN)
   size: int
+  # Which of the outlines for its size this asteroid has
+  variant: int
+  # None when asteroids are plain circles
+  mesh: Mesh | None
 
   def __init__(self, x: float, y: float, size: int):
     super().__init__(x, y, size * ASTEROID_MIN_RADIUS)
+    self.mesh = None
+    self.set_size(size)
+
+  def set_size(self, size: int) -> None:
     self.size = size
+    if POLYGON_ASTEROIDS_ENABLED:
+      self.variant = self.rng.randrange(ASTEROID_SHAPE_VARIANTS)
+      outline = asteroid_outline(size, self.variant)
+      if self.mesh is None:
+        self.mesh = Mesh(outline)
+      else:
+        self.mesh.set_local(outline)
+    else:
+      self.variant = 0
+    if self.store is not None:
+      self.store.set_size(self.handle, size)
+      self.store.set_shape(self.handle, self.variant)
+
+  # Spawns an asteroid, reusing a dead one from the pool when there is one
+  @classmethod
+  def create(cls, x: float, y: float, size: int) -> "Asteroid":
+    pool = cls.pool
+    asteroid = pool.acquire() if pool is not None else None
+    if asteroid is None:
+      asteroid = cls(x, y, size)
+    else:
+      asteroid.reset(x, y, size * ASTEROID_MIN_RADIUS)
+      asteroid.set_size(size)
+    asteroid.home_pool = pool
+    return asteroid
+
+  def draw_at(self, surface: pygame.Surface, x: float, y: float) -> None:
+    if self.mesh is None:
+      pygame.draw.circle(surface, "white", (x, y), self.radius, OBJ_LINE_WIDTH)
+    else:
+      pygame.draw.polygon(surface, "white", self.mesh.transform(x, y), OBJ_LINE_WIDTH)
+
+  def get_blit(self, atlas, alpha=1.0):
+    return atlas.asteroid(self.size, self.variant, self.get_screen_position(alpha))
+
+  # The bounding circles touching is only the broad test for a polygon. The
+  # other shape is always tested as a circle, in the asteroid's own space
+  def collides_with(self, other: CircleShape) -> bool:
+    if not super().collides_with(other):
+      return False
+    if self.mesh is None:
+      return True
+    x, y = self.position
+    other_x, other_y = other.position
+    return self.outline_touches(other_x - x, other_y - y, other.radius)
+
+  # The narrow test once the bounding circles touch, for a circle at (x, y)
+  # relative to the asteroid
+  def outline_touches(self, x: float, y: float, radius: float) -> bool:
+    return self.mesh is None or polygon_intersects_circle(self.mesh.local, x, y, radius)
 
-  def draw(self, surface: pygame.Surface):
-    pygame.draw.circle(surface, "white", self.position, self.radius, OBJ_LINE_WIDTH)
+  # Asteroids never turn, so in the asteroid's own space the other shape's
+  # path is still a straight line
+  def time_of_impact(self, other: CircleShape) -> float | None:
+    motion = self.get_relative_motion(other)
+    t = circle_time_of_impact(*motion, self.radius + other.radius)
+    if t is None:
+      return t
+    return self.outline_time_of_impact(t, *motion, other.radius)
+
+  # The narrow test once the bounding circles touch at `t`, for a circle
+  # moving as get_relative_motion() has it
+  def outline_time_of_impact(self, t: float, x: float, y: float, dx: float, dy: float,
+                             radius: float) -> float | None:
+    if self.mesh is None:
+      return t
+    return polygon_time_of_impact(self.mesh.local, x, y, dx, dy, radius)
 
   def update(self, dt):
     self.position += self.velocity * dt
+    if not self.play_area.collidepoint(self.position):
+      self.leave_play_area()
+
+  # Store-backed asteroids are checked by the game, all at once
+  def leave_play_area(self) -> None:
+    if ASTEROID_EDGE_MODE != "wrap":
+      self.despawn()
+      return
+    area = self.play_area
+    x, y = self.position
+    self.shift((x - area.left) % area.width + area.left - x,
+               (y - area.top) % area.height + area.top - y)
+
+  # Leaves without being destroyed, so nothing counts it as shot down
+  def despawn(self) -> None:
+    self.bus.publish("asteroid_despawned")
+    self.kill()
+
+  # Out of the groups the game updates, collides and draws, and into `dormant`
+  def fall_asleep(self, dormant: pygame.sprite.AbstractGroup) -> None:
+    self.remove(*self.containers)
+    dormant.add(self)
+
+  def wake_up(self, dormant: pygame.sprite.AbstractGroup) -> None:
+    dormant.remove(self)
+    self.add(*self.containers)
+    # Its previous position is as old as its last update
+    self.save_previous()
 
   def take_damage(self):
     if self.size > 1:
@@ -25,19 +148,20 @@ class Asteroid(CircleShape):
       self.die()
 
   def die(self):
-    log_event("asteroid_died")
+    x, y = self.position
+    self.bus.publish("asteroid_died", x=x, y=y, size=self.size)
     self.kill()
 
   def split(self):
-    log_event("asteroid_split")
+    x, y = self.position
+    self.bus.publish("asteroid_split", x=x, y=y, size=self.size)
     self.kill()
 
-    x, y = self.position
-    angle = random.uniform(20, 50)
+    angle = self.rng.uniform(20, 50)
     l_vel = self.velocity.rotate(angle) * ASTEROID_SPEED_SCALE_FACTOR
     r_vel = self.velocity.rotate(-angle) * ASTEROID_SPEED_SCALE_FACTOR
     size = self.size - 1
-    l_child = Asteroid(x, y, size)
-    r_child = Asteroid(x, y, size)
+    l_child = Asteroid.create(x, y, size)
+    r_child = Asteroid.create(x, y, size)
     l_child.velocity = l_vel
     r_child.velocity = r_vel
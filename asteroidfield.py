@@ -8,8 +8,18 @@ from collections.abc import Callable
 
 class AsteroidField(pygame.sprite.Sprite):
   containers: ClassVar[tuple] = ()
+  rng: ClassVar[random.Random] = random.Random()
+  # Every live entity between them, counted against ENTITY_BUDGET; set by the game
+  entities: ClassVar[tuple[pygame.sprite.AbstractGroup, ...]] = ()
+  # The camera view; asteroids come in from just outside it
+  view: ClassVar[pygame.Rect] = pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+  # Seconds between spawns; longer while the game is short on frame time
+  spawn_interval: ClassVar[float] = ASTEROID_SPAWN_RATE_SECONDS
   spawn_timer: float
+  # Spawns left out because the entity budget was reached
+  skipped_spawns: int
 
+  # Inward direction and spawn point along each side, relative to the view
   edges: list[tuple[pygame.Vector2, Callable[[float], pygame.Vector2]]] = [
     (
       pygame.Vector2(1, 0),
@@ -36,21 +46,28 @@ class AsteroidField(pygame.sprite.Sprite):
   def __init__(self):
     pygame.sprite.Sprite.__init__(self, self.containers) # type: ignore
     self.spawn_timer = 0.0
+    self.skipped_spawns = 0
 
   def spawn(self, size: int, position: pygame.Vector2, velocity: pygame.Vector2):
-    asteroid = Asteroid(position.x, position.y, size)
+    asteroid = Asteroid.create(position.x, position.y, size)
     asteroid.velocity = velocity
 
   def update(self, dt: float):
     self.spawn_timer += dt
 
-    if self.spawn_timer > ASTEROID_SPAWN_RATE_SECONDS:
-      self.spawn_timer -= ASTEROID_SPAWN_RATE_SECONDS
-      
-      edge = random.choice(self.edges)
-      speed = float(random.randint(40, 100))
+    if self.spawn_timer > self.spawn_interval:
+      self.spawn_timer -= self.spawn_interval
+      if sum(len(group) for group in self.entities) >= ENTITY_BUDGET:
+        # Dropped rather than deferred, so a backlog can't pour in at once
+        # the moment the count falls below the budget
+        self.skipped_spawns += 1
+        return
+
+      edge = self.rng.choice(self.edges)
+      speed = float(self.rng.randint(40, 100))
       velocity = edge[0] * speed
-      velocity = velocity.rotate(random.randint(-30, 30))
-      position = edge[1](random.uniform(0, 1))
-      size = random.randint(1, ASTEROID_SIZES)
+      velocity = velocity.rotate(self.rng.randint(-30, 30))
+      position = edge[1](self.rng.uniform(0, 1))
+      position += self.view.topleft
+      size = self.rng.randint(1, ASTEROID_SIZES)
       self.spawn(size, position, velocity)
@@ -0,0 +1,111 @@
+import io
+import sys
+import argparse
+import itertools
+import contextlib
+from typing import Any
+
+from main import Game
+from inputstate import Controls
+from constants import HEADLESS_DT
+
+DEFAULT_SEEDS = 4
+DEFAULT_STEPS = 2000
+# Long steps too, where bullets run out and hit things mid step
+STEP_RATES = (1 / HEADLESS_DT, 20)
+# Held FRAMES_PER_CONTROL frames each, round and round. Always shooting, so
+# bullets keep running out and the hero keeps firing again. Picked by frame
+# alone, so a difference in one game can't steer the other one away from it
+CONTROL_CYCLE = (
+  Controls.FORWARD | Controls.SHOOT,
+  Controls.LEFT | Controls.SHOOT,
+  Controls.BACKWARD | Controls.SHOOT,
+  Controls.RIGHT | Controls.SHOOT,
+  Controls.SHOOT,
+)
+FRAMES_PER_CONTROL = 40
+
+
+class CycleInput:
+  def __init__(self, game: Game) -> None:
+    self.game = game
+
+  def sample(self) -> Controls:
+    return CONTROL_CYCLE[self.game.frame // FRAMES_PER_CONTROL % len(CONTROL_CYCLE)]
+
+
+# What one step left behind. Sprite and store games wake dormant asteroids on
+# different schedules, so which asteroids are awake, and where sleeping sprite
+# ones are, only line up with dormancy off
+def fingerprint(game: Game) -> dict[str, Any]:
+  game.bind()
+  hero = game.hero
+  state = {
+    "running": game.running,
+    "hero": (tuple(hero.position), hero.rotation),
+    "bullets in flight": hero.bullet_count,
+    "bullets": sorted(tuple(bullet.position) for bullet in game.bullets),
+  }
+  if not game.dormant_enabled:
+    state["asteroids"] = sorted((tuple(asteroid.position), asteroid.radius)
+                                for asteroid in game.asteroids)
+  return state
+
+
+# Plays `seed` on sprites and on the entity store side by side and returns
+# where they first differ, or None if they never do
+def compare_backends(seed: int, dt: float, swept: bool, dormant: bool, steps: int) -> str | None:
+  games = []
+  for entity_store in (False, True):
+    # Every Game announces itself on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+      game = Game(entity_store=entity_store, headless=True, seed=seed, fixed_dt=dt)
+    game.swept_collisions_enabled = swept
+    game.dormant_enabled = dormant
+    game.input_source = CycleInput(game)
+    game.running = True
+    games.append(game)
+
+  sprites, store = games
+  try:
+    for _ in range(steps):
+      for game in games:
+        game.bind()
+        game.step(game.step_dt)
+      expected, actual = fingerprint(sprites), fingerprint(store)
+      for name, value in expected.items():
+        if actual[name] != value:
+          return f"frame {sprites.frame}: {name} {value} on sprites, {actual[name]} on the store"
+      if not sprites.running:
+        break
+    return None
+  finally:
+    for game in games:
+      game.close_logs()
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(
+    description="Play seeded headless Blasteroids sessions on sprites and on the entity "
+                "store side by side and check they stay the same step for step")
+  parser.add_argument("--seeds", type=int, default=DEFAULT_SEEDS,
+                      help="sessions per setting, seeded 0, 1, ...")
+  parser.add_argument("--steps", type=int, default=DEFAULT_STEPS,
+                      help="simulation steps after which a session that is still alive ends")
+  args = parser.parse_args()
+
+  failures = 0
+  for seed, rate, swept, dormant in itertools.product(range(args.seeds), STEP_RATES,
+                                                      (True, False), (False, True)):
+    difference = compare_backends(seed, 1 / rate, swept, dormant, args.steps)
+    setting = f"seed {seed} at {rate:g} steps/s, swept={swept} dormant={dormant}"
+    if difference is None:
+      print(f"same     {setting}")
+    else:
+      failures += 1
+      print(f"DIFFERS  {setting}: {difference}")
+  return 1 if failures else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,329 @@
+import io
+import os
+import sys
+import json
+import time
+import math
+import random
+import argparse
+import itertools
+import statistics
+import contextlib
+import multiprocessing
+from pathlib import Path
+from typing import Any, Callable, Iterator, NamedTuple
+
+import constants
+from inputstate import Controls
+
+# Long enough for most sessions to end in a hit: one minute at the headless step
+DEFAULT_STEPS = 3600
+DEFAULT_RUNS = 100
+BATCH_SEED = 1
+# Runs handed to a worker at a time; small enough to keep every core busy
+# near the end of a batch, big enough that the pipe isn't the bottleneck
+CHUNK_SIZE = 4
+
+# Asteroids whose edge comes closer than this to the hero's make the bot back off
+BOT_DANGER_DISTANCE = 120
+# Degrees off the target heading the bot still fires at
+BOT_AIM_TOLERANCE = 8
+
+
+# One headless session: which seed, which constants changed, and how long to
+# let it run if the hero never gets hit
+class RunSpec(NamedTuple):
+  run_id: int
+  seed: int
+  overrides: dict[str, Any]
+  max_steps: int
+
+
+class RunResult(NamedTuple):
+  run_id: int
+  seed: int
+  overrides: dict[str, Any]
+  steps: int
+  survival_s: float
+  survived: bool
+  asteroids_shot: int
+  asteroids_destroyed: int
+  step_ms_mean: float
+  step_ms_p95: float
+
+
+# Stands in for the keyboard: turns toward the nearest asteroid, fires once
+# lined up and backs off when it gets too close. Its choices only depend on
+# the game state and its own RNG, so a seed still pins down the whole run
+class SteeringBot:
+  def __init__(self, game: Any, seed: int) -> None:
+    self.game = game
+    self.rng = random.Random(seed)
+
+  def sample(self) -> Controls:
+    hero = self.game.hero
+    nearest = None
+    nearest_distance = math.inf
+    for asteroid in self.game.asteroids:
+      distance = hero.position.distance_to(asteroid.position) - asteroid.radius
+      if distance < nearest_distance:
+        nearest, nearest_distance = asteroid, distance
+    if nearest is None:
+      return Controls.NONE
+
+    offset = nearest.position - hero.position
+    heading = hero.get_forward().angle_to(offset)
+    heading = (heading + 180) % 360 - 180
+    controls = Controls.RIGHT if heading > 0 else Controls.LEFT
+    if abs(heading) < BOT_AIM_TOLERANCE:
+      controls = Controls.SHOOT
+    if nearest_distance < BOT_DANGER_DISTANCE + hero.radius:
+      controls |= Controls.BACKWARD
+    elif self.rng.random() < 0.05:
+      controls |= Controls.FORWARD
+    return controls
+
+
+# Modules pull constants in with `from constants import ...`, so changing the
+# constants module alone would not reach them. Every loaded module still
+# holding the original value gets the override, and the originals come back
+# afterwards so the next run in the same worker starts clean. Constants derived
+# from others at import time (e.g. ASTEROID_MAX_RADIUS) are not recomputed;
+# override them explicitly if needed
+@contextlib.contextmanager
+def constant_overrides(overrides: dict[str, Any]) -> Iterator[None]:
+  patched = []
+  try:
+    for name, value in overrides.items():
+      if not hasattr(constants, name):
+        raise KeyError(f"constants has no {name}")
+      original = getattr(constants, name)
+      for module in list(sys.modules.values()):
+        namespace = getattr(module, "__dict__", None)
+        if namespace is not None and namespace.get(name, value) is original:
+          namespace[name] = value
+          patched.append((namespace, name, original))
+    yield
+  finally:
+    for namespace, name, original in reversed(patched):
+      namespace[name] = original
+
+
+def init_worker() -> None:
+  # SDL turns SIGTERM into a quit event that nothing here reads, which would
+  # leave the pool unable to stop its workers
+  os.environ["SDL_NO_SIGNAL_HANDLERS"] = "1"
+  # Game prints a banner per instance, which would drown the progress output
+  sys.stdout = open(os.devnull, "w")
+  # Imported once per worker, before any overrides are applied
+  import main  # noqa: F401
+
+
+def run_session(spec: RunSpec) -> RunResult:
+  from main import Game
+  with constant_overrides(spec.overrides):
+    game = Game(headless=True, seed=spec.seed)
+    game.input_source = SteeringBot(game, spec.seed)
+    counts = {"asteroid_shot": 0, "asteroid_died": 0}
+
+    def counter(event_type: str) -> Callable[..., None]:
+      def listener(**details: Any) -> None:
+        counts[event_type] += 1
+      return listener
+
+    for event_type in counts:
+      game.bus.subscribe(event_type, counter(event_type))
+
+    # Stepping directly skips drawing, which a tuning run never looks at
+    step_times = []
+    game.running = True
+    while game.running and game.frame < spec.max_steps:
+      start = time.perf_counter()
+      game.step(game.step_dt)
+      step_times.append((time.perf_counter() - start) * 1000.0)
+    game.close_logs()
+
+  return RunResult(
+    run_id=spec.run_id,
+    seed=spec.seed,
+    overrides=spec.overrides,
+    steps=game.frame,
+    survival_s=game.frame * game.step_dt,
+    survived=game.running,
+    asteroids_shot=counts["asteroid_shot"],
+    asteroids_destroyed=counts["asteroid_died"],
+    step_ms_mean=statistics.fmean(step_times) if step_times else 0.0,
+    step_ms_p95=percentile(sorted(step_times), 0.95),
+  )
+
+
+# Every combination of the swept values, each run with the same seeds so the
+# parameter sets are compared on the same asteroid fields
+def build_specs(grid: dict[str, list[Any]], runs: int, steps: int, base_seed: int) -> list[RunSpec]:
+  names = list(grid)
+  specs = []
+  for values in itertools.product(*(grid[name] for name in names)):
+    overrides = dict(zip(names, values))
+    for i in range(runs):
+      specs.append(RunSpec(len(specs), base_seed + i, overrides, steps))
+  return specs
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+  if not ordered:
+    return 0.0
+  last = len(ordered) - 1
+  return ordered[min(last, int(round(fraction * last)))]
+
+
+# Collects results as they arrive, in whatever order the workers finish, and
+# optionally streams each one to a JSONL file so a long batch can be watched
+# or cut short without losing what already ran
+class Aggregator:
+  groups: dict[str, list[RunResult]]
+  completed: int
+
+  def __init__(self, out_path: str | None = None) -> None:
+    self.groups = {}
+    self.completed = 0
+    self._file = open(out_path, "w") if out_path is not None else None
+
+  @staticmethod
+  def key(overrides: dict[str, Any]) -> str:
+    if not overrides:
+      return "defaults"
+    return " ".join(f"{name}={value}" for name, value in overrides.items())
+
+  def add(self, result: RunResult) -> None:
+    self.groups.setdefault(self.key(result.overrides), []).append(result)
+    self.completed += 1
+    if self._file is not None:
+      self._file.write(json.dumps(result._asdict()) + "\n")
+
+  def close(self) -> None:
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+  def summary(self) -> dict[str, dict[str, Any]]:
+    summary = {}
+    for key, results in self.groups.items():
+      survival = sorted(result.survival_s for result in results)
+      step_ms = sorted(result.step_ms_p95 for result in results)
+      summary[key] = {
+        "overrides": results[0].overrides,
+        "runs": len(results),
+        "survived": sum(result.survived for result in results) / len(results),
+        "survival_s_mean": statistics.fmean(survival),
+        "survival_s_p10": percentile(survival, 0.10),
+        "survival_s_p50": percentile(survival, 0.50),
+        "survival_s_p90": percentile(survival, 0.90),
+        "asteroids_shot_mean": statistics.fmean(result.asteroids_shot for result in results),
+        "asteroids_destroyed_mean": statistics.fmean(result.asteroids_destroyed for result in results),
+        "step_ms_mean": statistics.fmean(result.step_ms_mean for result in results),
+        "step_ms_p95": percentile(step_ms, 0.95),
+      }
+    return summary
+
+
+def format_summary(summary: dict[str, dict[str, Any]]) -> list[str]:
+  width = max([len(key) for key in summary] + [10])
+  lines = [f"{'parameters':<{width}} {'runs':>5} {'alive':>6} {'surv p10':>9} {'p50':>7} "
+           f"{'p90':>7} {'shot':>7} {'destr':>7} {'step ms':>8} {'p95':>7}"]
+  for key, stats in summary.items():
+    lines.append(f"{key:<{width}} {stats['runs']:>5} {stats['survived']:>6.0%} "
+                 f"{stats['survival_s_p10']:>8.1f}s {stats['survival_s_p50']:>6.1f}s "
+                 f"{stats['survival_s_p90']:>6.1f}s {stats['asteroids_shot_mean']:>7.1f} "
+                 f"{stats['asteroids_destroyed_mean']:>7.1f} {stats['step_ms_mean']:>8.3f} "
+                 f"{stats['step_ms_p95']:>7.3f}")
+  return lines
+
+
+# Workers are whole processes, so sessions never share the Game class
+# attributes and throughput grows with the number of cores
+def run_batch(specs: list[RunSpec], workers: int, aggregator: Aggregator,
+              progress: bool = True) -> float:
+  start = time.perf_counter()
+
+  def collect(result: RunResult) -> None:
+    aggregator.add(result)
+    if progress:
+      print(f"\r{aggregator.completed}/{len(specs)} runs", end="", flush=True)
+
+  if workers == 1:
+    # In process, which is easier to debug and profile
+    for spec in specs:
+      with contextlib.redirect_stdout(io.StringIO()):
+        result = run_session(spec)
+      collect(result)
+  else:
+    with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+      for result in pool.imap_unordered(run_session, specs, chunksize=CHUNK_SIZE):
+        collect(result)
+  if progress:
+    print()
+  return time.perf_counter() - start
+
+
+def parse_value(text: str) -> Any:
+  try:
+    return json.loads(text)
+  except json.JSONDecodeError:
+    return text
+
+
+def parse_sweep(items: list[str]) -> dict[str, list[Any]]:
+  grid = {}
+  for item in items:
+    name, _, values = item.partition("=")
+    if not values:
+      raise argparse.ArgumentTypeError(f"expected NAME=VALUE[,VALUE...], got {item!r}")
+    grid[name] = [parse_value(value) for value in values.split(",")]
+  return grid
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="Run many headless Blasteroids sessions across a process pool, "
+                "played by a simple bot, to compare values in constants.py")
+  parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                      help="sessions per parameter set, seeded --seed, --seed + 1, ...")
+  parser.add_argument("--steps", type=int, default=DEFAULT_STEPS,
+                      help="simulation steps after which a session that is still alive ends")
+  parser.add_argument("--set", dest="sweep", metavar="NAME=V1,V2", action="append", default=[],
+                      help="constant to override; several values sweep it, several --set "
+                           "options sweep every combination")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                      help="worker processes (default: one per core)")
+  parser.add_argument("--seed", type=int, default=BATCH_SEED, help="seed of the first run")
+  parser.add_argument("--out", metavar="PATH", default=None,
+                      help="write every run's result to this JSONL file as it finishes")
+  parser.add_argument("--summary", metavar="PATH", default=None,
+                      help="write the per-parameter-set summary to this JSON file")
+  args = parser.parse_args()
+
+  try:
+    grid = parse_sweep(args.sweep)
+  except argparse.ArgumentTypeError as error:
+    parser.error(str(error))
+  for name in grid:
+    if not hasattr(constants, name):
+      parser.error(f"constants has no {name}")
+
+  specs = build_specs(grid, args.runs, args.steps, args.seed)
+  print(f"{len(specs)} runs on {args.workers} workers")
+  aggregator = Aggregator(args.out)
+  try:
+    elapsed = run_batch(specs, args.workers, aggregator)
+  finally:
+    aggregator.close()
+
+  summary = aggregator.summary()
+  print("\n".join(format_summary(summary)))
+  print(f"{len(specs)} runs in {elapsed:.1f} s ({len(specs) / max(elapsed, 1e-9):.1f} runs/s)")
+  if args.summary is not None:
+    Path(args.summary).write_text(json.dumps(summary, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+  main()
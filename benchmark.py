@@ -0,0 +1,518 @@
+import io
+import sys
+import json
+import time
+import argparse
+import importlib.util
+import hashlib
+import platform
+import statistics
+import contextlib
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import pygame
+
+from main import Game
+from asteroid import Asteroid
+from bullet import Bullet
+from inputstate import ReplayInput
+from vectorfont import VectorFont, CompiledFont, TextStyle, COMPILED_SUFFIX
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, WORLD_WIDTH, WORLD_HEIGHT, HEADLESS_DT
+
+PHASES = ("update", "collision", "draw")
+
+DEFAULT_FRAMES = 120
+DEFAULT_ALLOC_FRAMES = 10
+DEFAULT_TOLERANCE = 0.15
+# Differences smaller than this are noise no matter what the ratio says
+REGRESSION_FLOOR_MS = 0.05
+
+BENCH_SEED = 1234
+
+FONT_PATH = Path(__file__).with_name("mainfont.json")
+FONT_REPEATS = 20
+
+
+# A scripted workload. `setup` populates a fresh headless game and `before_frame`
+# runs outside the timed phases to keep the workload steady (e.g. refilling
+# asteroids that were shot down). `draw` is the timed draw phase. Timing stops
+# early once `finished` says there is nothing left to play
+class Scenario:
+  name: str = ""
+  description: str = ""
+  entity_store: bool = False
+  # Headless games have no particle system of their own
+  particles: bool = False
+  dirty_rects: bool = False
+  draw_mode: str = "vector"
+  # The camera follows the hero every step, as in play, instead of staying on
+  # the top left screen of the world
+  follow_hero: bool = False
+  seed: int = BENCH_SEED
+  # Overrides --dt, e.g. to match the step a session was recorded with
+  dt: float | None = None
+
+  def setup(self, game: Game) -> None:
+    pass
+
+  def before_frame(self, game: Game, frame: int) -> None:
+    pass
+
+  def draw(self, game: Game) -> None:
+    game.draw()
+
+  def finished(self, game: Game) -> bool:
+    return False
+
+
+def park_hero(game: Game) -> None:
+  # The hero takes part in the collision phase but dying would end the game
+  game.hero.position = pygame.Vector2(-10 * SCREEN_WIDTH, -10 * SCREEN_HEIGHT)
+
+
+def random_asteroid(game: Game, size: int | None = None,
+                    width: float = SCREEN_WIDTH, height: float = SCREEN_HEIGHT) -> Asteroid:
+  rng = game.rng
+  asteroid = Asteroid.create(rng.uniform(0, width), rng.uniform(0, height),
+                      rng.randint(1, 3) if size is None else size)
+  asteroid.velocity = pygame.Vector2(rng.uniform(40, 100), 0).rotate(rng.uniform(0, 360))
+  return asteroid
+
+
+class DenseField(Scenario):
+  name = "dense_field"
+  description = "5000 drifting asteroids, no bullets"
+  count = 5000
+
+  def setup(self, game: Game) -> None:
+    park_hero(game)
+    for _ in range(self.count):
+      random_asteroid(game)
+
+
+class DenseFieldStore(DenseField):
+  name = "dense_field_store"
+  description = "5000 drifting asteroids on the NumPy entity store"
+  entity_store = True
+
+
+class DenseFieldAtlas(DenseField):
+  name = "dense_field_atlas"
+  description = "the dense_field asteroids blitted from the sprite atlas"
+  draw_mode = "atlas"
+
+
+class DenseFieldStoreAtlas(DenseFieldStore):
+  name = "dense_field_store_atlas"
+  description = "the dense_field_store asteroids blitted from the sprite atlas"
+  draw_mode = "atlas"
+
+
+class SparseField(Scenario):
+  name = "sparse_field"
+  description = "10 drifting asteroids on an otherwise empty screen, like normal play"
+  count = 10
+
+  def setup(self, game: Game) -> None:
+    park_hero(game)
+    for _ in range(self.count):
+      random_asteroid(game)
+
+
+class SparseFieldDirty(SparseField):
+  name = "sparse_field_dirty"
+  description = "the sparse_field screen cleared and presented with dirty rects"
+  dirty_rects = True
+
+
+class BulletStorm(Scenario):
+  name = "bullet_storm"
+  description = "1000 asteroids and a steady 2000 bullets flying through them"
+  asteroid_count = 1000
+  bullet_count = 2000
+
+  def setup(self, game: Game) -> None:
+    park_hero(game)
+    for _ in range(self.asteroid_count):
+      random_asteroid(game)
+
+  def before_frame(self, game: Game, frame: int) -> None:
+    rng = game.rng
+    while len(game.asteroids) < self.asteroid_count:
+      random_asteroid(game)
+    while len(game.bullets) < self.bullet_count:
+      bullet = Bullet.create(rng.uniform(0, SCREEN_WIDTH), rng.uniform(0, SCREEN_HEIGHT),
+                      game.hero.bullet_died)
+      bullet.velocity = pygame.Vector2(500, 0).rotate(rng.uniform(0, 360))
+
+
+# Asteroids everywhere in the world, viewed from its middle. Only the few
+# hundred near the view are collided and drawn; the rest are dormant
+class HugeWorld(Scenario):
+  name = "huge_world"
+  description = "20000 asteroids spread over the whole world, the camera in its center"
+  count = 20000
+
+  def setup(self, game: Game) -> None:
+    park_hero(game)
+    game.camera.jump_to(*game.world.center)
+    for _ in range(self.count):
+      random_asteroid(game, width=WORLD_WIDTH, height=WORLD_HEIGHT)
+
+
+class HugeWorldStore(HugeWorld):
+  name = "huge_world_store"
+  description = "the huge_world asteroids on the NumPy entity store, blitted from the atlas"
+  entity_store = True
+  draw_mode = "atlas"
+
+
+class MassSplit(Scenario):
+  name = "mass_split"
+  description = "200 bullets placed on large asteroids every frame, splitting them all"
+  asteroid_count = 2000
+  hits_per_frame = 200
+
+  def setup(self, game: Game) -> None:
+    park_hero(game)
+
+  def before_frame(self, game: Game, frame: int) -> None:
+    while len(game.asteroids) < self.asteroid_count:
+      random_asteroid(game, size=3)
+
+    targets = [asteroid for asteroid in game.asteroids if asteroid.size > 1]
+    for asteroid in targets[:self.hits_per_frame]:
+      Bullet.create(asteroid.position.x, asteroid.position.y, game.hero.bullet_died)
+
+
+# Bursts of debris all over the screen, enough of them to keep `target`
+# particles alive at any time
+class ParticleStorm(Scenario):
+  name = "particle_storm"
+  description = "30000 live explosion particles over 100 drifting asteroids"
+  particles = True
+  asteroid_count = 100
+  target = 30000
+
+  def setup(self, game: Game) -> None:
+    from particles import ParticleSystem
+    park_hero(game)
+    game.particles = ParticleSystem(seed=self.seed)
+    for _ in range(self.asteroid_count):
+      random_asteroid(game)
+
+  def before_frame(self, game: Game, frame: int) -> None:
+    rng = game.rng
+    while len(game.particles) < self.target:
+      game.particles.explode(rng.uniform(0, SCREEN_WIDTH), rng.uniform(0, SCREEN_HEIGHT), 3)
+
+
+class TextHeavy(Scenario):
+  name = "text_heavy"
+  description = "a screen full of VectorFont text redrawn every frame"
+  lines = 40
+
+  def setup(self, game: Game) -> None:
+    park_hero(game)
+    style = game.font.default_style
+    self.style = TextStyle(size=12, aspect=0.75, weight=1, oblique=0.2,
+                           spacing=pygame.Vector2(3, 4), color=style.color)
+    self.text = "".join(chr(code) for code in range(33, 127))
+
+  def draw(self, game: Game) -> None:
+    game.surface.fill("black")
+    line_height = self.style.size + self.style.spacing.y
+    for i in range(self.lines):
+      pos = pygame.Vector2(4, 4 + i * line_height)
+      game.font.text(self.text, pos, self.style)
+
+
+class TextHeavyUncached(TextHeavy):
+  name = "text_heavy_uncached"
+  description = "the text_heavy screen drawn stroke by stroke, bypassing the text cache"
+
+  def setup(self, game: Game) -> None:
+    super().setup(game)
+    game.font.cache = None
+
+
+# A recorded play session (see main.py --record-input) fed back through the
+# hero's controls, under the seed and timestep it was recorded with
+class Replay(Scenario):
+  name = "replay"
+  # The field spawns around the view, so it has to be where it was in play
+  follow_hero = True
+
+  def __init__(self, path: Path) -> None:
+    self.path = path
+    self.source = ReplayInput(str(path))
+    self.seed = self.source.seed
+    self.dt = self.source.step_dt
+    self.description = f"{len(self.source)} steps of input replayed from {path}"
+
+  def setup(self, game: Game) -> None:
+    # As run() would; a hit stops it again
+    game.running = True
+
+  def before_frame(self, game: Game, frame: int) -> None:
+    game.hero.controls = self.source.sample()
+
+  # Out of input, or the hero was hit and the session ended there
+  def finished(self, game: Game) -> bool:
+    return self.source.finished or not game.running
+
+
+SCENARIOS: dict[str, Callable[[], Scenario]] = {
+  scenario.name: scenario for scenario in (
+    DenseField, DenseFieldStore, DenseFieldAtlas, DenseFieldStoreAtlas, SparseField, SparseFieldDirty, BulletStorm, MassSplit, ParticleStorm, TextHeavy, TextHeavyUncached,
+    HugeWorld, HugeWorldStore,
+  )
+  # The store and particle scenarios need the optional numpy dependency
+  if not (scenario.entity_store or scenario.particles)
+  or importlib.util.find_spec("numpy") is not None
+}
+
+
+def make_game(scenario: Scenario) -> Game:
+  with contextlib.redirect_stdout(io.StringIO()):
+    game = Game(entity_store=scenario.entity_store, headless=True, seed=scenario.seed)
+  game.dirty_rects_enabled = scenario.dirty_rects
+  game.draw_mode = scenario.draw_mode
+  if not scenario.follow_hero:
+    # Scenarios fill the top left screen of the world unless they move the camera
+    game.camera.jump_to(SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2)
+  scenario.setup(game)
+  return game
+
+
+def run_phases(game: Game, scenario: Scenario, dt: float) -> list[Callable[[], None]]:
+  if scenario.dt is not None:
+    dt = scenario.dt
+  def update() -> None:
+    # As Game.step() does, so swept collisions see a single step's motion
+    if game.wants_previous():
+      game.save_previous()
+    game.update_entities(dt)
+    if scenario.follow_hero:
+      game.follow_hero()
+
+  return [
+    update,
+    game.check_collisions,
+    lambda: scenario.draw(game),
+  ]
+
+
+def time_scenario(scenario: Scenario, frames: int, dt: float) -> tuple[dict[str, list[float]], dict]:
+  game = make_game(scenario)
+  phases = run_phases(game, scenario, dt)
+  samples: dict[str, list[float]] = {phase: [] for phase in PHASES}
+  clock = time.perf_counter_ns
+
+  for frame in range(frames):
+    if scenario.finished(game):
+      break
+    scenario.before_frame(game, frame)
+    for name, phase in zip(PHASES, phases):
+      start = clock()
+      phase()
+      samples[name].append((clock() - start) / 1e6)
+
+  samples["entities"] = [len(game.drawables)]
+  return samples, game.get_pool_stats()
+
+
+# Run separately from the timing pass because tracing allocations slows
+# everything down. Peak is the most memory a phase had live at once on top of
+# what was there before it started; net is what it left behind
+def trace_scenario(scenario: Scenario, frames: int, dt: float) -> dict[str, dict[str, float]]:
+  game = make_game(scenario)
+  phases = run_phases(game, scenario, dt)
+  peak = {phase: 0 for phase in PHASES}
+  net = {phase: 0 for phase in PHASES}
+
+  tracemalloc.start()
+  try:
+    for frame in range(frames):
+      if scenario.finished(game):
+        break
+      scenario.before_frame(game, frame)
+      for name, phase in zip(PHASES, phases):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        phase()
+        after, phase_peak = tracemalloc.get_traced_memory()
+        peak[name] = max(peak[name], phase_peak - before)
+        net[name] += after - before
+  finally:
+    tracemalloc.stop()
+
+  return {
+    phase: {
+      "alloc_peak_kib": round(peak[phase] / 1024, 2),
+      "alloc_net_kib_per_frame": round(net[phase] / 1024 / max(frames, 1), 2),
+    }
+    for phase in PHASES
+  }
+
+
+# Font startup the old way (parse the JSON and build every stroke) against a
+# warm load from the compiled font. Both include reading and hashing the source
+def time_font_startup(repeats: int) -> dict[str, float]:
+  with contextlib.redirect_stdout(io.StringIO()):
+    font = VectorFont(pygame.Surface((1, 1)), "bench", FONT_PATH.name)
+  compiled_path = FONT_PATH.with_suffix(COMPILED_SUFFIX)
+
+  def from_json() -> None:
+    source = FONT_PATH.read_bytes()
+    hashlib.sha256(source).digest()
+    font.glyphs = {}
+    font.create_glyphs(json.loads(source))
+
+  def from_compiled() -> None:
+    source = FONT_PATH.read_bytes()
+    CompiledFont.load(compiled_path, hashlib.sha256(source).digest())
+
+  timings = {}
+  for name, load in (("json_ms", from_json), ("compiled_ms", from_compiled)):
+    samples = []
+    for _ in range(repeats):
+      start = time.perf_counter_ns()
+      load()
+      samples.append((time.perf_counter_ns() - start) / 1e6)
+    timings[name] = round(statistics.median(samples), 4)
+  timings["speedup"] = round(timings["json_ms"] / max(timings["compiled_ms"], 1e-6), 1)
+  return timings
+
+
+def percentile(values: list[float], fraction: float) -> float:
+  ordered = sorted(values)
+  index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+  return ordered[index]
+
+
+def summarize(samples: dict[str, list[float]], allocations: dict[str, dict[str, float]],
+              pools: dict) -> dict:
+  phases = {}
+  for phase in PHASES:
+    values = samples[phase]
+    phases[phase] = {
+      "mean_ms": round(statistics.fmean(values), 4),
+      "p50_ms": round(percentile(values, 0.50), 4),
+      "p95_ms": round(percentile(values, 0.95), 4),
+      "max_ms": round(max(values), 4),
+      **allocations[phase],
+    }
+  frame_total = sum(phases[phase]["p50_ms"] for phase in PHASES)
+  return {
+    "entities_at_end": samples["entities"][0],
+    "frame_p50_ms": round(frame_total, 4),
+    "phases": phases,
+    "pools": pools,
+  }
+
+
+def run_benchmarks(names: list[str], frames: int, alloc_frames: int, dt: float) -> dict:
+  results = {}
+  for name in names:
+    scenario = SCENARIOS[name]()
+    print(f"Running {name}: {scenario.description}...", file=sys.stderr)
+    samples, pools = time_scenario(scenario, frames, dt)
+    allocations = trace_scenario(SCENARIOS[name](), alloc_frames, dt)
+    results[name] = summarize(samples, allocations, pools)
+
+  print("Timing font startup...", file=sys.stderr)
+  return {
+    "meta": {
+      "created": datetime.now().isoformat(timespec="seconds"),
+      "python": platform.python_version(),
+      "pygame": pygame.version.ver,
+      "machine": platform.machine(),
+      "frames": frames,
+      "dt": dt,
+      "seed": BENCH_SEED,
+    },
+    "scenarios": results,
+    "font_startup": time_font_startup(FONT_REPEATS),
+  }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+  regressions = []
+  for name, scenario in results["scenarios"].items():
+    base_scenario = baseline.get("scenarios", {}).get(name)
+    if base_scenario is None:
+      continue
+    for phase, stats in scenario["phases"].items():
+      base_stats = base_scenario["phases"].get(phase)
+      if base_stats is None:
+        continue
+      current, previous = stats["p50_ms"], base_stats["p50_ms"]
+      if current - previous > REGRESSION_FLOOR_MS and current > previous * (1 + tolerance):
+        regressions.append(f"{name}/{phase}: p50 {previous:.3f} ms -> {current:.3f} ms "
+                           f"(+{(current / previous - 1) * 100:.0f}%)")
+  return regressions
+
+
+def print_report(results: dict) -> None:
+  print(f"{'scenario':<26}{'phase':<11}{'p50 ms':>9}{'p95 ms':>9}{'peak KiB':>10}{'net KiB/f':>11}")
+  for name, scenario in results["scenarios"].items():
+    for phase, stats in scenario["phases"].items():
+      print(f"{name:<26}{phase:<11}{stats['p50_ms']:>9.3f}{stats['p95_ms']:>9.3f}"
+            f"{stats['alloc_peak_kib']:>10.1f}{stats['alloc_net_kib_per_frame']:>11.2f}")
+
+  font = results["font_startup"]
+  print(f"font startup: json {font['json_ms']:.3f} ms, compiled {font['compiled_ms']:.3f} ms "
+        f"({font['speedup']}x)")
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Headless per-phase benchmarks for Blasteroids")
+  parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                      help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+  parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES,
+                      help="timed frames per scenario")
+  parser.add_argument("--alloc-frames", type=int, default=DEFAULT_ALLOC_FRAMES,
+                      help="frames traced for allocations per scenario")
+  parser.add_argument("--dt", type=float, default=HEADLESS_DT)
+  parser.add_argument("--out", type=Path, default=Path("bench_results.json"),
+                      help="where to write the machine-readable results")
+  parser.add_argument("--baseline", type=Path, default=None,
+                      help="results file to compare against; regressions make the exit code 1")
+  parser.add_argument("--save-baseline", type=Path, default=None,
+                      help="also write the results here for future comparisons")
+  parser.add_argument("--replay", type=Path, default=None,
+                      help="also run a recorded input session as the 'replay' scenario")
+  parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                      help="allowed p50 slowdown per phase before it counts as a regression")
+  args = parser.parse_args()
+
+  if args.replay is not None:
+    SCENARIOS[Replay.name] = lambda: Replay(args.replay)
+  names = args.scenarios or list(SCENARIOS)
+  unknown = [name for name in names if name not in SCENARIOS]
+  if unknown:
+    parser.error(f"unknown scenarios: {', '.join(unknown)}")
+  results = run_benchmarks(names, args.frames, args.alloc_frames, args.dt)
+
+  print_report(results)
+  args.out.write_text(json.dumps(results, indent=2))
+  if args.save_baseline is not None:
+    args.save_baseline.write_text(json.dumps(results, indent=2))
+
+  if args.baseline is None:
+    return 0
+
+  regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+  for regression in regressions:
+    print(f"REGRESSION {regression}")
+  if not regressions:
+    print(f"No regressions against {args.baseline}")
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,8 +1,14 @@
 import pygame
-from typing import Callable
+from typing import Callable, TYPE_CHECKING
 from circleshape import CircleShape
 from constants import OBJ_LINE_WIDTH, BULLET_RADIUS, BULLET_LIFESPAN
 
+if TYPE_CHECKING:
+  from spriteatlas import SpriteAtlas
+
+# Index of the bullet image in the atlas and of bullets in the entity store's sizes
+BULLET_SIZE = 0
+
 
 class Bullet(CircleShape):
   bullet_died: Callable
@@ -12,9 +18,30 @@ class Bullet(CircleShape):
     super().__init__(x, y, BULLET_RADIUS)
     self.bullet_died = bullet_died
     self.lifetime = 0
+    if self.store is not None:
+      self.store.set_lifespan(self.handle, BULLET_LIFESPAN)
+
+  # Fires a bullet, reusing a dead one from the pool when there is one
+  @classmethod
+  def create(cls, x: float, y: float, bullet_died: Callable) -> "Bullet":
+    pool = cls.pool
+    bullet = pool.acquire() if pool is not None else None
+    if bullet is None:
+      bullet = cls(x, y, bullet_died)
+    else:
+      bullet.reset(x, y, BULLET_RADIUS)
+      bullet.bullet_died = bullet_died
+      bullet.lifetime = 0
+      if bullet.store is not None:
+        bullet.store.set_lifespan(bullet.handle, BULLET_LIFESPAN)
+    bullet.home_pool = pool
+    return bullet
+
+  def draw_at(self, surface: pygame.Surface, x: float, y: float) -> None:
+    pygame.draw.circle(surface, "white", (x, y), self.radius, OBJ_LINE_WIDTH)
 
-  def draw(self, surface: pygame.Surface) -> None:
-    pygame.draw.circle(surface, "white", self.position, self.radius, OBJ_LINE_WIDTH)
+  def get_blit(self, atlas: "SpriteAtlas", alpha: float = 1.0) -> tuple[pygame.Surface, tuple[float, float]]:
+    return atlas.bullet(self.get_screen_position(alpha))
 
   def update(self, dt: float) -> None:
     self.position += self.velocity * dt
@@ -0,0 +1,55 @@
+import math
+import pygame
+
+
+# Which part of the world the screen shows. The view is centered on whatever
+# it follows, usually the hero, but stops at the world's edges so it never
+# shows what lies beyond them. Drawing subtracts `draw_offset` from world
+# positions, so the view moves in steps like everything else and is drawn
+# interpolated between the last two of them
+class Camera:
+  world: pygame.Rect
+  # The part of the world on screen as of the last step, in whole pixels
+  view: pygame.Rect
+  # Top left of the view as of the last step and the one before it
+  position: pygame.Vector2
+  previous_position: pygame.Vector2
+  # Top left of the view in the frame being drawn. Updated in place, so
+  # whoever holds on to it always sees the current one
+  draw_offset: pygame.Vector2
+
+  def __init__(self, world: pygame.Rect, size: tuple[int, int]) -> None:
+    self.world = world
+    self.view = pygame.Rect((0, 0), size)
+    self.position = pygame.Vector2()
+    self.previous_position = pygame.Vector2()
+    self.draw_offset = pygame.Vector2()
+
+  def follow(self, x: float, y: float) -> None:
+    world = self.world
+    width, height = self.view.size
+    if world.width > width:
+      left = min(max(x - width / 2, world.left), world.right - width)
+    else:
+      left = world.centerx - width / 2
+    if world.height > height:
+      top = min(max(y - height / 2, world.top), world.bottom - height)
+    else:
+      top = world.centery - height / 2
+    self.position.update(left, top)
+    self.view.topleft = (math.floor(left), math.floor(top))
+
+  # Straight there, e.g. when a game starts, instead of sliding over
+  def jump_to(self, x: float, y: float) -> None:
+    self.follow(x, y)
+    self.save_previous()
+    self.draw_offset.update(self.position)
+
+  def save_previous(self) -> None:
+    self.previous_position.update(self.position)
+
+  def set_draw_alpha(self, alpha: float) -> None:
+    if alpha >= 1.0:
+      self.draw_offset.update(self.position)
+    else:
+      self.draw_offset.update(self.previous_position.lerp(self.position, alpha))
@@ -1,13 +1,33 @@
+import math
 import pygame
-from typing import ClassVar
+from typing import ClassVar, TYPE_CHECKING
+from mesh import circle_time_of_impact
+from constants import DOT_SCALE
+
+if TYPE_CHECKING:
+  from entitystore import EntityStore
+  from entitypool import EntityPool
+  from spriteatlas import SpriteAtlas
 
 
 # Base class for game objects
 class CircleShape(pygame.sprite.Sprite):
   containers: ClassVar[tuple] = ()
-  position: pygame.Vector2
-  velocity: pygame.Vector2
+  # When set, position and velocity live in the store's arrays instead of on
+  # the object while it is alive. Reading them then returns a copy, so always
+  # assign the result back (`shape.position += offset`) rather than mutating it
+  store: ClassVar["EntityStore | None"] = None
+  # Where subclasses with a `create` classmethod take dead instances from
+  pool: ClassVar["EntityPool | None"] = None
+  # Top left of the camera view being drawn, in world coordinates
+  view_offset: ClassVar[pygame.Vector2] = pygame.Vector2()
+  handle: int
   radius: float
+  # The pool this shape goes back to when it dies, if it came from one
+  home_pool: "EntityPool | None"
+  # Position at the start of the last simulation step, for interpolated drawing.
+  # Shapes in a store keep theirs in the store instead
+  previous_position: pygame.Vector2
 
   def __init__(self, x: float, y: float, radius: float):
     # we will be using this later
@@ -16,19 +36,168 @@ class CircleShape(pygame.sprite.Sprite):
     else:
       super().__init__()
 
-    self.position = pygame.Vector2(x, y)
-    self.velocity = pygame.Vector2(0, 0)
     self.radius = radius
+    self.home_pool = None
+    self.previous_position = pygame.Vector2(x, y)
+
+    if self.store is None:
+      self._position = pygame.Vector2(x, y)
+      self._velocity = pygame.Vector2(0, 0)
+    else:
+      self.handle = self.store.add(self, x, y, radius)
+
+  # Brings a pooled shape back to life in the same state __init__ would leave
+  # a new one in, reusing its vectors and skipping Sprite setup
+  def reset(self, x: float, y: float, radius: float) -> None:
+    # A dead sprite is in no group, so skip the membership checks in add()
+    for group in self.containers:
+      group.add_internal(self)
+      self.add_internal(group)
+    self.radius = radius
+    self.previous_position.update(x, y)
+
+    if self.store is None:
+      self._position.update(x, y)
+      self._velocity.update(0, 0)
+    else:
+      self.handle = self.store.add(self, x, y, radius)
+
+  @property
+  def position(self) -> pygame.Vector2:
+    if self.store is None or self.handle < 0:
+      return self._position
+    return self.store.get_position(self.handle)
+
+  @position.setter
+  def position(self, value: pygame.Vector2) -> None:
+    if self.store is None or self.handle < 0:
+      self._position = value
+    else:
+      self.store.set_position(self.handle, value)
+
+  @property
+  def velocity(self) -> pygame.Vector2:
+    if self.store is None or self.handle < 0:
+      return self._velocity
+    return self.store.get_velocity(self.handle)
+
+  @velocity.setter
+  def velocity(self, value: pygame.Vector2) -> None:
+    if self.store is None or self.handle < 0:
+      self._velocity = value
+    else:
+      self.store.set_velocity(self.handle, value)
+
+  def save_previous(self) -> None:
+    self.previous_position.update(self.position)
+
+  # Where the shape was at the start of the last step
+  def get_previous_position(self) -> pygame.Vector2:
+    if self.store is not None and self.handle >= 0:
+      return self.store.get_previous_position(self.handle)
+    return self.previous_position
+
+  # Moves the shape without that counting as motion, so it isn't drawn
+  # sweeping across everything in between (e.g. when it wraps around)
+  def shift(self, dx: float, dy: float) -> None:
+    if self.store is None or self.handle < 0:
+      self._position += (dx, dy)
+      self.previous_position += (dx, dy)
+    else:
+      self.store.shift(self.handle, dx, dy)
+
+  # Where to draw the shape `alpha` of the way from the previous step to the current one
+  def get_draw_position(self, alpha: float) -> pygame.Vector2:
+    if alpha >= 1.0:
+      return self.position
+    if self.store is not None and self.handle >= 0:
+      return self.store.get_draw_position(self.handle, alpha)
+    return self.previous_position.lerp(self.position, alpha)
+
+  # The same, relative to the camera view
+  def get_screen_position(self, alpha: float) -> pygame.Vector2:
+    return self.get_draw_position(alpha) - self.view_offset
+
+  def draw(self, surface: pygame.Surface, alpha: float = 1.0) -> None:
+    x, y = self.get_screen_position(alpha)
+    self.draw_at(surface, x, y)
+
+  # Draws the shape at (x, y) on screen, for callers that already know where
+  # it goes, like the store's draw loop
+  def draw_at(self, surface: pygame.Surface, x: float, y: float) -> None:
+    # must override
+    pass
+
+  # A filled square sized by the radius, much cheaper than an outline, for
+  # when frames run over budget
+  def draw_dot(self, surface: pygame.Surface, alpha: float = 1.0) -> None:
+    x, y = self.get_screen_position(alpha)
+    self.draw_dot_at(surface, x, y)
 
-  def draw(self, surface: pygame.Surface):
+  def draw_dot_at(self, surface: pygame.Surface, x: float, y: float) -> None:
+    extent = self.radius * DOT_SCALE
+    surface.fill("white", (x - extent, y - extent, 2 * extent + 1, 2 * extent + 1))
+
+  # Pre-rendered image for this shape and where to blit it, for the atlas draw mode
+  def get_blit(self, atlas: "SpriteAtlas", alpha: float = 1.0) -> tuple[pygame.Surface, tuple[float, float]]:
     # must override
     pass
 
+  # Screen area draw() may touch, padded by a pixel for rounding
+  def get_bounds(self, alpha: float = 1.0) -> pygame.Rect:
+    x, y = self.get_screen_position(alpha)
+    return self.get_bounds_at(x, y)
+
+  def get_bounds_at(self, x: float, y: float) -> pygame.Rect:
+    extent = self.radius + 1
+    return pygame.Rect(x - extent, y - extent, 2 * extent + 1, 2 * extent + 1)
+
   def update(self, dt: float):
     # must override
     pass
 
+  def kill(self) -> None:
+    # kill can be reached more than once in a frame (e.g. a bullet touching two
+    # asteroids), and the handle may already belong to someone else by then.
+    # Dead shapes keep their last state so late collision checks still see it
+    if self.store is not None and self.handle >= 0:
+      self._position = self.store.get_position(self.handle)
+      self._velocity = self.store.get_velocity(self.handle)
+      self.store.remove(self.handle)
+      self.handle = -1
+    super().kill()
+
+    pool = self.home_pool
+    if pool is not None:
+      self.home_pool = None
+      pool.release(self)
+
   def collides_with(self, other: "CircleShape") -> bool:
     r_sum = self.radius + other.radius
     distance_squared = self.position.distance_squared_to(other.position)
     return distance_squared <= r_sum * r_sum
+
+  # Bounding circle of everywhere the shape was during the last step, as
+  # (x, y, radius)
+  def get_swept_circle(self) -> tuple[float, float, float]:
+    x0, y0 = self.get_previous_position()
+    x1, y1 = self.position
+    half_x, half_y = (x1 - x0) * 0.5, (y1 - y0) * 0.5
+    return x0 + half_x, y0 + half_y, self.radius + math.hypot(half_x, half_y)
+
+  # Where the other shape started out and how far it went during the last
+  # step, both relative to this one
+  def get_relative_motion(self, other: "CircleShape") -> tuple[float, float, float, float]:
+    x0, y0 = self.get_previous_position()
+    x1, y1 = self.position
+    other_x0, other_y0 = other.get_previous_position()
+    other_x1, other_y1 = other.position
+    start_x, start_y = other_x0 - x0, other_y0 - y0
+    return start_x, start_y, other_x1 - x1 - start_x, other_y1 - y1 - start_y
+
+  # How far through the last step (0 to 1) the two shapes first touched, both
+  # moving in a straight line from their previous positions, or None if they
+  # never did. Unlike collides_with(), this catches a fast shape passing
+  # through another one between two steps
+  def time_of_impact(self, other: "CircleShape") -> float | None:
+    return circle_time_of_impact(*self.get_relative_motion(other), self.radius + other.radius)
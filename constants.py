@@ -1,11 +1,28 @@
 SCREEN_WIDTH: int = 1280
 SCREEN_HEIGHT: int = 720
 
+# The world asteroids fly around in. The camera shows a screen's worth of it
+# centered on the hero, stopping at the edges
+WORLD_WIDTH: int = SCREEN_WIDTH * 4
+WORLD_HEIGHT: int = SCREEN_HEIGHT * 4
+
 TARGET_FPS: float = 60
 INITIAL_DT: float = 0.0
+HEADLESS_DT: float = 1 / TARGET_FPS
+# The simulation advances in fixed steps of 1 / SIMULATION_RATE seconds no matter
+# how often frames are drawn. After a long frame it runs at most this many steps
+# to catch up and lets the rest go, rather than falling further behind
+SIMULATION_RATE: float = 60
+MAX_CATCH_UP_STEPS: int = 5
+# Draw objects between their last two simulated positions, so motion stays
+# smooth when frames and steps don't line up
+INTERPOLATION_ENABLED: bool = True
 
 OBJ_LINE_WIDTH: int = 2
 TEXT_LINE_WIDTH: int = 3
+# Rendered strings are cached as surfaces up to this many bytes in total
+TEXT_CACHE_ENABLED: bool = True
+TEXT_CACHE_BUDGET_BYTES: int = 8 * 1024 * 1024
 
 HERO_RADIUS: float = 20
 HERO_TURN_SPEED: float = 300
@@ -20,5 +37,96 @@ ASTEROID_MIN_RADIUS: float = 20
 ASTEROID_SPAWN_RATE_SECONDS: float = 0.8
 ASTEROID_MAX_RADIUS: float = ASTEROID_MIN_RADIUS * ASTEROID_SIZES
 ASTEROID_SPEED_SCALE_FACTOR: float = 1.2
+# Asteroids are jagged polygons instead of circles, both on screen and in
+# collisions. Each size comes in a few outlines, one picked per asteroid
+POLYGON_ASTEROIDS_ENABLED: bool = True
+ASTEROID_SHAPE_VARIANTS: int = 4
+ASTEROID_VERTICES: int = 11
+# How far a vertex may sit inside the radius, as a fraction of it
+ASTEROID_JAGGEDNESS: float = 0.45
+# Asteroids whose center leaves the world grown by PLAY_AREA_MARGIN on every
+# side are removed ("despawn") or brought back in on the opposite side
+# ("wrap"). The field spawns just outside the view, which can be the edge of
+# the world, so the margin must be wider than ASTEROID_MAX_RADIUS
+ASTEROID_EDGE_MODE: str = "despawn"
+PLAY_AREA_MARGIN: float = ASTEROID_MAX_RADIUS * 2
+# Most asteroids, bullets and heroes alive at once. While it is reached the
+# field skips its spawns; asteroids already alive still split when shot, so
+# only splitting can take the count past it
+ENTITY_BUDGET: int = 256
+# Asteroids more than ACTIVE_AREA_MARGIN outside the view are dormant: they
+# take no part in collisions or drawing, and sprite ones only move every
+# DORMANT_UPDATE_INTERVAL steps, that many steps at a time. Who is dormant is
+# rechecked on the same schedule, so the margin must cover how far the view
+# and an asteroid can close in on each other in the meantime
+DORMANT_ENABLED: bool = True
+ACTIVE_AREA_MARGIN: float = 320
+DORMANT_UPDATE_INTERVAL: int = 15
+
+# Seconds the game over screen ignores keys for, so a key still held or
+# pressed a moment too late doesn't start the next game straight away
+GAME_OVER_INPUT_DELAY: float = 1.0
+
+# Windowed play gives up details one at a time (see governor.Degradation) when
+# the median time to produce a frame, over each GOVERNOR_WINDOW_FRAMES frames,
+# is above GOVERNOR_DEGRADE_RATIO of the 1 / TARGET_FPS budget. A detail comes
+# back only after GOVERNOR_RECOVER_WINDOWS windows in a row under
+# GOVERNOR_RECOVER_RATIO of it. Headless runs, replays and input recordings
+# never degrade, since spawning less would change what their seed plays out
+GOVERNOR_ENABLED: bool = True
+GOVERNOR_WINDOW_FRAMES: int = 30
+GOVERNOR_DEGRADE_RATIO: float = 1.0
+GOVERNOR_RECOVER_RATIO: float = 0.6
+GOVERNOR_RECOVER_WINDOWS: int = 4
+# How much longer the field waits between spawns at the lowest level
+GOVERNOR_SPAWN_SLOWDOWN: float = 2.0
+# Objects drawn as dots instead of outlines are this fraction of their radius across
+DOT_SCALE: float = 0.2
 
 LOGGING_ENABLED: bool = False
+# Frames a --record session may queue for its writer thread before dropping some
+RECORDING_QUEUE_SIZE: int = 120
+
+# Uniform grid broad phase for collisions. Set to False to use the brute force
+# all-pairs check instead, e.g. to compare results or timings
+SPATIAL_HASH_ENABLED: bool = True
+SPATIAL_HASH_CELL_SIZE: float = ASTEROID_MAX_RADIUS * 2
+# Test collisions along the straight line each shape moved through a step
+# instead of only where it ended up, and act on them in the order they
+# happened. Without it, a bullet can pass through a small asteroid between two
+# steps once steps get long
+SWEPT_COLLISIONS_ENABLED: bool = True
+
+# Keep asteroid and bullet state in NumPy arrays and integrate them in one
+# vectorized step per frame. Requires the optional numpy dependency
+ENTITY_STORE_ENABLED: bool = False
+
+# Debris from asteroids breaking up and exhaust behind the hero while it
+# thrusts, moved and drawn in bulk through NumPy. Windowed play only, and only
+# with the optional numpy dependency installed. Once PARTICLE_CAPACITY are
+# alive the oldest make way for new ones
+PARTICLES_ENABLED: bool = True
+PARTICLE_CAPACITY: int = 65536
+# Particles are squares this many pixels across
+PARTICLE_SIZE: int = 2
+
+# Per-phase frame timing. F3 toggles the overlay, which also turns the timers
+# on; this makes them start on without the overlay
+PROFILER_ENABLED: bool = False
+PROFILER_HISTORY_FRAMES: int = 240
+PROFILER_OVERLAY_REFRESH_SECONDS: float = 0.25
+
+# Only clear and present the parts of the screen that changed since the last
+# frame. Falls back to a full clear and flip once more than this fraction of
+# the screen is dirty, where one big fill beats many small ones
+DIRTY_RECTS_ENABLED: bool = False
+DIRTY_RECTS_MAX_COVERAGE: float = 0.5
+
+# "vector" draws every object with pygame.draw each frame; "atlas" blits images
+# pre-rendered at startup in one batched call, with the hero's rotation rounded
+# to one of HERO_ROTATION_STEPS angles
+DRAW_MODE: str = "vector"
+HERO_ROTATION_STEPS: int = 64
+
+# Reuse dead asteroids and bullets for new spawns instead of allocating new ones
+ENTITY_POOLS_ENABLED: bool = True
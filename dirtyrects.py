@@ -0,0 +1,67 @@
+import pygame
+from constants import DIRTY_RECTS_MAX_COVERAGE
+
+# SDL fills rects whose left edge sits on a 64 byte boundary (16 pixels at 32
+# bits) an order of magnitude faster than misaligned ones
+ALIGN_PIXELS = 16
+
+
+# Merges rects until none of them overlap, so each pixel is cleared and
+# presented once. Returns None as soon as the merged area passes `max_area`;
+# merging only ever grows the total, so there is no point finishing
+def merge_rects(rects: list[pygame.Rect], max_area: float) -> list[pygame.Rect] | None:
+  merged: list[pygame.Rect] = []
+  area = 0
+  for rect in rects:
+    rect = rect.copy()
+    while True:
+      hits = rect.collidelistall(merged)
+      if not hits:
+        break
+      for i in reversed(hits):
+        other = merged.pop(i)
+        area -= other.w * other.h
+        rect.union_ip(other)
+    merged.append(rect)
+    area += rect.w * rect.h
+    if area > max_area:
+      return None
+  return merged
+
+
+# Remembers what was drawn where last frame. Each frame's dirty region is
+# everything drawn last frame (to erase it) plus everything about to be drawn
+class DirtyRectTracker:
+  bounds: pygame.Rect
+  max_coverage: float
+  previous: list[pygame.Rect]
+  full_redraw: bool
+
+  def __init__(self, bounds: pygame.Rect, max_coverage: float = DIRTY_RECTS_MAX_COVERAGE) -> None:
+    self.bounds = bounds
+    self.max_coverage = max_coverage
+    self.previous = []
+    self.full_redraw = True
+
+  # Call when something outside the tracked regions changed the screen
+  def invalidate(self) -> None:
+    self.full_redraw = True
+
+  # Returns the rects to clear and present this frame, or None for the whole screen
+  def update(self, current: list[pygame.Rect]) -> list[pygame.Rect] | None:
+    bounds = self.bounds
+    visible = []
+    for rect in current:
+      rect = rect.clip(bounds)
+      if rect.w and rect.h:
+        misalignment = rect.x % ALIGN_PIXELS
+        rect.x -= misalignment
+        rect.w += misalignment
+        visible.append(rect)
+
+    previous = self.previous
+    self.previous = visible
+    if self.full_redraw:
+      self.full_redraw = False
+      return None
+    return merge_rects(previous + visible, bounds.w * bounds.h * self.max_coverage)
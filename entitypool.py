@@ -0,0 +1,56 @@
+from typing import Any, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+# Free list of dead entities waiting to be brought back by their class's
+# `create`. Released entities are only handed out again after `recycle`, which
+# the game calls between frames: until then collision pairs and spatial hash
+# cells built earlier in the frame may still point at them, and they must keep
+# looking dead rather than turn into a freshly spawned entity mid-check
+class EntityPool(Generic[T]):
+  free: list[T]
+  pending: list[T]
+  live: int
+  high_water: int
+  acquired: int
+  reused: int
+
+  def __init__(self) -> None:
+    self.free = []
+    self.pending = []
+    self.live = 0
+    self.high_water = 0
+    self.acquired = 0
+    self.reused = 0
+
+  # Returns a dead entity to reset, or None if the caller has to construct one.
+  # Either way the entity counts as live from here on
+  def acquire(self) -> T | None:
+    self.acquired += 1
+    self.live += 1
+    if self.live > self.high_water:
+      self.high_water = self.live
+    if not self.free:
+      return None
+    self.reused += 1
+    return self.free.pop()
+
+  def release(self, entity: T) -> None:
+    self.live -= 1
+    self.pending.append(entity)
+
+  def recycle(self) -> None:
+    if self.pending:
+      self.free.extend(self.pending)
+      self.pending.clear()
+
+  def stats(self) -> dict[str, Any]:
+    return {
+      "live": self.live,
+      "free": len(self.free) + len(self.pending),
+      "high_water": self.high_water,
+      "acquired": self.acquired,
+      "reused": self.reused,
+      "reuse_rate": self.reused / self.acquired if self.acquired else 0.0,
+    }
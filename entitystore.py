@@ -0,0 +1,359 @@
+import math
+import numpy as np
+import pygame
+from typing import Any
+
+INITIAL_CAPACITY = 1024
+# Grid cells are keyed by both coordinates packed into one int64
+CELL_KEY_OFFSET = 1 << 31
+
+
+# For runs of the given lengths laid end to end, each element's index within its run
+def run_offsets(counts: np.ndarray) -> np.ndarray:
+  return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+# Every grid cell each (left, top, right, bottom) box touches, as (cell key, box index)
+def cell_entries(cell_size: float, boxes: tuple[np.ndarray, ...]) -> tuple[np.ndarray, np.ndarray]:
+  inv = 1.0 / cell_size
+  left, top, right, bottom = (np.floor(side * inv).astype(np.int64) for side in boxes)
+  widths = right - left + 1
+  counts = widths * (bottom - top + 1)
+  owners = np.repeat(np.arange(len(left)), counts)
+  offsets = run_offsets(counts)
+  widths = widths[owners]
+  xs = left[owners] + offsets % widths
+  ys = top[owners] + offsets // widths
+  return xs * (2 * CELL_KEY_OFFSET) + (ys + CELL_KEY_OFFSET), owners
+
+
+# The array version of SpatialHash: every (i, j) where box i of `boxes` and
+# box j of `others` touch a common cell of a grid of `cell_size`, each pair
+# once, ordered by j and then i
+def grid_pairs(cell_size: float, boxes: tuple[np.ndarray, ...],
+               others: tuple[np.ndarray, ...]) -> tuple[np.ndarray, np.ndarray]:
+  count = len(boxes[0])
+  if count == 0 or len(others[0]) == 0:
+    empty = np.zeros(0, dtype=np.int64)
+    return empty, empty
+  keys, owners = cell_entries(cell_size, boxes)
+  order = np.argsort(keys, kind="stable")
+  keys, owners = keys[order], owners[order]
+  other_keys, other_owners = cell_entries(cell_size, others)
+  lows = np.searchsorted(keys, other_keys, "left")
+  counts = np.searchsorted(keys, other_keys, "right") - lows
+  js = np.repeat(other_owners, counts)
+  i_s = owners[np.repeat(lows, counts) + run_offsets(counts)]
+  codes = np.unique(js * count + i_s)
+  return codes % count, codes // count
+
+
+# Bounding boxes of circles moving from (x0, y0) to (x1, y1), as (left, top, right, bottom)
+def swept_boxes(x0: np.ndarray, y0: np.ndarray, x1: np.ndarray, y1: np.ndarray,
+                radii: np.ndarray) -> tuple[np.ndarray, ...]:
+  return (np.minimum(x0, x1) - radii, np.minimum(y0, y1) - radii,
+          np.maximum(x0, x1) + radii, np.maximum(y0, y1) + radii)
+
+
+# Struct-of-arrays backend for CircleShape entities. Every live entity owns one
+# row in each array, and rows [0, count) are always densely packed so the whole
+# population can be integrated with a handful of vectorized operations.
+#
+# Entities refer to their row through a stable handle. Removing an entity moves
+# the last row into the hole (swap-remove) and patches the moved entity's
+# handle, and the freed handle goes onto a free list to be reused by the next add
+class EntityStore:
+  capacity: int
+  positions: np.ndarray
+  previous_positions: np.ndarray  # as of the start of the last step, for interpolation
+  velocities: np.ndarray
+  radii: np.ndarray
+  lifetimes: np.ndarray
+  lifespans: np.ndarray
+  sizes: np.ndarray
+  shapes: np.ndarray  # outline variant, for drawing
+  dormant: np.ndarray  # asteroid rows far enough from the view to sleep, see partition()
+
+  owners: list[Any]         # row -> owning entity
+  row_handles: list[int]    # row -> handle
+  handle_rows: list[int]    # handle -> row, or -1 if the handle is free
+  free_handles: list[int]
+
+  def __init__(self, capacity: int = INITIAL_CAPACITY) -> None:
+    self.capacity = 0
+    self.positions = np.zeros((0, 2))
+    self.previous_positions = np.zeros((0, 2))
+    self.velocities = np.zeros((0, 2))
+    self.radii = np.zeros(0)
+    self.lifetimes = np.zeros(0)
+    self.lifespans = np.zeros(0)
+    self.sizes = np.zeros(0, dtype=np.int32)
+    self.shapes = np.zeros(0, dtype=np.int32)
+    self.dormant = np.zeros(0, dtype=bool)
+
+    self.owners = []
+    self.row_handles = []
+    self.handle_rows = []
+    self.free_handles = []
+
+    self.grow(capacity)
+
+  def __len__(self) -> int:
+    return len(self.owners)
+
+  @property
+  def count(self) -> int:
+    return len(self.owners)
+
+  def grow(self, capacity: int) -> None:
+    count = self.count
+
+    def resized(array: np.ndarray, fill: float) -> np.ndarray:
+      new_array = np.full((capacity, *array.shape[1:]), fill, dtype=array.dtype)
+      new_array[:count] = array[:count]
+      return new_array
+
+    self.positions = resized(self.positions, 0.0)
+    self.previous_positions = resized(self.previous_positions, 0.0)
+    self.velocities = resized(self.velocities, 0.0)
+    self.radii = resized(self.radii, 0.0)
+    self.lifetimes = resized(self.lifetimes, 0.0)
+    self.lifespans = resized(self.lifespans, math.inf)
+    self.sizes = resized(self.sizes, 0)
+    self.shapes = resized(self.shapes, 0)
+    self.dormant = resized(self.dormant, False)
+    self.capacity = capacity
+
+  def add(self, owner: Any, x: float, y: float, radius: float) -> int:
+    row = self.count
+    if row == self.capacity:
+      self.grow(self.capacity * 2)
+
+    if self.free_handles:
+      handle = self.free_handles.pop()
+      self.handle_rows[handle] = row
+    else:
+      handle = len(self.handle_rows)
+      self.handle_rows.append(row)
+
+    self.owners.append(owner)
+    self.row_handles.append(handle)
+
+    self.positions[row] = x, y
+    self.previous_positions[row] = x, y
+    self.velocities[row] = 0.0, 0.0
+    self.radii[row] = radius
+    self.lifetimes[row] = 0.0
+    self.lifespans[row] = math.inf
+    self.sizes[row] = 0
+    self.shapes[row] = 0
+    self.dormant[row] = False
+
+    return handle
+
+  def remove(self, handle: int) -> None:
+    row = self.handle_rows[handle]
+    last = self.count - 1
+
+    if row != last:
+      self.positions[row] = self.positions[last]
+      self.previous_positions[row] = self.previous_positions[last]
+      self.velocities[row] = self.velocities[last]
+      self.radii[row] = self.radii[last]
+      self.lifetimes[row] = self.lifetimes[last]
+      self.lifespans[row] = self.lifespans[last]
+      self.sizes[row] = self.sizes[last]
+      self.shapes[row] = self.shapes[last]
+      self.dormant[row] = self.dormant[last]
+
+      moved_handle = self.row_handles[last]
+      self.owners[row] = self.owners[last]
+      self.row_handles[row] = moved_handle
+      self.handle_rows[moved_handle] = row
+
+    self.owners.pop()
+    self.row_handles.pop()
+    self.handle_rows[handle] = -1
+    self.free_handles.append(handle)
+
+  def get_position(self, handle: int) -> pygame.Vector2:
+    return pygame.Vector2(self.positions[self.handle_rows[handle]].tolist())
+
+  def set_position(self, handle: int, value: pygame.Vector2) -> None:
+    self.positions[self.handle_rows[handle]] = value.x, value.y
+
+  def shift(self, handle: int, dx: float, dy: float) -> None:
+    row = self.handle_rows[handle]
+    self.positions[row] += dx, dy
+    self.previous_positions[row] += dx, dy
+
+  def get_previous_position(self, handle: int) -> pygame.Vector2:
+    return pygame.Vector2(self.previous_positions[self.handle_rows[handle]].tolist())
+
+  def get_draw_position(self, handle: int, alpha: float) -> pygame.Vector2:
+    row = self.handle_rows[handle]
+    previous = pygame.Vector2(self.previous_positions[row].tolist())
+    return previous.lerp(self.positions[row].tolist(), alpha)
+
+  # Positions between the last two steps for every row at once
+  def draw_positions(self, alpha: float) -> np.ndarray:
+    count = self.count
+    previous = self.previous_positions[:count]
+    return previous + (self.positions[:count] - previous) * alpha
+
+  def save_previous(self) -> None:
+    count = self.count
+    self.previous_positions[:count] = self.positions[:count]
+
+  def get_velocity(self, handle: int) -> pygame.Vector2:
+    return pygame.Vector2(self.velocities[self.handle_rows[handle]].tolist())
+
+  def set_velocity(self, handle: int, value: pygame.Vector2) -> None:
+    self.velocities[self.handle_rows[handle]] = value.x, value.y
+
+  def set_lifespan(self, handle: int, lifespan: float) -> None:
+    self.lifespans[self.handle_rows[handle]] = lifespan
+
+  def set_size(self, handle: int, size: int) -> None:
+    self.sizes[self.handle_rows[handle]] = size
+
+  def set_shape(self, handle: int, shape: int) -> None:
+    self.shapes[self.handle_rows[handle]] = shape
+
+  # Integrates every entity and ages their lifetimes in one pass. Returns the
+  # owners whose lifetime ran out; the caller decides how they die, which
+  # will in turn remove them from the store
+  def step(self, dt: float) -> list[Any]:
+    count = self.count
+    if count == 0:
+      return []
+
+    positions = self.positions[:count]
+    positions += self.velocities[:count] * dt
+    lifetimes = self.lifetimes[:count]
+    lifetimes += dt
+
+    expired = np.flatnonzero(lifetimes >= self.lifespans[:count])
+    owners = self.owners
+    return [owners[row] for row in expired.tolist()]
+
+  # Marks the asteroid rows outside `area` dormant and the rest awake, and
+  # returns the owners that just fell asleep and those that just woke up.
+  # Dormant rows keep moving with the rest; only the game's groups drop them
+  def partition(self, area: pygame.Rect) -> tuple[list[Any], list[Any]]:
+    count = self.count
+    if count == 0:
+      return [], []
+    outside = self._outside(area)
+    dormant = self.dormant[:count]
+    changed = np.flatnonzero(outside != dormant)
+    dormant[:] = outside
+    owners = self.owners
+    sleeping, waking = [], []
+    for row, asleep in zip(changed.tolist(), outside[changed].tolist()):
+      (sleeping if asleep else waking).append(owners[row])
+    return sleeping, waking
+
+  def _leaving(self, area: pygame.Rect) -> np.ndarray:
+    positions = np.trunc(self.positions[:self.count])
+    x, y = positions[:, 0], positions[:, 1]
+    return (x < area.left) | (x >= area.right) | (y < area.top) | (y >= area.bottom)
+
+  def _outside(self, area: pygame.Rect) -> np.ndarray:
+    return self._leaving(area) & (self.sizes[:self.count] > 0)
+
+  # Owners of the asteroid rows (size > 0), or with `bullets` the bullet rows,
+  # that are outside `area`. Same test as area.collidepoint(), which truncates
+  # the coordinates, so sprite and store entities leave at exactly the same point
+  def outside(self, area: pygame.Rect, bullets: bool = False) -> list[Any]:
+    count = self.count
+    if count == 0:
+      return []
+    if bullets:
+      rows = np.flatnonzero(self._leaving(area) & (self.sizes[:count] == 0))
+    else:
+      rows = np.flatnonzero(self._outside(area))
+    owners = self.owners
+    return [owners[row] for row in rows.tolist()]
+
+  # Awake asteroid rows against the bullet rows and the `extras`, as owner
+  # pairs whose bounding circles touch. With `swept`, that is at any time during
+  # the last step, each one moving in a straight line from its previous
+  # position, the same test as circle_time_of_impact(); otherwise it is where
+  # they are now. Extras are circles outside the store (the hero), given as
+  # (owner, x0, y0, x1, y1, radius) and put ahead of the bullets.
+  #
+  # Returns (asteroid, other, t, x, y, dx, dy) per pair, ordered by other and
+  # then asteroid row: t is when they touched (0 without `swept`), (x, y) the
+  # other's start relative to the asteroid's and (dx, dy) how far that moved,
+  # as CircleShape.get_relative_motion() has them
+  def circle_contacts(self, cell_size: float, extras: list[tuple[Any, float, float, float, float, float]],
+                      swept: bool) -> list[tuple[Any, Any, float, float, float, float, float]]:
+    count = self.count
+    sizes = self.sizes[:count]
+    positions = self.positions[:count]
+    previous = self.previous_positions[:count] if swept else positions
+    radii = self.radii[:count]
+
+    rows = np.flatnonzero((sizes > 0) & ~self.dormant[:count])
+    other_rows = np.flatnonzero(sizes == 0)
+    extra_values = np.array([extra[1:] for extra in extras], dtype=np.float64).reshape(-1, 5)
+
+    def columns(rows: np.ndarray, extra: np.ndarray) -> tuple[np.ndarray, ...]:
+      return (np.concatenate((extra[:, 0], previous[rows, 0])),
+              np.concatenate((extra[:, 1], previous[rows, 1])),
+              np.concatenate((extra[:, 2], positions[rows, 0])),
+              np.concatenate((extra[:, 3], positions[rows, 1])),
+              np.concatenate((extra[:, 4], radii[rows])))
+
+    ax0, ay0, ax1, ay1, a_radii = columns(rows, extra_values[:0])
+    bx0, by0, bx1, by1, b_radii = columns(other_rows, extra_values)
+    i, j = grid_pairs(cell_size, swept_boxes(ax0, ay0, ax1, ay1, a_radii),
+                      swept_boxes(bx0, by0, bx1, by1, b_radii))
+
+    x = bx0[j] - ax0[i]
+    y = by0[j] - ay0[i]
+    dx = bx1[j] - ax1[i] - x
+    dy = by1[j] - ay1[i] - y
+    reach = a_radii[i] + b_radii[j]
+    if swept:
+      c = x * x + y * y - reach * reach
+      b = x * dx + y * dy
+      a = dx * dx + dy * dy
+      discriminant = b * b - a * c
+      with np.errstate(divide="ignore", invalid="ignore"):
+        t = (-b - np.sqrt(discriminant)) / a
+      touching = (b < 0.0) & (discriminant >= 0.0) & (t <= 1.0)
+      t = np.where(c <= 0.0, 0.0, t)
+      touching |= c <= 0.0
+    else:
+      t = np.zeros(len(x))
+      touching = x * x + y * y <= reach * reach
+
+    hits = np.flatnonzero(touching)
+    owners = self.owners
+    a_owners = [owners[row] for row in rows[i[hits]].tolist()]
+    b_index = j[hits]
+    extra_count = len(extras)
+    b_owners = [extras[index][0] if index < extra_count else owners[other_rows[index - extra_count]]
+                for index in b_index.tolist()]
+    return list(zip(a_owners, b_owners, t[hits].tolist(), x[hits].tolist(), y[hits].tolist(),
+                    dx[hits].tolist(), dy[hits].tolist()))
+
+  # Every row touching a screen of `size` whose top left is at `offset` in the
+  # world, as (owner, x, y) in screen coordinates `alpha` of the way through
+  # the last step. Same bounds as CircleShape.get_bounds()
+  def visible(self, alpha: float, offset: tuple[float, float],
+              size: tuple[int, int]) -> list[tuple[Any, float, float]]:
+    count = self.count
+    if count == 0:
+      return []
+    positions = self.positions[:count] if alpha >= 1.0 else self.draw_positions(alpha)
+    positions = positions - offset
+    xs, ys = positions[:, 0], positions[:, 1]
+    extents = self.radii[:count] + 2
+    width, height = size
+    rows = np.flatnonzero((xs > -extents) & (xs < width + extents) &
+                          (ys > -extents) & (ys < height + extents))
+    owners = self.owners
+    return list(zip([owners[row] for row in rows.tolist()], xs[rows].tolist(), ys[rows].tolist()))
@@ -0,0 +1,225 @@
+import json
+import math
+import queue
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, NamedTuple, Protocol
+
+# Frames of events waiting for the flusher before new ones get dropped
+FLUSH_QUEUE_SIZE = 64
+# How often a blocked flush() or close() checks the flusher is still there to wait for
+CLOSE_POLL_SECONDS = 0.1
+
+
+class GameEvent(NamedTuple):
+  frame: int
+  time: datetime
+  type: str
+  details: dict[str, Any]
+
+
+class EventSink(Protocol):
+  def write_batch(self, events: list[GameEvent]) -> None: ...
+  def flush(self) -> None: ...
+  def close(self) -> None: ...
+
+
+# Same line format the old per-event logger wrote, but through one file handle
+# kept open for the whole run
+class JsonlEventSink:
+  path: str
+
+  def __init__(self, path: str = "game_events.jsonl") -> None:
+    self.path = path
+    self._start_time = datetime.now()
+    # New log file on each run
+    self._file = open(path, "w")
+
+  def write_batch(self, events: list[GameEvent]) -> None:
+    lines = []
+    for event in events:
+      entry = {
+        "timestamp": event.time.strftime("%H:%M:%S.%f")[:-3],
+        "elapsed_s": math.floor((event.time - self._start_time).total_seconds()),
+        "frame": event.frame,
+        "type": event.type,
+        **event.details,
+      }
+      lines.append(json.dumps(entry) + "\n")
+    self._file.writelines(lines)
+
+  def flush(self) -> None:
+    self._file.flush()
+
+  def close(self) -> None:
+    self._file.close()
+
+
+class MemoryEventSink:
+  events: list[GameEvent]
+
+  def __init__(self) -> None:
+    self.events = []
+
+  def write_batch(self, events: list[GameEvent]) -> None:
+    self.events.extend(events)
+
+  def flush(self) -> None:
+    pass
+
+  def close(self) -> None:
+    pass
+
+
+class CounterEventSink:
+  counts: Counter[str]
+
+  def __init__(self) -> None:
+    self.counts = Counter()
+
+  def write_batch(self, events: list[GameEvent]) -> None:
+    self.counts.update(event.type for event in events)
+
+  def flush(self) -> None:
+    pass
+
+  def close(self) -> None:
+    pass
+
+
+# Gameplay events go two ways. Listeners subscribed to an event type are called
+# right away on the game thread, for anything that reacts within the frame.
+# Sinks get every event, buffered for the frame and handed over in one batch to
+# a background flusher, so file I/O never happens on the game thread. With
+# neither attached, publish() returns after a single attribute check. If a sink
+# fails, the flusher stops and close() raises what went wrong
+class EventBus:
+  frame: int
+  active: bool
+  listeners: dict[str, list[Callable[..., None]]]
+  sinks: list[EventSink]
+  buffer: list[GameEvent]
+  dropped: int
+  error: Exception | None
+
+  def __init__(self, max_pending: int = FLUSH_QUEUE_SIZE) -> None:
+    self.frame = 0
+    self.active = False
+    self.listeners = {}
+    self.sinks = []
+    self.buffer = []
+    self.dropped = 0
+    self.error = None
+    self._max_pending = max_pending
+    self._queue: queue.Queue[list[GameEvent] | None] | None = None
+    self._thread: threading.Thread | None = None
+
+  def subscribe(self, event_type: str, listener: Callable[..., None]) -> None:
+    self.listeners.setdefault(event_type, []).append(listener)
+    self.active = True
+
+  def unsubscribe(self, event_type: str, listener: Callable[..., None]) -> None:
+    listeners = self.listeners.get(event_type)
+    if listeners is not None and listener in listeners:
+      listeners.remove(listener)
+      if not listeners:
+        del self.listeners[event_type]
+    self.active = bool(self.listeners or self.sinks)
+
+  def add_sink(self, sink: EventSink) -> None:
+    if self._thread is None:
+      self._queue = queue.Queue(self._max_pending)
+      self._thread = threading.Thread(target=self._run, name="event-flusher", daemon=True)
+      self._thread.start()
+    self.sinks.append(sink)
+    self.active = True
+
+  def publish(self, event_type: str, **details: Any) -> None:
+    if not self.active:
+      return
+    listeners = self.listeners.get(event_type)
+    if listeners is not None:
+      for listener in listeners:
+        listener(**details)
+    if self.sinks:
+      self.buffer.append(GameEvent(self.frame, datetime.now(), event_type, details))
+
+  # Hands the frame's events to the flusher. Drops the batch rather than
+  # stall the frame if the flusher is that far behind
+  def end_frame(self) -> None:
+    if not self.buffer or self._queue is None:
+      return
+    try:
+      self._queue.put_nowait(self.buffer)
+    except queue.Full:
+      self.dropped += len(self.buffer)
+    self.buffer = []
+
+  # Blocks until every event published so far has reached the sinks, or the
+  # flusher has stopped on a sink error
+  def flush(self) -> None:
+    if self._queue is None or self._thread is None:
+      return
+    if self.buffer:
+      self._offer(self.buffer)
+      self.buffer = []
+    # A flusher that dies from here on lets go of everything still queued
+    if self._thread.is_alive():
+      self._queue.join()
+
+  def close(self) -> None:
+    if self._queue is None or self._thread is None:
+      return
+    self.flush()
+    self._offer(None)
+    self._thread.join()
+    error = self.error
+    self._queue = None
+    self._thread = None
+    self.sinks = []
+    self.active = bool(self.listeners)
+    self.error = None
+    if error is not None:
+      raise error
+
+  # A flusher that died leaves nobody to make room in the queue, so only wait
+  # for room while it's alive
+  def _offer(self, batch: list[GameEvent] | None) -> None:
+    assert self._queue is not None and self._thread is not None
+    while self._thread.is_alive():
+      try:
+        self._queue.put(batch, timeout=CLOSE_POLL_SECONDS)
+        return
+      except queue.Full:
+        continue
+
+  def _run(self) -> None:
+    assert self._queue is not None
+    pending = self._queue
+    try:
+      while True:
+        batch = pending.get()
+        try:
+          if batch is None:
+            break
+          for sink in self.sinks:
+            sink.write_batch(batch)
+          # Keep the files readable while the game runs without flushing per batch
+          if pending.empty():
+            for sink in self.sinks:
+              sink.flush()
+        finally:
+          pending.task_done()
+      for sink in self.sinks:
+        sink.close()
+    except Exception as error:
+      # Raised again on the game thread by close()
+      self.error = error
+      # Nothing is left to write what's still queued, so stop flush() waiting on it
+      while True:
+        try:
+          pending.get_nowait()
+        except queue.Empty:
+          break
+        pending.task_done()
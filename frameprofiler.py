@@ -0,0 +1,191 @@
+import time
+import pygame
+from typing import TYPE_CHECKING
+from constants import (
+  PROFILER_HISTORY_FRAMES,
+  PROFILER_OVERLAY_REFRESH_SECONDS,
+  TARGET_FPS,
+)
+
+if TYPE_CHECKING:
+  from vectorfont import VectorFont, TextStyle
+
+# In the order they happen within a frame
+PHASES = ("events", "update", "collision", "draw", "overlay", "flip", "wait")
+
+PHASE_COLORS = {
+  "events": pygame.Color(128, 128, 128),
+  "update": pygame.Color(80, 160, 255),
+  "collision": pygame.Color(255, 160, 64),
+  "draw": pygame.Color(96, 224, 96),
+  "overlay": pygame.Color(160, 96, 224),
+  "flip": pygame.Color(255, 96, 96),
+  "wait": pygame.Color(64, 64, 64),
+  "frame": pygame.Color(255, 255, 255),
+}
+
+
+# Fixed-size history of float samples. Pushing never allocates once the
+# buffer is full; the oldest sample is simply overwritten
+class RingBuffer:
+  values: list[float]
+  index: int
+  count: int
+
+  def __init__(self, size: int) -> None:
+    self.values = [0.0] * size
+    self.index = 0
+    self.count = 0
+
+  def __len__(self) -> int:
+    return self.count
+
+  def push(self, value: float) -> None:
+    self.values[self.index] = value
+    self.index = (self.index + 1) % len(self.values)
+    if self.count < len(self.values):
+      self.count += 1
+
+  def clear(self) -> None:
+    self.index = 0
+    self.count = 0
+
+  def ordered(self) -> list[float]:
+    if self.count < len(self.values):
+      return self.values[:self.count]
+    return self.values[self.index:] + self.values[:self.index]
+
+  def percentiles(self, *fractions: float) -> list[float]:
+    if self.count == 0:
+      return [0.0 for _ in fractions]
+    ordered = sorted(self.ordered())
+    last = len(ordered) - 1
+    return [ordered[min(last, int(round(fraction * last)))] for fraction in fractions]
+
+
+# Splits each frame into phases by timestamping the boundaries between them.
+# A phase can be marked several times a frame (e.g. one update per simulation
+# step) and its times add up. Callers are expected to check `enabled` before
+# calling in, so a disabled profiler costs one attribute read per phase and
+# nothing else
+class FrameProfiler:
+  enabled: bool
+  history: dict[str, RingBuffer]
+  current: dict[str, float]
+  frame_start: float
+  last_mark: float
+
+  def __init__(self, history_frames: int = PROFILER_HISTORY_FRAMES) -> None:
+    self.enabled = False
+    self.history = {phase: RingBuffer(history_frames) for phase in (*PHASES, "frame")}
+    self.current = dict.fromkeys(PHASES, 0.0)
+    self.frame_start = 0.0
+    self.last_mark = 0.0
+
+  def begin_frame(self) -> None:
+    self.frame_start = self.last_mark = time.perf_counter()
+    for phase in PHASES:
+      self.current[phase] = 0.0
+
+  def mark(self, phase: str) -> None:
+    now = time.perf_counter()
+    self.current[phase] += (now - self.last_mark) * 1000.0
+    self.last_mark = now
+
+  def end_frame(self) -> None:
+    for phase, elapsed in self.current.items():
+      self.history[phase].push(elapsed)
+    self.history["frame"].push((self.last_mark - self.frame_start) * 1000.0)
+
+  def stats(self, phase: str) -> tuple[float, float, float]:
+    p50, p95, p99 = self.history[phase].percentiles(0.50, 0.95, 0.99)
+    return p50, p95, p99
+
+
+# Debug overlay with per-phase percentiles, entity counts and frame time graphs.
+# Drawing vector text is expensive, so the text is rendered onto its own
+# surface a few times a second and blitted in between; the graphs are cheap
+# line strips and are redrawn every frame
+class ProfilerOverlay:
+  profiler: FrameProfiler
+  font: "VectorFont"
+  style: "TextStyle"
+  text_surface: pygame.Surface
+  refresh_timer: float
+  origin: pygame.Vector2
+  graph_size: pygame.Vector2
+
+  def __init__(self, profiler: FrameProfiler, font: "VectorFont") -> None:
+    from vectorfont import TextStyle
+    self.profiler = profiler
+    self.font = font
+    self.style = TextStyle(size=10, aspect=0.7, weight=1, oblique=0,
+                           spacing=pygame.Vector2(3, 6), color=pygame.Color(255, 255, 96))
+    self.origin = pygame.Vector2(10, 10)
+    self.graph_size = pygame.Vector2(PROFILER_HISTORY_FRAMES, 60)
+    self.text_surface = pygame.Surface((1, 1), pygame.SRCALPHA)
+    self.refresh_timer = PROFILER_OVERLAY_REFRESH_SECONDS
+
+  def graph_origin(self) -> pygame.Vector2:
+    return self.origin + pygame.Vector2(0, self.text_surface.get_height() + 8)
+
+  # `compact` leaves out every phase but the whole frame, and the text cache
+  # stats, for when frames run over budget
+  def update(self, dt: float, counts: dict[str, int], compact: bool = False) -> None:
+    self.refresh_timer += dt
+    if self.refresh_timer < PROFILER_OVERLAY_REFRESH_SECONDS:
+      return
+    self.refresh_timer = 0.0
+    self.render_text(counts, compact)
+
+  def render_text(self, counts: dict[str, int], compact: bool = False) -> None:
+    lines = ["PHASE       P50    P95    P99 MS"]
+    for phase in ("frame", ) if compact else (*PHASES, "frame"):
+      p50, p95, p99 = self.profiler.stats(phase)
+      lines.append(f"{phase.upper():<9}{p50:>6.2f} {p95:>6.2f} {p99:>6.2f}")
+    lines.append("")
+    lines.append("  ".join(f"{name.upper()} {count}" for name, count in counts.items()))
+    if self.font.cache is not None and not compact:
+      cache = self.font.cache.stats()
+      lines.append(f"TEXT CACHE {cache['hit_rate']:.0%} HITS  {cache['entries']} ENTRIES  "
+                   f"{cache['bytes'] // 1024} KIB")
+
+    style = self.style
+    line_height = style.size + style.spacing.y
+    char_width = style.get_size_vector().x + style.spacing.x
+    width = int(max(len(line) for line in lines) * char_width + style.size)
+    height = int(len(lines) * line_height)
+
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    for i, line in enumerate(lines):
+      self.font.text(line, pygame.Vector2(0, i * line_height), style, surface)
+    self.text_surface = surface
+
+  def get_bounds(self) -> pygame.Rect:
+    width = max(self.text_surface.get_width(), self.graph_size.x + 1)
+    height = self.graph_origin().y - self.origin.y + self.graph_size.y + 1
+    return pygame.Rect(self.origin, (width, height))
+
+  def draw(self, surface: pygame.Surface) -> None:
+    surface.blit(self.text_surface, self.origin)
+    self.draw_graph(surface)
+
+  def draw_graph(self, surface: pygame.Surface) -> None:
+    origin = self.graph_origin()
+    width, height = self.graph_size
+    # Scale so two frame budgets fill the graph; the middle line is the budget
+    budget_ms = 1000.0 / TARGET_FPS
+    scale = height / (2 * budget_ms)
+    bottom = origin.y + height
+
+    pygame.draw.rect(surface, PHASE_COLORS["wait"], (origin, self.graph_size), 1)
+    pygame.draw.line(surface, PHASE_COLORS["wait"], (origin.x, bottom - budget_ms * scale),
+                     (origin.x + width, bottom - budget_ms * scale))
+
+    for phase in ("update", "collision", "draw", "frame"):
+      samples = self.profiler.history[phase].ordered()
+      if len(samples) < 2:
+        continue
+      points = [(origin.x + i, bottom - min(sample * scale, height))
+                for i, sample in enumerate(samples)]
+      pygame.draw.lines(surface, PHASE_COLORS[phase], False, points)
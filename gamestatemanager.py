@@ -1,33 +1,61 @@
+import pygame
+from assetcache import AssetCache
+
+
 class GameState:
   name: str
+  # Names in the manager's AssetCache this state can't run without. They are
+  # ready by the time enter() is called
+  assets: tuple[str, ...] = ()
+  # States this one may switch to, whose assets start loading as it is entered
+  next_states: tuple[str, ...] = ()
+  manager: "GameStateManager"
 
   def __init__(self, name: str) -> None:
     self.name = name
 
   def enter(self) -> None:
-    raise NotImplementedError()
-  
+    pass
+
+  def handle_event(self, event: pygame.event.Event) -> None:
+    pass
+
   def update(self, dt: float) -> None:
-    raise NotImplementedError()
-  
+    pass
+
   def exit(self) -> None:
-    raise NotImplementedError()
+    pass
 
 
 class GameStateManager:
   states: dict[str, GameState]
-  curr_state: GameState
+  curr_state: GameState | None
+  assets: AssetCache
 
-  def __init__(self, starting_state_name: str) -> None:
-    self.switch(starting_state_name)
+  def __init__(self, assets: AssetCache | None = None) -> None:
+    self.states = {}
+    self.curr_state = None
+    self.assets = AssetCache() if assets is None else assets
 
   def add_state(self, state_name: str, state: GameState) -> None:
+    state.manager = self
     self.states[state_name] = state
 
   def get_state(self, state_name: str) -> GameState:
     return self.states[state_name]
-  
+
+  def preload(self, state_name: str) -> None:
+    self.assets.preload(self.get_state(state_name).assets)
+
+  # Only waits if the new state's assets are still loading, which they aren't
+  # when the previous state ran for a moment after preloading them
   def switch(self, state_name: str) -> None:
-    self.curr_state.exit()
-    self.curr_state = self.get_state(state_name)
-    self.curr_state.enter()
+    state = self.get_state(state_name)
+    for name in state.assets:
+      self.assets.get(name)
+    if self.curr_state is not None:
+      self.curr_state.exit()
+    self.curr_state = state
+    state.enter()
+    for next_state in state.next_states:
+      self.preload(next_state)
@@ -0,0 +1,82 @@
+import enum
+from eventbus import EventBus
+from frameprofiler import RingBuffer
+from constants import (
+  TARGET_FPS,
+  GOVERNOR_WINDOW_FRAMES,
+  GOVERNOR_DEGRADE_RATIO,
+  GOVERNOR_RECOVER_RATIO,
+  GOVERNOR_RECOVER_WINDOWS,
+)
+
+
+# Details the game gives up while frames run over budget, each level on top of
+# the ones before it. Whatever the player is least likely to notice goes first;
+# spawning fewer asteroids changes the game itself, so it goes last
+class Degradation(enum.IntEnum):
+  FULL = 0
+  # The periodic state log skips its snapshots; --record recordings don't
+  NO_SNAPSHOTS = 1
+  # The profiler overlay only shows frame times and counts
+  SIMPLE_TEXT = 2
+  # Asteroids and bullets are drawn as dots in the vector draw mode, and
+  # particles not at all
+  SIMPLE_DRAW = 3
+  # The field waits GOVERNOR_SPAWN_SLOWDOWN times as long between spawns
+  FEWER_SPAWNS = 4
+
+
+# Collects frame times in windows of GOVERNOR_WINDOW_FRAMES and judges each
+# window by its median, so a single hitch such as a level load doesn't count.
+# One window over budget is enough to drop a level, but climbing back takes
+# several well under it in a row, so a level that only just fits doesn't flip
+# back and forth. Every change is published on the bus as "governor_level"
+class FrameGovernor:
+  bus: EventBus
+  budget_ms: float
+  level: Degradation
+  samples: RingBuffer
+  # Windows in a row under the recovery threshold
+  calm_windows: int
+  # Level changes so far, either way
+  changes: int
+
+  def __init__(self, bus: EventBus, budget_ms: float = 1000.0 / TARGET_FPS,
+               window: int = GOVERNOR_WINDOW_FRAMES) -> None:
+    self.bus = bus
+    self.budget_ms = budget_ms
+    self.level = Degradation.FULL
+    self.samples = RingBuffer(window)
+    self.calm_windows = 0
+    self.changes = 0
+
+  # Returns whether the level changed
+  def record(self, frame_ms: float) -> bool:
+    samples = self.samples
+    samples.push(frame_ms)
+    if len(samples) < len(samples.values):
+      return False
+    median, = samples.percentiles(0.5)
+    samples.clear()
+
+    if median > self.budget_ms * GOVERNOR_DEGRADE_RATIO:
+      self.calm_windows = 0
+      if self.level < max(Degradation):
+        self.set_level(Degradation(self.level + 1), median)
+        return True
+    elif median < self.budget_ms * GOVERNOR_RECOVER_RATIO:
+      self.calm_windows += 1
+      if self.calm_windows >= GOVERNOR_RECOVER_WINDOWS and self.level > Degradation.FULL:
+        self.calm_windows = 0
+        self.set_level(Degradation(self.level - 1), median)
+        return True
+    else:
+      self.calm_windows = 0
+    return False
+
+  def set_level(self, level: Degradation, frame_ms: float) -> None:
+    previous = self.level
+    self.level = level
+    self.changes += 1
+    self.bus.publish("governor_level", level=level.name.lower(), previous=previous.name.lower(),
+                     frame_ms=round(frame_ms, 2))
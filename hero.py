@@ -1,6 +1,9 @@
 import pygame
+from typing import TYPE_CHECKING, ClassVar
 from circleshape import CircleShape
 from bullet import Bullet
+from inputstate import Controls
+from mesh import Mesh
 from constants import (
   HERO_RADIUS,
   HERO_TURN_SPEED,
@@ -10,59 +13,116 @@ from constants import (
   OBJ_LINE_WIDTH,
 )
 
+if TYPE_CHECKING:
+  from spriteatlas import SpriteAtlas
+  from particles import ParticleSystem
+
+# The control flags as plain ints. Testing an IntFlag goes through the enum
+# machinery, which shows up in profiles of runs stepping many games
+RIGHT = int(Controls.RIGHT)
+LEFT = int(Controls.LEFT)
+FORWARD = int(Controls.FORWARD)
+BACKWARD = int(Controls.BACKWARD)
+SHOOT = int(Controls.SHOOT)
+
 
 class Hero(CircleShape):
   rotation: float
+  previous_rotation: float
   bullet_count: int
-  shot_requested: bool
+  mesh: Mesh
+  # What the player is holding this step; set by the game before update()
+  controls: Controls
+  # Where thrusting leaves its exhaust, if anywhere; set by the game
+  particles: ClassVar["ParticleSystem | None"] = None
 
   def __init__(self, x: float, y: float) -> None:
     super().__init__(x, y, HERO_RADIUS)
     self.rotation = 0
+    self.previous_rotation = 0
     self.bullet_count = 0
-    self.shot_requested = False
+    self.controls = Controls.NONE
+    self.mesh = Mesh([tuple(point) for point in self.mesh_points(pygame.Vector2(), 0, HERO_RADIUS)])
+    self._forward = pygame.Vector2(0, 1)
+    self._forward_rotation = 0.0
 
+  # Recomputed only after the hero turns. Don't modify the returned vector
   def get_forward(self) -> pygame.Vector2:
-    return pygame.Vector2(0, 1).rotate(self.rotation)
-
-  def get_mesh_points(self) -> list[pygame.Vector2]:
-    forward = self.get_forward()
-    right = pygame.Vector2(0, 1).rotate(self.rotation + 90) * self.radius / 1.5
-    a = self.position + forward * self.radius
-    b = self.position - forward * self.radius - right
-    c = self.position - forward * self.radius + right
+    if self.rotation != self._forward_rotation:
+      self._forward = pygame.Vector2(0, 1).rotate(self.rotation)
+      self._forward_rotation = self.rotation
+    return self._forward
+
+  @staticmethod
+  def mesh_points(position: pygame.Vector2, rotation: float, radius: float) -> list[pygame.Vector2]:
+    forward = pygame.Vector2(0, 1).rotate(rotation)
+    right = pygame.Vector2(0, 1).rotate(rotation + 90) * radius / 1.5
+    a = position + forward * radius
+    b = position - forward * radius - right
+    c = position - forward * radius + right
     return [a, b, c]
   
-  def draw(self, surface: pygame.Surface) -> None:
-    pygame.draw.polygon(surface, "white", self.get_mesh_points(), OBJ_LINE_WIDTH)
+  def save_previous(self) -> None:
+    super().save_previous()
+    self.previous_rotation = self.rotation
+
+  def get_draw_rotation(self, alpha: float) -> float:
+    if alpha >= 1.0:
+      return self.rotation
+    return self.previous_rotation + (self.rotation - self.previous_rotation) * alpha
+
+  # On screen, relative to the camera view
+  def get_draw_mesh_points(self, alpha: float) -> list[tuple[float, float]]:
+    x, y = self.get_screen_position(alpha)
+    return self.mesh.transform(x, y, self.get_draw_rotation(alpha))
+
+  def draw(self, surface: pygame.Surface, alpha: float = 1.0) -> None:
+    pygame.draw.polygon(surface, "white", self.get_draw_mesh_points(alpha), OBJ_LINE_WIDTH)
+
+  # There is only one, and the player has to see which way it points
+  def draw_dot(self, surface: pygame.Surface, alpha: float = 1.0) -> None:
+    self.draw(surface, alpha)
+
+  def get_blit(self, atlas: "SpriteAtlas", alpha: float = 1.0) -> tuple[pygame.Surface, tuple[float, float]]:
+    return atlas.hero(self.get_draw_rotation(alpha), self.get_screen_position(alpha))
+
+  # The triangle's back corners stick out past the radius
+  def get_bounds(self, alpha: float = 1.0) -> pygame.Rect:
+    points = self.get_draw_mesh_points(alpha)
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    left, top = min(xs) - OBJ_LINE_WIDTH, min(ys) - OBJ_LINE_WIDTH
+    right, bottom = max(xs) + OBJ_LINE_WIDTH, max(ys) + OBJ_LINE_WIDTH
+    return pygame.Rect(left, top, right - left + 1, bottom - top + 1)
 
   def rotate(self, dir: float, dt: float) -> None:
     d_rot = HERO_TURN_SPEED * dir * dt
     self.rotation += d_rot
 
-  def shoot_key_pressed(self) -> None:
-    self.shot_requested = True
-
   def update(self, dt: float) -> None:
-    keys = pygame.key.get_pressed()
+    controls = int(self.controls)
 
-    if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+    if controls & RIGHT:
       self.rotate(+1, dt)
-    if keys[pygame.K_a] or keys[pygame.K_LEFT]:
+    if controls & LEFT:
       self.rotate(-1, dt)
-    if keys[pygame.K_w] or keys[pygame.K_UP]:
+    if controls & FORWARD:
       self.move(+1, dt)
-    if keys[pygame.K_s] or keys[pygame.K_DOWN]:
+    if controls & BACKWARD:
       self.move(-1, dt)
 
-    if self.shot_requested:
+    if controls & SHOOT:
       self.attempt_shoot()
-    self.shot_requested = False
 
   def move(self, dir: float, dt: float) -> None:
     forward = self.get_forward()
     velocity = forward * dir * HERO_SPEED
     self.position += velocity * dt
+    if self.particles is not None:
+      # Out of the back going forward, out of the nose backing up
+      back = -forward * dir
+      nozzle = self.position + back * self.radius
+      self.particles.exhaust(nozzle.x, nozzle.y, back)
 
   def can_shoot(self) -> bool:
     return self.bullet_count < MAX_BULLETS
@@ -72,15 +132,15 @@ class Hero(CircleShape):
       self.shoot()
 
   def shoot(self) -> None:
-    bullet = Bullet(self.position.x, self.position.y, self.bullet_died)
+    bullet = Bullet.create(self.position.x, self.position.y, self.bullet_died)
     self.bullet_created()
 
     bullet_speed = HERO_SHOOT_SPEED
 
-    keys = pygame.key.get_pressed()
-    if keys[pygame.K_w] or keys[pygame.K_UP]:
+    controls = int(self.controls)
+    if controls & FORWARD:
       bullet_speed += HERO_SPEED
-    if keys[pygame.K_s] or keys[pygame.K_DOWN]:
+    if controls & BACKWARD:
       bullet_speed -= HERO_SPEED
 
     bullet.velocity = self.get_forward() * bullet_speed
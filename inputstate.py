@@ -0,0 +1,139 @@
+import struct
+from enum import IntFlag
+from typing import BinaryIO, Protocol
+
+import pygame
+
+# Input recording (.bsi)
+#
+#   header   HEADER: magic, version, RNG seed, simulation step in seconds
+#   runs     RUN: how many consecutive steps held the same controls, and the controls
+#
+# Held keys rarely change from one step to the next, so a run-length encoded
+# minute of play is usually a few hundred bytes. Replaying needs the same seed
+# and step, which is why both are in the header
+MAGIC = b"BSIN"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHqd")
+RUN = struct.Struct("<HB")
+MAX_RUN = 0xFFFF
+
+
+# The controls the simulation reads, sampled once per simulation step
+class Controls(IntFlag):
+  NONE = 0
+  RIGHT = 1
+  LEFT = 2
+  FORWARD = 4
+  BACKWARD = 8
+  # A shot was requested since the last step
+  SHOOT = 16
+
+
+class InputSource(Protocol):
+  def sample(self) -> Controls: ...
+
+
+class KeyboardInput:
+  shot_requested: bool
+
+  def __init__(self) -> None:
+    self.shot_requested = False
+
+  # Shots come from key down events, which arrive once per frame, so they are
+  # latched until the next step picks them up
+  def request_shot(self) -> None:
+    self.shot_requested = True
+
+  def sample(self) -> Controls:
+    keys = pygame.key.get_pressed()
+    controls = Controls.NONE
+    if keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+      controls |= Controls.RIGHT
+    if keys[pygame.K_a] or keys[pygame.K_LEFT]:
+      controls |= Controls.LEFT
+    if keys[pygame.K_w] or keys[pygame.K_UP]:
+      controls |= Controls.FORWARD
+    if keys[pygame.K_s] or keys[pygame.K_DOWN]:
+      controls |= Controls.BACKWARD
+    if self.shot_requested:
+      controls |= Controls.SHOOT
+      self.shot_requested = False
+    return controls
+
+
+class InputRecorder:
+  path: str
+  steps: int
+
+  def __init__(self, path: str, seed: int, step_dt: float) -> None:
+    self.path = path
+    self.steps = 0
+    self._file: BinaryIO = open(path, "wb")
+    self._file.write(HEADER.pack(MAGIC, VERSION, seed, step_dt))
+    self._controls = Controls.NONE
+    self._run = 0
+
+  def record(self, controls: Controls) -> None:
+    self.steps += 1
+    if controls == self._controls and self._run < MAX_RUN:
+      self._run += 1
+      return
+    self._write_run()
+    self._controls = controls
+    self._run = 1
+
+  def _write_run(self) -> None:
+    if self._run:
+      self._file.write(RUN.pack(self._run, self._controls))
+
+  def close(self) -> None:
+    self._write_run()
+    self._run = 0
+    self._file.close()
+
+
+# Feeds a recording back one step at a time. Once it runs out it keeps
+# returning no input and reports itself finished
+class ReplayInput:
+  path: str
+  seed: int
+  step_dt: float
+  runs: list[tuple[int, Controls]]
+  finished: bool
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    with open(path, "rb") as file:
+      data = file.read()
+    if len(data) < HEADER.size:
+      raise ValueError(f"{path} is not an input recording")
+    magic, version, self.seed, self.step_dt = HEADER.unpack_from(data)
+    if magic != MAGIC:
+      raise ValueError(f"{path} is not an input recording")
+    if version != VERSION:
+      raise ValueError(f"{path} has unsupported version {version}")
+
+    body = memoryview(data)[HEADER.size:]
+    usable = len(body) - len(body) % RUN.size
+    self.runs = [(count, Controls(controls)) for count, controls in RUN.iter_unpack(body[:usable])]
+    self.finished = not self.runs
+    self._run_index = 0
+    self._left_in_run = self.runs[0][0] if self.runs else 0
+
+  def __len__(self) -> int:
+    return sum(count for count, _ in self.runs)
+
+  def sample(self) -> Controls:
+    if self.finished:
+      return Controls.NONE
+    controls = self.runs[self._run_index][1]
+    self._left_in_run -= 1
+    if self._left_in_run == 0:
+      self._run_index += 1
+      if self._run_index == len(self.runs):
+        self.finished = True
+      else:
+        self._left_in_run = self.runs[self._run_index][0]
+    return controls
@@ -1,136 +1,221 @@
-import inspect
 import json
 import math
+import queue
+import threading
 from datetime import datetime
-
-__all__ = ["log_state", "log_event"]
+from typing import Any, Iterable, Iterator, NamedTuple, Protocol
+
+__all__ = [
+    "GroupSnapshot",
+    "StateSnapshot",
+    "StateSink",
+    "JsonlStateSink",
+    "StateLogger",
+    "capture_group",
+    "capture_store",
+    "iter_sprites",
+    "sprite_info",
+]
 
 _FPS = 60
 _MAX_SECONDS = 16
-_SPRITE_SAMPLE_LIMIT = 10  # Maximum number of sprites to log per group
-
-_frame_count = 0
-_state_log_initialized = False
-_event_log_initialized = False
-_start_time = datetime.now()
-
-
-def log_state():
-    global _frame_count, _state_log_initialized
-
-    # Stop logging after `_MAX_SECONDS` seconds
-    if _frame_count > _FPS * _MAX_SECONDS:
-        return
-
-    # Take a snapshot approx. once per second
-    _frame_count += 1
-    if _frame_count % _FPS != 0:
-        return
-
-    now = datetime.now()
-
-    frame = inspect.currentframe()
-    if frame is None:
-        return
-
-    frame_back = frame.f_back
-    if frame_back is None:
-        return
-
-    local_vars = frame_back.f_locals.copy()
-
-    screen_size = []
-    game_state = {}
-
-    for key, value in local_vars.items():
-        if "pygame" in str(type(value)) and hasattr(value, "get_size"):
-            screen_size = value.get_size()
-
-        if hasattr(value, "__class__") and "Group" in value.__class__.__name__:
-            sprites_data = []
-
-            for i, sprite in enumerate(value):
-                if i >= _SPRITE_SAMPLE_LIMIT:
-                    break
-
-                sprite_info = {"type": sprite.__class__.__name__}
-
-                if hasattr(sprite, "position"):
-                    sprite_info["pos"] = [
-                        round(sprite.position.x, 2),
-                        round(sprite.position.y, 2),
-                    ]
-
-                if hasattr(sprite, "velocity"):
-                    sprite_info["vel"] = [
-                        round(sprite.velocity.x, 2),
-                        round(sprite.velocity.y, 2),
-                    ]
-
-                if hasattr(sprite, "radius"):
-                    sprite_info["rad"] = sprite.radius
-
-                if hasattr(sprite, "rotation"):
-                    sprite_info["rot"] = round(sprite.rotation, 2)
-
-                sprites_data.append(sprite_info)
-
-            game_state[key] = {"count": len(value), "sprites": sprites_data}
-
-        if len(game_state) == 0 and hasattr(value, "position"):
-            sprite_info = {"type": value.__class__.__name__}
-
-            sprite_info["pos"] = [
-                round(value.position.x, 2),
-                round(value.position.y, 2),
-            ]
-
-            if hasattr(value, "velocity"):
-                sprite_info["vel"] = [
-                    round(value.velocity.x, 2),
-                    round(value.velocity.y, 2),
-                ]
-
-            if hasattr(value, "radius"):
-                sprite_info["rad"] = value.radius
-
-            if hasattr(value, "rotation"):
-                sprite_info["rot"] = round(value.rotation, 2)
-
-            game_state[key] = sprite_info
-
-    entry = {
-        "timestamp": now.strftime("%H:%M:%S.%f")[:-3],
-        "elapsed_s": math.floor((now - _start_time).total_seconds()),
-        "frame": _frame_count,
-        "screen_size": screen_size,
+_QUEUE_SIZE = 8  # Snapshots waiting for the writer before new ones get dropped
+_CLOSE_POLL_SECONDS = 0.1  # How often close() checks the writer is still there to wait for
+
+
+# Column-wise copy of a group's sprites taken on the game thread. Only plain
+# data and the owners' types are read later, so the writer thread never
+# touches live sprite state
+class GroupSnapshot(NamedTuple):
+    owners: list[Any]
+    positions: Any  # sequence of (x, y)
+    velocities: Any  # sequence of (x, y)
+    radii: Any
+    rotations: Any | None
+
+
+class StateSnapshot(NamedTuple):
+    frame: int
+    time: datetime
+    screen_size: tuple[int, int]
+    groups: dict[str, GroupSnapshot]
+    # Written as a single sprite instead of a group, e.g. the hero
+    sprites: dict[str, GroupSnapshot]
+    # Entity store rows, split into named groups by owner type on the writer thread
+    store: GroupSnapshot | None = None
+    store_groups: dict[type, str] = {}
+
+
+def capture_group(sprites: Iterable[Any], with_rotation: bool = False) -> GroupSnapshot:
+    owners = list(sprites)
+    return GroupSnapshot(
+        owners,
+        [tuple(sprite.position) for sprite in owners],
+        [tuple(sprite.velocity) for sprite in owners],
+        [sprite.radius for sprite in owners],
+        [sprite.rotation for sprite in owners] if with_rotation else None,
+    )
+
+
+# The store already holds everything in arrays, so a snapshot is a few bulk
+# copies no matter how many entities there are
+def capture_store(store: Any) -> GroupSnapshot:
+    count = store.count
+    return GroupSnapshot(
+        list(store.owners),
+        store.positions[:count].copy(),
+        store.velocities[:count].copy(),
+        store.radii[:count].copy(),
+        None,
+    )
+
+
+def sprite_info(snapshot: GroupSnapshot, i: int) -> dict[str, Any]:
+    x, y = snapshot.positions[i]
+    vx, vy = snapshot.velocities[i]
+    info = {
+        "type": snapshot.owners[i].__class__.__name__,
+        "pos": [round(float(x), 2), round(float(y), 2)],
+        "vel": [round(float(vx), 2), round(float(vy), 2)],
+        "rad": float(snapshot.radii[i]),
+    }
+    if snapshot.rotations is not None:
+        info["rot"] = round(float(snapshot.rotations[i]), 2)
+    return info
+
+
+# Walks every captured sprite as (name, is_single, group, index), with the
+# store rows sorted into their named groups
+def iter_sprites(snapshot: StateSnapshot) -> Iterator[tuple[str, bool, GroupSnapshot, int]]:
+    for name, group in snapshot.groups.items():
+        for i in range(len(group.owners)):
+            yield name, False, group, i
+
+    if snapshot.store is not None:
+        store_groups = snapshot.store_groups
+        for i, owner in enumerate(snapshot.store.owners):
+            name = store_groups.get(type(owner))
+            if name is not None:
+                yield name, False, snapshot.store, i
+
+    for name, sprite in snapshot.sprites.items():
+        yield name, True, sprite, 0
+
+
+def snapshot_to_json(snapshot: StateSnapshot, start_time: datetime) -> dict[str, Any]:
+    game_state: dict[str, Any] = {}
+    for name in (*snapshot.groups, *snapshot.store_groups.values()):
+        game_state[name] = {"count": 0, "sprites": []}
+
+    for name, single, group, i in iter_sprites(snapshot):
+        if single:
+            game_state[name] = sprite_info(group, i)
+        else:
+            group_state = game_state[name]
+            group_state["sprites"].append(sprite_info(group, i))
+            group_state["count"] += 1
+
+    return {
+        "timestamp": snapshot.time.strftime("%H:%M:%S.%f")[:-3],
+        "elapsed_s": math.floor((snapshot.time - start_time).total_seconds()),
+        "frame": snapshot.frame,
+        "screen_size": list(snapshot.screen_size),
         **game_state,
     }
 
-    # New log file on each run
-    mode = "w" if not _state_log_initialized else "a"
-    with open("game_state.jsonl", mode) as f:
-        f.write(json.dumps(entry) + "\n")
-
-    _state_log_initialized = True
-
-
-def log_event(event_type, **details):
-    global _event_log_initialized
 
-    now = datetime.now()
-
-    event = {
-        "timestamp": now.strftime("%H:%M:%S.%f")[:-3],
-        "elapsed_s": math.floor((now - _start_time).total_seconds()),
-        "frame": _frame_count,
-        "type": event_type,
-        **details,
-    }
-
-    mode = "w" if not _event_log_initialized else "a"
-    with open("game_events.jsonl", mode) as f:
-        f.write(json.dumps(event) + "\n")
+class StateSink(Protocol):
+    def write(self, snapshot: StateSnapshot) -> None: ...
+    def flush(self) -> None: ...
+    def close(self) -> None: ...
+
+
+class JsonlStateSink:
+    path: str
+
+    def __init__(self, path: str = "game_state.jsonl") -> None:
+        self.path = path
+        self._start_time = datetime.now()
+        # New log file on each run
+        self._file = open(path, "w")
+
+    def write(self, snapshot: StateSnapshot) -> None:
+        entry = snapshot_to_json(snapshot, self._start_time)
+        self._file.write(json.dumps(entry) + "\n")
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+# Feeds snapshots to a sink from a background thread. The game thread only
+# captures snapshots and hands them over; serialization and file I/O happen on
+# the writer, and the sink keeps one file handle open for the whole run. If the
+# writer falls behind, new snapshots are dropped rather than stalling the frame.
+# If the sink fails, the writer stops and close() raises what went wrong
+class StateLogger:
+    sink: StateSink
+    interval: int
+    max_frames: int | None
+    dropped: int
+    written: int
+    error: Exception | None
+
+    def __init__(self, sink: StateSink, interval: int = _FPS,
+                 max_frames: int | None = _FPS * _MAX_SECONDS,
+                 max_pending: int = _QUEUE_SIZE) -> None:
+        self.sink = sink
+        self.interval = interval
+        self.max_frames = max_frames
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+        self._queue: queue.Queue[StateSnapshot | None] = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="state-logger", daemon=True)
+        self._thread.start()
+
+    # By default a snapshot approx. once per second, for the first `_MAX_SECONDS` seconds
+    def wants(self, frame: int) -> bool:
+        if self.max_frames is not None and frame > self.max_frames:
+            return False
+        return frame % self.interval == 0
+
+    def submit(self, snapshot: StateSnapshot) -> bool:
+        try:
+            self._queue.put_nowait(snapshot)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    # Waits for the writer to drain the queue. A writer that died leaves
+    # nobody to make room for the end marker, so only wait while it's alive
+    def close(self) -> None:
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=_CLOSE_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self) -> None:
+        try:
+            while True:
+                snapshot = self._queue.get()
+                if snapshot is None:
+                    break
+                self.sink.write(snapshot)
+                self.written += 1
+                # Keep the file readable while the game runs without flushing per entry
+                if self._queue.empty():
+                    self.sink.flush()
+            self.sink.close()
+        except Exception as error:
+            # Raised again on the game thread by close()
+            self.error = error
 
-    _event_log_initialized = True
-    
\ No newline at end of file
@@ -1,138 +1,956 @@
-import sys
+import time
+# Taken before anything heavy is imported, for the startup report
+IMPORT_START = time.perf_counter()
+
+import os
+import random
+import importlib.util
+import itertools
+from operator import itemgetter
+from datetime import datetime
 import pygame
 import logger
+from typing import TYPE_CHECKING
 
 from gamestatemanager import GameStateManager
+from assetcache import AssetCache
+from states.title_state import TitleState
+from states.main_state import MainState
+from states.game_over_state import GameOverState
 from hero import Hero
 from asteroid import Asteroid
 from bullet import Bullet
 from asteroidfield import AsteroidField
-from vectorfont import VectorFont
+from circleshape import CircleShape
+from camera import Camera
+from spatialhash import SpatialHash
+from frameprofiler import FrameProfiler
+from governor import FrameGovernor, Degradation
+from entitypool import EntityPool
+from eventbus import EventBus, JsonlEventSink
+from inputstate import InputSource, KeyboardInput, InputRecorder, ReplayInput
 from constants import (
   SCREEN_WIDTH,
   SCREEN_HEIGHT,
+  WORLD_WIDTH,
+  WORLD_HEIGHT,
   TARGET_FPS,
   LOGGING_ENABLED,
   INITIAL_DT,
+  HEADLESS_DT,
+  SIMULATION_RATE,
+  MAX_CATCH_UP_STEPS,
+  INTERPOLATION_ENABLED,
+  SPATIAL_HASH_ENABLED,
+  SPATIAL_HASH_CELL_SIZE,
+  SWEPT_COLLISIONS_ENABLED,
+  ENTITY_STORE_ENABLED,
+  PARTICLES_ENABLED,
+  PROFILER_ENABLED,
+  RECORDING_QUEUE_SIZE,
+  DIRTY_RECTS_ENABLED,
+  DRAW_MODE,
+  ENTITY_POOLS_ENABLED,
+  PLAY_AREA_MARGIN,
+  ASTEROID_MAX_RADIUS,
+  DORMANT_ENABLED,
+  ACTIVE_AREA_MARGIN,
+  DORMANT_UPDATE_INTERVAL,
+  ASTEROID_SPAWN_RATE_SECONDS,
+  GOVERNOR_ENABLED,
+  GOVERNOR_SPAWN_SLOWDOWN,
 )
 
+if TYPE_CHECKING:
+  from entitystore import EntityStore
+  from vectorfont import VectorFont
+  from frameprofiler import ProfilerOverlay
+  from dirtyrects import DirtyRectTracker
+  from spriteatlas import SpriteAtlas
+  from particles import ParticleSystem
+
+IMPORT_END = time.perf_counter()
+
 
 class Game:
   gsm: GameStateManager
+  # Font and atlas, shared by every state and loaded ahead of the state that
+  # first needs them
+  assets: AssetCache
+  # The state run() starts in
+  start_state: str
 
   clock: pygame.time.Clock
   surface: pygame.Surface
+  # The screen, in screen coordinates
   bounds: pygame.Rect
-  font: VectorFont
+  # Everything else is in world coordinates
+  world: pygame.Rect
+  # The world plus PLAY_AREA_MARGIN on every side; asteroids leaving it are
+  # despawned or wrapped around
+  play_area: pygame.Rect
+  # Follows the hero; bullets leaving its view are culled
+  camera: Camera
 
   updatables: pygame.sprite.Group
   drawables: pygame.sprite.Group
   asteroids: pygame.sprite.Group
   bullets: pygame.sprite.Group
+  # Asteroids far from the view, in none of the groups above
+  dormant: pygame.sprite.Group
+  dormant_enabled: bool
+  # Sprite asteroids in `dormant`, split into DORMANT_UPDATE_INTERVAL buckets
+  # moved in turn, each with the dormant_phase it was last moved on
+  dormant_buckets: list[list[tuple[Asteroid, int]]]
+  # update_entities() calls so far
+  dormant_phase: int
+  # Bucket the next asteroid to fall asleep goes into
+  dormant_cursor: int
 
   hero: Hero
+  # Debris and exhaust, in windowed play with numpy installed
+  particles: "ParticleSystem | None"
+
+  headless: bool
+  fixed_dt: float
+  seed: int | None
+  rng: random.Random
+  running: bool
+  # Simulation steps taken so far
+  frame: int
+  # run() stops once this many steps were taken, if set
+  max_frames: int | None
+  # The world has to be built before the next game: a window opens on the
+  # title with no world yet, and a hit ends the game once the step is done
+  reset_pending: bool
+
+  step_dt: float
+  accumulator: float
+  interpolation_enabled: bool
+
+  store: "EntityStore | None"
+  asteroid_pool: EntityPool[Asteroid] | None
+  bullet_pool: EntityPool[Bullet] | None
+
+  spatial_hash: SpatialHash
+  spatial_hash_enabled: bool
+  swept_collisions_enabled: bool
+
+  profiler: FrameProfiler
+  overlay_visible: bool
+
+  # Drops details while frames run over budget; None when the run has to
+  # replay exactly
+  governor: FrameGovernor | None
+  # What the governor has given up so far
+  degradation: Degradation
+  # Seconds between asteroid spawns
+  spawn_interval: float
+
+  dirty_rects_enabled: bool
+  dirty_tracker: "DirtyRectTracker | None"
+  # What the last draw() changed; None means the whole screen
+  dirty_rects: list[pygame.Rect] | None
+
+  draw_mode: str
+  # Taken from the asset cache the first time something is blitted
+  atlas: "SpriteAtlas | None"
+
+  # Milliseconds spent in each part of getting the first frame out
+  startup_times: dict[str, float]
+
+  # Gameplay events; the JSONL event log is one of its sinks
+  bus: EventBus
+
+  # The hero's controls are sampled from here once per simulation step
+  keyboard: KeyboardInput
+  input_source: InputSource
+  replay: ReplayInput | None
+  input_recorder: InputRecorder | None
 
   logging_enabled: bool
+  state_logger: logger.StateLogger | None
+  recorder: logger.StateLogger | None
 
-  def __init__(self) -> None:
+  def __init__(self, entity_store: bool = ENTITY_STORE_ENABLED, headless: bool = False,
+               seed: int | None = None, fixed_dt: float = HEADLESS_DT,
+               record_path: str | None = None, replay: ReplayInput | None = None,
+               record_input_path: str | None = None) -> None:
     print(f"Starting Asteroids with pygame version: {pygame.version.ver}")
     print(f"Screen width: {SCREEN_WIDTH}")
     print(f"Screen height: {SCREEN_HEIGHT}")
 
-    pygame.init()
+    self.startup_times = {"import": (IMPORT_END - IMPORT_START) * 1000.0}
+    init_start = time.perf_counter()
+
+    self.headless = headless
+    self.fixed_dt = fixed_dt
+    if replay is not None:
+      seed = replay.seed
+    elif seed is None and record_input_path is not None:
+      # An input recording only replays under the same seed, so it needs one
+      seed = random.randrange(2 ** 63)
+    self.seed = seed
+    # Everything random in the simulation draws from this, so a seed pins down
+    # the whole run as long as the dt sequence is fixed too
+    self.rng = random.Random(seed)
+    self.running = False
+    self.frame = 0
+    self.max_frames = None
+    self.reset_pending = False
+
+    # Headless runs take exactly one step of fixed_dt per frame
+    self.step_dt = fixed_dt if headless else 1 / SIMULATION_RATE
+    if replay is not None:
+      self.step_dt = replay.step_dt
+    self.accumulator = 0.0
+    self.interpolation_enabled = INTERPOLATION_ENABLED
+
+    if headless:
+      # Must be set before the display module initializes
+      os.environ["SDL_VIDEODRIVER"] = "dummy"
+
+    # Display (which brings events and the keyboard along) is the only
+    # subsystem the game uses; pygame.init() would also start audio, joysticks
+    # and font rendering
+    pygame.display.init()
 
     self.clock = pygame.time.Clock()
     self.surface = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     # TODO: research how to use pygame.OPENGL
     self.bounds = self.surface.get_rect()
+    self.world = pygame.Rect(0, 0, WORLD_WIDTH, WORLD_HEIGHT)
+    self.play_area = self.world.inflate(2 * PLAY_AREA_MARGIN, 2 * PLAY_AREA_MARGIN)
+    self.camera = Camera(self.world, self.bounds.size)
+
+    self.assets = AssetCache()
+    self.assets.register("font", self.load_font)
+    self.assets.register("atlas", self.load_atlas, self.finish_atlas)
 
-    self.gsm = GameStateManager("title")
-    self.font = VectorFont(self.surface, "Main", "mainfont.json")
-    
     self.updatables = pygame.sprite.Group()
     self.drawables = pygame.sprite.Group()
     self.asteroids = pygame.sprite.Group()
     self.bullets = pygame.sprite.Group()
+    self.dormant = pygame.sprite.Group()
+    self.dormant_enabled = DORMANT_ENABLED
+    self.dormant_buckets = [[] for _ in range(DORMANT_UPDATE_INTERVAL)]
+    self.dormant_phase = 0
+    self.dormant_cursor = 0
+
+    if entity_store:
+      # numpy is optional, so only pull it in when the backend is requested
+      from entitystore import EntityStore
+      self.store = EntityStore()
+    else:
+      self.store = None
+
+    if ENTITY_POOLS_ENABLED:
+      self.asteroid_pool = EntityPool()
+      self.bullet_pool = EntityPool()
+    else:
+      self.asteroid_pool = None
+      self.bullet_pool = None
+
+    self.bus = EventBus()
+    if LOGGING_ENABLED:
+      self.bus.add_sink(JsonlEventSink())
+
+    # Only for show, so headless games go without. numpy is optional, so the
+    # module is only imported when it is there to use
+    if PARTICLES_ENABLED and not headless and importlib.util.find_spec("numpy") is not None:
+      from particles import ParticleSystem
+      self.particles = ParticleSystem()
+      self.bus.subscribe("asteroid_split", self.asteroid_broke_up)
+      self.bus.subscribe("asteroid_died", self.asteroid_broke_up)
+    else:
+      self.particles = None
+
+    self.keyboard = KeyboardInput()
+    self.replay = replay
+    self.input_source = self.keyboard if replay is None else replay
+    if record_input_path is None:
+      self.input_recorder = None
+    else:
+      self.input_recorder = InputRecorder(record_input_path, self.seed, self.step_dt)
+
+    # Spawning less would change what the seed plays out, and headless frame
+    # times don't hold anyone up
+    replays_exactly = headless or replay is not None or record_input_path is not None
+    self.governor = FrameGovernor(self.bus) if GOVERNOR_ENABLED and not replays_exactly else None
+    self.set_degradation(Degradation.FULL)
+
+    if headless:
+      # Callers step headless games right away, with no title in between
+      self.bind()
+      self.populate()
+    else:
+      # Built when the first game starts, so the title shows up sooner
+      self.reset_pending = True
+
+    self.spatial_hash = SpatialHash(SPATIAL_HASH_CELL_SIZE)
+    self.spatial_hash_enabled = SPATIAL_HASH_ENABLED
+    self.swept_collisions_enabled = SWEPT_COLLISIONS_ENABLED
+
+    self.profiler = FrameProfiler()
+    self.profiler.enabled = PROFILER_ENABLED
+    self._overlay = None
+    self.overlay_visible = False
+
+    self.dirty_rects_enabled = DIRTY_RECTS_ENABLED
+    self.dirty_tracker = None
+    self.dirty_rects = None
+
+    self.draw_mode = DRAW_MODE
+    # Rendered on first use so vector-only runs don't pay for it
+    self.atlas = None
+
+    self.logging_enabled = LOGGING_ENABLED
+    # Opened on first use so runs without logging never start the writer
+    self.state_logger = None
 
+    if record_path is None:
+      self.recorder = None
+    else:
+      from recording import RecordingWriter
+      writer = RecordingWriter(record_path, self.surface.get_size())
+      self.recorder = logger.StateLogger(writer, interval=1, max_frames=None,
+                                         max_pending=RECORDING_QUEUE_SIZE)
+
+    self.gsm = GameStateManager(self.assets)
+    self.gsm.add_state("title", TitleState(self))
+    self.gsm.add_state("main", MainState(self))
+    self.gsm.add_state("game_over", GameOverState(self))
+    # A replay has nobody to press a key on the title
+    self.start_state = "main" if headless or replay is not None else "title"
+    if not headless:
+      # Loads while the window opens and the first frame is prepared
+      self.gsm.preload(self.start_state)
+
+    self.startup_times["init"] = (time.perf_counter() - init_start) * 1000.0
+
+  # Windowed games load the font in the background before the title needs it;
+  # headless ones parse it only once something draws text, which may be never
+  @property
+  def font(self) -> "VectorFont":
+    return self.assets.get("font")
+
+  def load_font(self) -> "VectorFont":
+    from vectorfont import VectorFont
+    start = time.perf_counter()
+    font = VectorFont(self.surface, "Main", "mainfont.json")
+    self.startup_times["font"] = (time.perf_counter() - start) * 1000.0
+    return font
+
+  def load_atlas(self) -> "SpriteAtlas":
+    from spriteatlas import SpriteAtlas
+    return SpriteAtlas()
+
+  # On the main thread, once the atlas is collected from the loader
+  def finish_atlas(self, atlas: "SpriteAtlas") -> "SpriteAtlas":
+    return atlas.finish()
+
+  @property
+  def overlay(self) -> "ProfilerOverlay":
+    if self._overlay is None:
+      from frameprofiler import ProfilerOverlay
+      self._overlay = ProfilerOverlay(self.profiler, self.font)
+    return self._overlay
+
+  # Game objects find their groups, store and RNG through class attributes, so
+  # these point at whichever Game was bound last. Call this again before
+  # stepping a Game if several of them share a process
+  def bind(self) -> None:
     Hero.containers = (self.updatables, self.drawables)
-    Asteroid.containers = (self.updatables, self.drawables, self.asteroids)
     AsteroidField.containers = (self.updatables, )
-    Bullet.containers = (self.updatables, self.drawables, self.bullets)
+    if self.store is None:
+      Asteroid.containers = (self.updatables, self.drawables, self.asteroids)
+      Bullet.containers = (self.updatables, self.drawables, self.bullets)
+    else:
+      # Store-backed entities are integrated by the store, not by update()
+      Asteroid.containers = (self.drawables, self.asteroids)
+      Bullet.containers = (self.drawables, self.bullets)
+    Asteroid.store = self.store
+    Bullet.store = self.store
+    Asteroid.pool = self.asteroid_pool
+    Bullet.pool = self.bullet_pool
+    Asteroid.rng = self.rng
+    Asteroid.bus = self.bus
+    AsteroidField.rng = self.rng
+    AsteroidField.entities = (self.drawables, self.dormant)
+    AsteroidField.view = self.camera.view
+    AsteroidField.spawn_interval = self.spawn_interval
+    Asteroid.play_area = self.play_area
+    Hero.particles = self.particles
+    CircleShape.view_offset = self.camera.draw_offset
 
+  def populate(self) -> None:
     _ = AsteroidField()
 
-    c_x, c_y = SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2
+    c_x, c_y = self.world.center
     self.hero = Hero(c_x, c_y)
+    self.camera.jump_to(c_x, c_y)
 
-    self.logging_enabled = LOGGING_ENABLED
+  # Starts the game over without rebuilding the window, pools or logs. Passing
+  # the seed a new Game was given replays that Game's run exactly. Without one,
+  # a seeded session draws the next game's seed from the RNG, so every game
+  # gets a new field and the session's seed still pins down all of them
+  def reset(self, seed: int | None = None) -> None:
+    if seed is None and self.seed is not None:
+      seed = self.rng.randrange(2 ** 63)
+    self.seed = seed
+    self.rng.seed(seed)
+    self.bus.publish("game_reset", seed=seed)
+    self.bind()
+    for group in (self.updatables, self.drawables, self.dormant):
+      for sprite in group.sprites():
+        sprite.kill()
+    for bucket in self.dormant_buckets:
+      bucket.clear()
+    self.dormant_phase = 0
+    self.dormant_cursor = 0
+    if self.particles is not None:
+      self.particles.clear()
+
+    self.frame = 0
+    self.accumulator = 0.0
+    self.reset_pending = False
+    if self.dirty_tracker is not None:
+      self.dirty_tracker.invalidate()
+    self.populate()
 
-  def run(self) -> None:
+  def run(self, max_frames: int | None = None) -> None:
     dt = INITIAL_DT
-    quit_requested = False
+    self.running = True
+    self.max_frames = max_frames
 
     self.surface.fill("black")
+    self.gsm.switch(self.start_state)
 
-    while not quit_requested:
-      self.log_state()
+    profiler = self.profiler
+    run_start = time.perf_counter()
+    first_frame = True
+
+    while self.running:
+      frame_start = time.perf_counter()
+      if profiler.enabled:
+        profiler.begin_frame()
 
       for event in pygame.event.get():
         match event.type:
           case pygame.QUIT:
-            quit_requested = True
+            self.running = False
           case pygame.KEYDOWN:
             match event.key:
               case pygame.K_ESCAPE:
-                quit_requested = True
-              case pygame.K_SPACE:
-                self.hero.shoot_key_pressed()
-      
-      self.update_game_state(dt)
+                self.running = False
+              case pygame.K_F3:
+                self.toggle_overlay()
+              case pygame.K_F4:
+                self.toggle_dirty_rects()
+              case pygame.K_F5:
+                self.toggle_draw_mode()
+              case _:
+                self.gsm.curr_state.handle_event(event)
+
+      if profiler.enabled:
+        profiler.mark("events")
+
+      # Steps and draws gameplay, or draws the title or game over screen
+      self.gsm.curr_state.update(dt)
+      if profiler.enabled:
+        profiler.mark("draw")
 
       # self.font.demo()
 
-      pygame.display.flip()
-      dt = self.clock.tick(TARGET_FPS) / 1000.0
+      if self.overlay_visible:
+        self.overlay.update(dt, self.get_group_counts(),
+                            self.degradation >= Degradation.SIMPLE_TEXT)
+        self.overlay.draw(self.surface)
+      if profiler.enabled:
+        profiler.mark("overlay")
+
+      if not self.headless:
+        self.present()
+        if profiler.enabled:
+          profiler.mark("flip")
+
+      if first_frame:
+        first_frame = False
+        now = time.perf_counter()
+        self.startup_times["first_frame"] = (now - run_start) * 1000.0
+        self.startup_times["total"] = (now - IMPORT_START) * 1000.0
+
+      if self.governor is not None:
+        # Everything but waiting for the next frame
+        if self.governor.record((time.perf_counter() - frame_start) * 1000.0):
+          self.set_degradation(self.governor.level)
+
+      if self.headless:
+        # Nothing to present and nobody to wait for, so run flat out
+        dt = self.step_dt
+      else:
+        dt = self.clock.tick(TARGET_FPS) / 1000.0
+
+      if profiler.enabled:
+        profiler.mark("wait")
+        profiler.end_frame()
 
     self.shut_down()
 
-  def update_game_state(self, dt: float):
+  def set_degradation(self, level: Degradation) -> None:
+    self.degradation = level
+    slowdown = GOVERNOR_SPAWN_SLOWDOWN if level >= Degradation.FEWER_SPAWNS else 1.0
+    self.spawn_interval = ASTEROID_SPAWN_RATE_SECONDS * slowdown
+    AsteroidField.spawn_interval = self.spawn_interval
+
+  # Takes the simulation steps a frame of frame_dt seconds pays for
+  def advance(self, frame_dt: float) -> None:
+    steps = self.steps_due(frame_dt)
+    if self.max_frames is not None:
+      steps = min(steps, self.max_frames - self.frame)
+    for _ in range(steps):
+      self.step(self.step_dt)
+      if not self.running or self.reset_pending:
+        break
+    if self.max_frames is not None and self.frame >= self.max_frames:
+      self.running = False
+
+  # Banks a frame's worth of real time and returns how many whole simulation
+  # steps it pays for. Whatever is left over is how far the drawn frame sits
+  # between the last step and the next one
+  def steps_due(self, frame_dt: float) -> int:
+    self.accumulator += frame_dt
+    steps = int(self.accumulator / self.step_dt)
+    if steps > MAX_CATCH_UP_STEPS:
+      # Too far behind to catch up; drop the backlog instead of spiralling
+      self.accumulator %= self.step_dt
+      return MAX_CATCH_UP_STEPS
+    self.accumulator -= steps * self.step_dt
+    return steps
+
+  def step(self, dt: float) -> None:
+    profiler = self.profiler
+    self.log_state()
+    self.bus.frame = self.frame
+
+    controls = self.input_source.sample()
+    if self.input_recorder is not None:
+      self.input_recorder.record(controls)
+    self.hero.controls = controls
+    if self.wants_previous():
+      self.save_previous()
+    self.update_entities(dt)
+    self.follow_hero()
+    if profiler.enabled:
+      profiler.mark("update")
+    self.check_collisions()
+    if profiler.enabled:
+      profiler.mark("collision")
+    self.bus.end_frame()
+    self.frame += 1
+    if self.reset_pending:
+      self.game_over()
+    if self.replay is not None and self.replay.finished:
+      self.running = False
+
+  # Interpolated drawing and swept collisions both need to know where
+  # everything was at the start of the step
+  def wants_previous(self) -> bool:
+    return self.interpolation_enabled or self.swept_collisions_enabled
+
+  def save_previous(self) -> None:
+    self.camera.save_previous()
+    if self.store is None:
+      for item in self.drawables:
+        item.save_previous()
+    else:
+      self.store.save_previous()
+      self.hero.save_previous()
+
+  def update_entities(self, dt: float) -> None:
+    # Whatever died last frame is out of every group and collision check by
+    # now, so it is safe to hand out again
+    for pool in (self.asteroid_pool, self.bullet_pool):
+      if pool is not None:
+        pool.recycle()
+
+    # Step the store first so entities spawned by the updatables this frame
+    # start moving next frame, just like sprites added mid Group.update. What
+    # ran out dies after the updatables, where sprite bullets do, so the hero
+    # can't fire again the step a bullet of theirs expires
+    expired = self.store.step(dt) if self.store is not None else []
     self.updatables.update(dt)
+    for entity in expired:
+      entity.die()
+    # After the updatables, like sprite asteroids, whose update() checks
+    # after the field's has already counted them against the budget
+    if self.store is not None:
+      for asteroid in self.store.outside(self.play_area):
+        asteroid.leave_play_area()
+    if self.particles is not None:
+      self.particles.update(dt)
+
+    if self.dormant_enabled:
+      if self.store is None:
+        self.update_dormant(dt)
+      self.update_dormancy()
+    self.dormant_phase += 1
+
+  # The camera stops at the world's edges, and so does the hero
+  def follow_hero(self) -> None:
+    hero = self.hero
+    x, y = hero.position
+    world = self.world
+    if not world.collidepoint(x, y):
+      x = min(max(x, world.left), world.right - 1)
+      y = min(max(y, world.top), world.bottom - 1)
+      hero.position = pygame.Vector2(x, y)
+    self.camera.follow(x, y)
+
+  # The view plus ACTIVE_AREA_MARGIN; asteroids outside it are dormant
+  def get_active_area(self) -> pygame.Rect:
+    return self.camera.view.inflate(2 * ACTIVE_AREA_MARGIN, 2 * ACTIVE_AREA_MARGIN)
 
+  # Moves this update's bucket of sleeping sprite asteroids, each by as many
+  # steps as went by since it last moved, and wakes those that came close
+  # enough to the view
+  def update_dormant(self, dt: float) -> None:
+    index = self.dormant_phase % DORMANT_UPDATE_INTERVAL
+    bucket = self.dormant_buckets[index]
+    if not bucket:
+      return
+    area = self.get_active_area()
+    phase = self.dormant_phase
+    sleeping = []
+    for asteroid, moved in bucket:
+      asteroid.update(dt * (phase - moved))
+      if not asteroid.alive():
+        # Left the play area
+        continue
+      if area.collidepoint(asteroid.position):
+        asteroid.wake_up(self.dormant)
+      else:
+        sleeping.append((asteroid, phase))
+    self.dormant_buckets[index] = sleeping
+
+  # Every DORMANT_UPDATE_INTERVAL updates, asteroids that left the active area
+  # fall asleep. Sprite ones are dealt out over the buckets so each update
+  # moves about as many; the store moves every row anyway, and sorts all of
+  # its asteroids in one pass
+  def update_dormancy(self) -> None:
+    if self.dormant_phase % DORMANT_UPDATE_INTERVAL != 0:
+      return
+    area = self.get_active_area()
+    if self.store is not None:
+      sleeping, waking = self.store.partition(area)
+      for asteroid in sleeping:
+        asteroid.fall_asleep(self.dormant)
+      for asteroid in waking:
+        asteroid.wake_up(self.dormant)
+      return
+
+    buckets = self.dormant_buckets
+    phase = self.dormant_phase
     for asteroid in self.asteroids:
-      self.hero_collision_check(asteroid, self.hero)
-      
+      if not area.collidepoint(asteroid.position):
+        asteroid.fall_asleep(self.dormant)
+        buckets[self.dormant_cursor].append((asteroid, phase))
+        self.dormant_cursor = (self.dormant_cursor + 1) % DORMANT_UPDATE_INTERVAL
+
+  def check_collisions(self) -> None:
+    if self.store is not None:
+      self.store_collision_checks()
+    elif self.swept_collisions_enabled:
+      self.swept_collision_checks()
+    elif self.spatial_hash_enabled:
+      self.broad_phase_collision_checks()
+    else:
+      self.brute_force_collision_checks()
+
+    if self.store is not None:
+      for bullet in self.store.outside(self.camera.view, bullets=True):
+        bullet.die()
+    else:
       for bullet in self.bullets:
-        self.bullet_collision_check(asteroid, bullet)
+        self.bullet_bounds_check(self.camera.view, bullet)
 
-    for bullet in self.bullets:
-      self.bullet_bounds_check(self.bounds, bullet)
-      
+  # `alpha` is how far between the last two simulation steps to draw everything
+  def draw(self, alpha: float = 1.0) -> None:
+    if self.dirty_rects_enabled:
+      self.draw_dirty(alpha)
+      return
+
+    self.dirty_rects = None
     self.surface.fill("black")
+    self.draw_items(alpha)
+
+  # Drawables close enough to the view to show up on screen this frame. Only
+  # awake asteroids are drawables, so this is already a small share of the
+  # world; the rest of the active area's margin is left out here
+  def get_visible_items(self) -> list[CircleShape]:
+    margin = 4 * ASTEROID_MAX_RADIUS
+    area = self.camera.view.inflate(margin, margin)
+    return [item for item in self.drawables if area.collidepoint(item.position)]
+
+  # Store rows on screen as (owner, x, y) in screen coordinates, read off the
+  # store's arrays. The hero isn't in the store and is left over
+  def get_visible_rows(self, alpha: float) -> list[tuple[CircleShape, float, float]]:
+    return self.store.visible(alpha, tuple(self.camera.draw_offset), self.bounds.size)
+
+  # `items` is what get_visible_items() returned, or get_visible_rows() for
+  # store-backed games
+  def draw_items(self, alpha: float, items: list | None = None) -> None:
+    self.camera.set_draw_alpha(alpha)
+    # Underneath everything else
+    if self.draws_particles():
+      self.particles.draw(self.surface, self.camera.draw_offset)
+    if self.draw_mode == "vector":
+      # Atlas blits are already about as cheap as dots, so they stay as they are
+      simple = self.degradation >= Degradation.SIMPLE_DRAW
+      if self.store is not None:
+        rows = self.get_visible_rows(alpha) if items is None else items
+        for item, x, y in rows:
+          if simple:
+            item.draw_dot_at(self.surface, x, y)
+          else:
+            item.draw_at(self.surface, x, y)
+        if self.hero.alive():
+          self.hero.draw(self.surface, alpha)
+        return
+
+      items = self.get_visible_items() if items is None else items
+      if simple:
+        for item in items:
+          item.draw_dot(self.surface, alpha)
+      else:
+        for item in items:
+          item.draw(self.surface, alpha)
+      return
+
+    if self.atlas is None:
+      self.atlas = self.assets.get("atlas")
+    atlas = self.atlas
+    if self.store is None:
+      blits = [item.get_blit(atlas, alpha)
+               for item in (self.get_visible_items() if items is None else items)]
+    else:
+      # Store rows come straight from its arrays, culled there, dormant ones
+      # included; only the hero is left over
+      blits = atlas.store_blits(self.store, alpha, tuple(self.camera.draw_offset),
+                                self.bounds.size)
+      if self.hero.alive():
+        blits.append(self.hero.get_blit(atlas, alpha))
+    self.surface.blits(blits, doreturn=False)
+
+  def draws_particles(self) -> bool:
+    return self.particles is not None and self.degradation < Degradation.SIMPLE_DRAW
+
+  # Clears only what was drawn last frame and what is about to be drawn. Items
+  # outside those areas are redrawn onto identical pixels, which is cheaper
+  # than working out which ones can be skipped
+  def draw_dirty(self, alpha: float) -> None:
+    self.camera.set_draw_alpha(alpha)
+    if self.store is None:
+      items = self.get_visible_items()
+      regions = [item.get_bounds(alpha) for item in items]
+    else:
+      items = self.get_visible_rows(alpha)
+      regions = [item.get_bounds_at(x, y) for item, x, y in items]
+      if self.hero.alive():
+        regions.append(self.hero.get_bounds(alpha))
+    if self.draws_particles():
+      bounds = self.particles.get_bounds(self.camera.draw_offset, self.bounds.size)
+      if bounds is not None:
+        regions.append(bounds)
+    if self.overlay_visible:
+      regions.append(self.overlay.get_bounds())
+
+    if self.dirty_tracker is None:
+      from dirtyrects import DirtyRectTracker
+      self.dirty_tracker = DirtyRectTracker(self.bounds)
+    dirty = self.dirty_tracker.update(regions)
+    if dirty is None:
+      self.surface.fill("black")
+    else:
+      for rect in dirty:
+        self.surface.fill("black", rect)
+
+    self.draw_items(alpha, items)
+    self.dirty_rects = dirty
+
+  def present(self) -> None:
+    if self.dirty_rects is None:
+      pygame.display.flip()
+    else:
+      pygame.display.update(self.dirty_rects)
+
+  def toggle_draw_mode(self) -> None:
+    self.draw_mode = "atlas" if self.draw_mode == "vector" else "vector"
+    if self.draw_mode == "atlas":
+      # Renders in the background; the first atlas frame waits for what's left
+      self.assets.preload(("atlas",))
+
+  def toggle_dirty_rects(self) -> None:
+    self.dirty_rects_enabled = not self.dirty_rects_enabled
+    if self.dirty_tracker is not None:
+      self.dirty_tracker.invalidate()
+
+  def toggle_overlay(self) -> None:
+    self.overlay_visible = not self.overlay_visible
+    self.profiler.enabled = self.overlay_visible or PROFILER_ENABLED
+    # Switching on mid-frame; start timing from here so the first mark isn't
+    # measured from a stale timestamp
+    self.profiler.begin_frame()
+
+  def get_group_counts(self) -> dict[str, int]:
+    counts = {
+      "updatables": len(self.updatables),
+      "drawables": len(self.drawables),
+      "asteroids": len(self.asteroids),
+      "bullets": len(self.bullets),
+      "dormant": len(self.dormant),
+    }
+    if self.particles is not None:
+      counts["particles"] = len(self.particles)
+    return counts
+
+  def get_startup_report(self) -> list[str]:
+    lines = ["Startup:"]
+    for name in ("import", "init", "font", "first_frame", "total"):
+      # Missing if it never happened, e.g. no text was drawn yet
+      elapsed = self.startup_times.get(name)
+      value = "-" if elapsed is None else f"{elapsed:.1f} ms"
+      lines.append(f"  {name:<12}{value:>10}")
+    return lines
+
+  def get_pool_stats(self) -> dict[str, dict]:
+    stats = {}
+    if self.asteroid_pool is not None:
+      stats["asteroids"] = self.asteroid_pool.stats()
+    if self.bullet_pool is not None:
+      stats["bullets"] = self.bullet_pool.stats()
+    return stats
 
-    for item in self.drawables:
-      item.draw(self.surface)
+  # Debris where an asteroid was shot, whether it split or was destroyed
+  def asteroid_broke_up(self, x: float, y: float, size: int) -> None:
+    self.particles.explode(x, y, size)
 
+  # The world stays as it was until the next game resets it
   def game_over(self) -> None:
-    pass
+    self.gsm.switch("game_over")
 
   def shut_down(self) -> None:
+    self.close_logs()
+    self.assets.close()
     print("Thank you for playing Wing Commander!")
 
+  def brute_force_collision_checks(self) -> None:
+    for asteroid in self.asteroids:
+      self.hero_collision_check(asteroid, self.hero)
+      
+      for bullet in self.bullets:
+        self.bullet_collision_check(asteroid, bullet)
+
+  def broad_phase_collision_checks(self) -> None:
+    # Snapshot the asteroids before any checks run, the same way iterating the
+    # group does in the brute force path, so both paths see the same pairs
+    self.spatial_hash.rebuild(self.asteroids)
+
+    for asteroid in self.spatial_hash.query(self.hero):
+      self.hero_collision_check(asteroid, self.hero)
+
+    for asteroid, bullet in self.spatial_hash.candidate_pairs(self.bullets):
+      self.bullet_collision_check(asteroid, bullet)
+
+  # Every contact during the step, acted on in the order it happened: a bullet
+  # stops at the first asteroid in its path, and an asteroid shot down on its
+  # way into the hero never reaches it
+  def swept_collision_checks(self) -> None:
+    hero = self.hero
+    if self.spatial_hash_enabled:
+      spatial_hash = self.spatial_hash
+      spatial_hash.rebuild(self.asteroids, swept=True)
+      pairs = itertools.chain(((asteroid, hero) for asteroid in spatial_hash.query(hero, swept=True)),
+                              spatial_hash.candidate_pairs(self.bullets, swept=True))
+    else:
+      pairs = ((asteroid, other) for asteroid in self.asteroids for other in (hero, *self.bullets))
+
+    contacts = []
+    for asteroid, other in pairs:
+      t = asteroid.time_of_impact(other)
+      if t is not None:
+        contacts.append((t, asteroid, other))
+    self.resolve_contacts(contacts)
+
+  # Acts on (t, asteroid, hero or bullet) contacts in the order they happened
+  def resolve_contacts(self, contacts: list[tuple[float, Asteroid, CircleShape]]) -> None:
+    # Stable, so contacts at the same moment keep the order they were found in
+    contacts.sort(key=itemgetter(0))
+
+    hero = self.hero
+    for _, asteroid, other in contacts:
+      if not asteroid.alive():
+        continue
+      if other is hero:
+        self.hero_collision_detected()
+      elif other.alive():
+        self.bullet_collision_detected(asteroid, other)
+
+  # The same checks for store-backed games, with the grid and the bounding
+  # circle tests run on the store's arrays. Only the asteroid outlines are
+  # tested pair by pair, and only for pairs whose circles touch. The grid
+  # takes the place of the spatial hash whether it is enabled or not
+  def store_collision_checks(self) -> None:
+    hero = self.hero
+    swept = self.swept_collisions_enabled
+    x0, y0 = hero.get_previous_position() if swept else hero.position
+    x1, y1 = hero.position
+    pairs = self.store.circle_contacts(SPATIAL_HASH_CELL_SIZE, [(hero, x0, y0, x1, y1, hero.radius)],
+                                       swept)
+
+    if swept:
+      contacts = []
+      for asteroid, other, t, x, y, dx, dy in pairs:
+        t = asteroid.outline_time_of_impact(t, x, y, dx, dy, other.radius)
+        if t is not None:
+          contacts.append((t, asteroid, other))
+      self.resolve_contacts(contacts)
+      return
+
+    for asteroid, other, _, x, y, _, _ in pairs:
+      if other is hero:
+        if asteroid.outline_touches(x, y, hero.radius):
+          self.hero_collision_detected()
+      elif asteroid.alive() and other.alive() and asteroid.outline_touches(x, y, other.radius):
+        self.bullet_collision_detected(asteroid, other)
+
   def hero_collision_check(self, asteroid: Asteroid, hero: Hero) -> None:
     if asteroid.collides_with(hero):
       self.hero_collision_detected()
 
   def hero_collision_detected(self) -> None:
-    self.log_event("player_hit")
+    if self.reset_pending:
+      # Already hit by another asteroid this step
+      return
+    self.bus.publish("player_hit")
+    if self.headless:
+      # Let run() return so the caller can inspect the finished game
+      self.running = False
+      return
+    # The rest of this step's collisions still run against the old field
     print("Game over!")
-    sys.exit()
+    self.reset_pending = True
 
   def bullet_collision_check(self, asteroid: Asteroid, bullet: Bullet) -> None:
+    # Either one may have been destroyed by an earlier pair this frame, and a
+    # dead asteroid must not split again nor a spent bullet hit twice
+    if not (asteroid.alive() and bullet.alive()):
+      return
     if asteroid.collides_with(bullet):
       self.bullet_collision_detected(asteroid, bullet)
 
   def bullet_collision_detected(self, asteroid: Asteroid, bullet: Bullet) -> None:
-    self.log_event("asteroid_shot")
+    self.bus.publish("asteroid_shot")
     asteroid.take_damage()
     bullet.die()
 
@@ -140,20 +958,97 @@ class Game:
     if not bounds.collidepoint(bullet.position):
       bullet.die()
 
+  def close_logs(self) -> None:
+    # Waits for the writers to drain so no queued snapshot or event is lost. One
+    # writer failing doesn't stop the rest closing; the first failure is raised
+    # once they all have
+    writers = (self.bus, self.input_recorder, self.state_logger, self.recorder)
+    self.input_recorder = None
+    self.state_logger = None
+    self.recorder = None
+    error = None
+    for writer in writers:
+      if writer is None:
+        continue
+      try:
+        writer.close()
+      except Exception as failure:
+        error = error or failure
+    if error is not None:
+      raise error
+
   def log_state(self) -> None:
-    if not self.logging_enabled:
-      return
-    logger.log_state()
+    if self.logging_enabled:
+      if self.state_logger is None:
+        self.state_logger = logger.StateLogger(logger.JsonlStateSink())
 
-  def log_event(self, event_type: str) -> None:
-    if not self.logging_enabled:
-      return
-    logger.log_event(event_type)
+    state_loggers = (self.state_logger, self.recorder)
+    if self.degradation >= Degradation.NO_SNAPSHOTS:
+      # Recordings are played back frame by frame, so they keep theirs
+      state_loggers = (self.recorder, )
+
+    snapshot = None
+    for state_logger in state_loggers:
+      if state_logger is None or not state_logger.wants(self.frame):
+        continue
+      if snapshot is None:
+        snapshot = self.capture_snapshot()
+      state_logger.submit(snapshot)
+
+  def capture_snapshot(self) -> logger.StateSnapshot:
+    now = datetime.now()
+    screen_size = self.surface.get_size()
+    sprites = {"hero": logger.capture_group([self.hero], with_rotation=True)}
+
+    if self.store is None:
+      groups = {
+        "asteroids": logger.capture_group([*self.asteroids, *self.dormant]),
+        "bullets": logger.capture_group(self.bullets),
+      }
+      return logger.StateSnapshot(self.frame, now, screen_size, groups, sprites)
+
+    return logger.StateSnapshot(self.frame, now, screen_size, {}, sprites,
+                                logger.capture_store(self.store),
+                                {Asteroid: "asteroids", Bullet: "bullets"})
 
 
 def main():
-  game = Game()
-  game.run()
+  # Only the command line needs it, and it is slow to import
+  import argparse
+
+  parser = argparse.ArgumentParser(description="Blasteroids")
+  parser.add_argument("--headless", action="store_true",
+                      help="simulate without a window, as fast as possible, with a fixed dt")
+  parser.add_argument("--seed", type=int, default=None,
+                      help="seed for the game's RNG; the same seed replays the same headless run")
+  parser.add_argument("--frames", type=int, default=None,
+                      help="stop after this many frames")
+  parser.add_argument("--dt", type=float, default=HEADLESS_DT,
+                      help="fixed timestep used in headless mode, in seconds")
+  parser.add_argument("--record", metavar="PATH", default=None,
+                      help="record every frame to a binary state recording (see recording.py)")
+  parser.add_argument("--record-input", metavar="PATH", default=None,
+                      help="save the controls of every simulation step, for --replay-input")
+  parser.add_argument("--replay-input", metavar="PATH", default=None,
+                      help="play back recorded controls instead of reading the keyboard; "
+                           "the seed and timestep come from the recording")
+  parser.add_argument("--startup-report", action="store_true",
+                      help="print how long importing, initializing, loading the font and "
+                           "drawing the first frame took")
+  args = parser.parse_args()
+
+  replay = ReplayInput(args.replay_input) if args.replay_input is not None else None
+  game = Game(headless=args.headless, seed=args.seed, fixed_dt=args.dt,
+              record_path=args.record, replay=replay, record_input_path=args.record_input)
+  start = time.perf_counter()
+  game.run(args.frames)
+  elapsed = time.perf_counter() - start
+
+  if args.headless:
+    print(f"Simulated {game.frame} frames in {elapsed:.2f} s "
+          f"({game.frame / max(elapsed, 1e-9):.0f} frames/s)")
+  if args.startup_report:
+    print("\n".join(game.get_startup_report()))
 
 
 if __name__ == "__main__":
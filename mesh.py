@@ -0,0 +1,171 @@
+import math
+import random
+from typing import Sequence
+from constants import (
+  ASTEROID_SIZES,
+  ASTEROID_MIN_RADIUS,
+  ASTEROID_SHAPE_VARIANTS,
+  ASTEROID_VERTICES,
+  ASTEROID_JAGGEDNESS,
+)
+
+Point = tuple[float, float]
+
+# Asteroid outlines come from their own RNG, so they look the same in every
+# run and generating them doesn't use up any of the simulation's random numbers
+SHAPE_SEED = 1979
+
+
+# A shape's outline in its own space, centered on the origin with rotation 0,
+# and where the outline was last placed in the world. Transforming to the same
+# position and rotation again returns the cached points
+class Mesh:
+  __slots__ = ("local", "points", "_key")
+
+  local: list[Point]
+  points: list[Point]
+  _key: tuple[float, float, float] | None
+
+  def __init__(self, local: list[Point]) -> None:
+    self.set_local(local)
+
+  def set_local(self, local: list[Point]) -> None:
+    self.local = local
+    self.points = []
+    self._key = None
+
+  def transform(self, x: float, y: float, rotation: float = 0.0) -> list[Point]:
+    key = (x, y, rotation)
+    if key == self._key:
+      return self.points
+    if rotation == 0.0:
+      self.points = [(x + lx, y + ly) for lx, ly in self.local]
+    else:
+      # Same direction as pygame.Vector2.rotate
+      angle = math.radians(rotation)
+      cos, sin = math.cos(angle), math.sin(angle)
+      self.points = [(x + lx * cos - ly * sin, y + lx * sin + ly * cos) for lx, ly in self.local]
+    self._key = key
+    return self.points
+
+
+def jagged_outline(rng: random.Random, radius: float, vertices: int, jaggedness: float) -> list[Point]:
+  points = []
+  for i in range(vertices):
+    # Spaced roughly evenly around the circle so the polygon never folds over itself
+    angle = math.tau * (i + rng.uniform(-0.3, 0.3)) / vertices
+    distance = radius * (1.0 - rng.uniform(0.0, jaggedness))
+    points.append((math.cos(angle) * distance, math.sin(angle) * distance))
+  return points
+
+
+# Indexed by size, then variant. Every vertex lies within the asteroid's radius,
+# so the circle stays a valid bound for the broad phase
+_asteroid_outlines: list[list[list[Point]]] = []
+
+
+def asteroid_outline(size: int, variant: int) -> list[Point]:
+  if not _asteroid_outlines:
+    rng = random.Random(SHAPE_SEED)
+    _asteroid_outlines.append([])
+    for size_class in range(1, ASTEROID_SIZES + 1):
+      radius = size_class * ASTEROID_MIN_RADIUS
+      _asteroid_outlines.append([jagged_outline(rng, radius, ASTEROID_VERTICES, ASTEROID_JAGGEDNESS)
+                                 for _ in range(ASTEROID_SHAPE_VARIANTS)])
+  return _asteroid_outlines[size][variant]
+
+
+# Whether a circle at (x, y) touches the polygon, either by overlapping one of
+# its edges or by lying entirely inside it
+def polygon_intersects_circle(points: Sequence[Point], x: float, y: float, radius: float) -> bool:
+  radius_squared = radius * radius
+  inside = False
+  px, py = points[-1]
+  for qx, qy in points:
+    ex, ey = qx - px, qy - py
+    length_squared = ex * ex + ey * ey
+    t = ((x - px) * ex + (y - py) * ey) / length_squared if length_squared else 0.0
+    t = min(max(t, 0.0), 1.0)
+    dx, dy = px + t * ex - x, py + t * ey - y
+    if dx * dx + dy * dy <= radius_squared:
+      return True
+    # Even-odd rule for the center
+    if (qy > y) != (py > y) and x < (px - qx) * (y - qy) / (py - qy) + qx:
+      inside = not inside
+    px, py = qx, qy
+  return inside
+
+
+# How far along its path (0 to 1) a circle starting at (x, y) and moving by
+# (dx, dy) first comes within `radius` of the origin, or None if it never does
+def circle_time_of_impact(x: float, y: float, dx: float, dy: float, radius: float) -> float | None:
+  c = x * x + y * y - radius * radius
+  if c <= 0.0:
+    return 0.0
+  b = x * dx + y * dy
+  if b >= 0.0:
+    # Standing still or moving away
+    return None
+  a = dx * dx + dy * dy
+  discriminant = b * b - a * c
+  if discriminant < 0.0:
+    return None
+  t = (-b - math.sqrt(discriminant)) / a
+  return t if t <= 1.0 else None
+
+
+# The same for the polygon, in one pass over its edges. A circle that doesn't
+# start out touching it first touches either a vertex or the inside of an
+# edge, so the earliest of those contacts is the answer
+def polygon_time_of_impact(points: Sequence[Point], x: float, y: float, dx: float, dy: float,
+                           radius: float) -> float | None:
+  radius_squared = radius * radius
+  a = dx * dx + dy * dy
+  inside = False
+  # Anything past the end of the step
+  first = 2.0
+  px, py = points[-1]
+  for qx, qy in points:
+    ex, ey = qx - px, qy - py
+    rx, ry = x - px, y - py
+    length_squared = ex * ex + ey * ey
+
+    # Touching at the start, as in polygon_intersects_circle()
+    t = (rx * ex + ry * ey) / length_squared if length_squared else 0.0
+    if t < 0.0:
+      t = 0.0
+    elif t > 1.0:
+      t = 1.0
+    cx, cy = px + t * ex - x, py + t * ey - y
+    if cx * cx + cy * cy <= radius_squared:
+      return 0.0
+    if (qy > y) != (py > y) and x < (px - qx) * (y - qy) / (py - qy) + qx:
+      inside = not inside
+
+    # Reaching the vertex the edge starts at
+    b = rx * dx + ry * dy
+    if b < 0.0:
+      discriminant = b * b - a * (rx * rx + ry * ry - radius_squared)
+      if discriminant >= 0.0:
+        t = (-b - math.sqrt(discriminant)) / a
+        if t < first:
+          first = t
+
+    # Reaching the inside of the edge. Both distance to its line and speed
+    # towards it are scaled by its length, on the side the center starts on
+    if length_squared:
+      distance = ry * ex - rx * ey
+      speed = dy * ex - dx * ey
+      if distance < 0.0:
+        distance, speed = -distance, -speed
+      if speed < 0.0:
+        t = (radius * math.sqrt(length_squared) - distance) / speed
+        if 0.0 <= t < first:
+          along = ((rx + t * dx) * ex + (ry + t * dy) * ey) / length_squared
+          if 0.0 <= along <= 1.0:
+            first = t
+    px, py = qx, qy
+
+  if inside:
+    return 0.0
+  return first if first <= 1.0 else None
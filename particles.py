@@ -0,0 +1,178 @@
+import numpy as np
+import pygame
+from constants import PARTICLE_CAPACITY, PARTICLE_SIZE
+
+# Particles fade from their color to black over their lifetime in this many steps
+FADE_LEVELS = 16
+# Indexed by a particle's color
+PALETTE = (pygame.Color("white"), pygame.Color(255, 170, 60))
+DEBRIS = 0
+EXHAUST = 1
+# Pixel array type by bytes per pixel
+PIXEL_TYPES = {1: np.uint8, 2: np.uint16, 4: np.uint32}
+
+# Debris per asteroid size class, thrown evenly in every direction
+DEBRIS_PER_SIZE = 40
+DEBRIS_SPEED = 160.0
+DEBRIS_LIFETIME = 0.9
+# Exhaust per simulation step of thrust, within EXHAUST_SPREAD degrees either
+# side of straight out the back
+EXHAUST_PER_STEP = 4
+EXHAUST_SPEED = 120.0
+EXHAUST_LIFETIME = 0.35
+EXHAUST_SPREAD = 15.0
+# Fraction of its speed a particle keeps after a second
+DRAG_PER_SECOND = 0.3
+
+
+# Explosion debris and thrust trails, kept in fixed size arrays and moved and
+# drawn with a handful of vectorized operations no matter how many are alive.
+# New particles take the slots after the last ones handed out, wrapping around,
+# so once the system is full the oldest particles make way for new ones
+# instead of anything being allocated. A slot is free once its age passes its
+# lifetime. The particles are only for show: they draw from their own RNG and
+# nothing collides with them
+class ParticleSystem:
+  capacity: int
+  positions: np.ndarray  # world coordinates
+  velocities: np.ndarray
+  ages: np.ndarray
+  lifetimes: np.ndarray  # 0 for slots never handed out
+  colors: np.ndarray  # index into PALETTE
+  # Slot the next particle goes into
+  cursor: int
+  # At most this many are alive; exact as of the last update()
+  live: int
+  rng: np.random.Generator
+
+  def __init__(self, capacity: int = PARTICLE_CAPACITY, seed: int | None = None) -> None:
+    self.capacity = capacity
+    self.positions = np.zeros((capacity, 2), dtype=np.float32)
+    self.velocities = np.zeros((capacity, 2), dtype=np.float32)
+    self.ages = np.zeros(capacity, dtype=np.float32)
+    self.lifetimes = np.zeros(capacity, dtype=np.float32)
+    self.colors = np.zeros(capacity, dtype=np.uint8)
+    self.cursor = 0
+    self.live = 0
+    self.rng = np.random.default_rng(seed)
+    self._moved = np.zeros((capacity, 2), dtype=np.float32)
+    # Mapped pixel values by [color, fade level], for the surface format they
+    # were mapped for
+    self._lut: np.ndarray | None = None
+    self._lut_format: tuple | None = None
+
+  def __len__(self) -> int:
+    return self.live
+
+  def clear(self) -> None:
+    self.lifetimes.fill(0.0)
+    self.cursor = 0
+    self.live = 0
+
+  # `count` particles at (x, y), heading `angle` degrees give or take `spread`,
+  # at up to `speed` on top of `velocity`
+  def emit(self, x: float, y: float, count: int, color: int, speed: float, lifetime: float,
+           angle: float = 0.0, spread: float = 180.0,
+           velocity: tuple[float, float] = (0.0, 0.0)) -> None:
+    count = min(count, self.capacity)
+    if count <= 0:
+      return
+    slots = np.arange(self.cursor, self.cursor + count) % self.capacity
+    self.cursor = (self.cursor + count) % self.capacity
+
+    rng = self.rng
+    headings = np.radians(rng.uniform(angle - spread, angle + spread, count))
+    speeds = rng.uniform(0.2 * speed, speed, count)
+    self.positions[slots] = (x, y)
+    self.velocities[slots, 0] = np.cos(headings) * speeds + velocity[0]
+    self.velocities[slots, 1] = np.sin(headings) * speeds + velocity[1]
+    self.ages[slots] = 0.0
+    # Staggered so a burst thins out instead of vanishing all at once
+    self.lifetimes[slots] = rng.uniform(0.5 * lifetime, lifetime, count)
+    self.colors[slots] = color
+    self.live = min(self.live + count, self.capacity)
+
+  def explode(self, x: float, y: float, size: int) -> None:
+    self.emit(x, y, DEBRIS_PER_SIZE * size, DEBRIS, DEBRIS_SPEED, DEBRIS_LIFETIME)
+
+  # `direction` is the way the exhaust leaves the ship
+  def exhaust(self, x: float, y: float, direction: pygame.Vector2) -> None:
+    _, angle = direction.as_polar()
+    self.emit(x, y, EXHAUST_PER_STEP, EXHAUST, EXHAUST_SPEED, EXHAUST_LIFETIME,
+              angle, EXHAUST_SPREAD)
+
+  # Moves every slot, dead or alive, which is cheaper than picking out the
+  # live ones first
+  def update(self, dt: float) -> None:
+    if self.live == 0:
+      return
+    ages = self.ages
+    ages += dt
+    np.multiply(self.velocities, dt, out=self._moved)
+    self.positions += self._moved
+    self.velocities *= DRAG_PER_SECOND ** dt
+    self.live = int(np.count_nonzero(ages < self.lifetimes))
+
+  # Slots of the live particles whose whole square is on a screen of `size`
+  # with its top left at `offset` in the world, and where that square's corner
+  # is on it. Culled in world coordinates so only the survivors get shifted
+  def get_visible(self, offset: tuple[float, float],
+                  size: tuple[int, int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    left, top = offset
+    width, height = size
+    xs = self.positions[:, 0]
+    ys = self.positions[:, 1]
+    mask = self.ages < self.lifetimes
+    mask &= xs >= left
+    mask &= xs < left + width - PARTICLE_SIZE
+    mask &= ys >= top
+    mask &= ys < top + height - PARTICLE_SIZE
+    slots = np.flatnonzero(mask)
+    return (slots, (xs[slots] - np.float32(left)).astype(np.intp),
+            (ys[slots] - np.float32(top)).astype(np.intp))
+
+  def get_bounds(self, offset: tuple[float, float], size: tuple[int, int]) -> pygame.Rect | None:
+    if self.live == 0:
+      return None
+    _, xs, ys = self.get_visible(offset, size)
+    if len(xs) == 0:
+      return None
+    left, top = int(xs.min()), int(ys.min())
+    return pygame.Rect(left, top, int(xs.max()) - left + PARTICLE_SIZE,
+                       int(ys.max()) - top + PARTICLE_SIZE)
+
+  def get_lut(self, surface: pygame.Surface) -> np.ndarray:
+    surface_format = (surface.get_bitsize(), surface.get_masks())
+    if self._lut_format != surface_format:
+      self._lut = np.array([[surface.map_rgb(color.lerp("black", 1.0 - (level + 1) / FADE_LEVELS))
+                             for level in range(FADE_LEVELS)] for color in PALETTE],
+                           dtype=np.int64)
+      self._lut_format = surface_format
+    return self._lut
+
+  # Writes the squares straight into the surface's pixels instead of filling
+  # them one call at a time. The pixels are indexed as one flat run, which
+  # NumPy scatters into faster than into surfarray's 2D view of them
+  def draw(self, surface: pygame.Surface, offset: tuple[float, float]) -> None:
+    if self.live == 0:
+      return
+    slots, xs, ys = self.get_visible(offset, surface.get_size())
+    if len(slots) == 0:
+      return
+    levels = (FADE_LEVELS * (1.0 - self.ages[slots] / self.lifetimes[slots])).astype(np.intp)
+    np.clip(levels, 0, FADE_LEVELS - 1, out=levels)
+
+    bytesize = surface.get_bytesize()
+    # Like surfarray, no support for 3 bytes per pixel
+    dtype = PIXEL_TYPES[bytesize]
+    values = self.get_lut(surface)[self.colors[slots], levels].astype(dtype)
+    row = surface.get_pitch() // bytesize
+    corners = ys * row + xs
+
+    buffer = surface.get_buffer()
+    pixels = np.frombuffer(buffer, dtype=dtype)
+    for dy in range(PARTICLE_SIZE):
+      for dx in range(PARTICLE_SIZE):
+        pixels[corners + (dy * row + dx)] = values
+    # The surface stays locked until both are gone
+    del pixels, buffer
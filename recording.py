@@ -0,0 +1,489 @@
+import sys
+import json
+import math
+import struct
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+
+import pygame
+
+import logger
+from constants import TARGET_FPS, WORLD_WIDTH, WORLD_HEIGHT, ASTEROID_MIN_RADIUS
+
+# Binary state recording (.bsr)
+#
+#   header   HEADER
+#   chunks   CHUNK tag + payload length, then the payload:
+#     NAME   kind, id, utf-8 name; defines a type or group id before first use
+#     FRAM   FRAME_HEADER, then `count` fixed-size RECORDs
+#     INDX   frame count, (frame, offset) per frame, then every NAME definition
+#   footer   FOOTER: offset of the INDX chunk and an end marker
+#
+# The index is only written on close. A recording cut short (crash, kill) has
+# no footer and is recovered by scanning the chunks from the start
+MAGIC = b"BSRC"
+END_MAGIC = b"CRSB"
+VERSION = 1
+
+HEADER = struct.Struct("<4sHHH")
+CHUNK = struct.Struct("<4sI")
+NAME = struct.Struct("<BBB")
+FRAME_HEADER = struct.Struct("<IddI")       # frame, clock (s since midnight), elapsed s, count
+RECORD = struct.Struct("<BB2x6f")           # type id, group id, x, y, vx, vy, radius, rotation
+INDEX_ENTRY = struct.Struct("<IQ")
+FOOTER = struct.Struct("<Q4s")
+
+NAME_TYPE = 0
+NAME_GROUP = 1
+NAME_SINGLE = 2   # a group holding exactly one sprite, like the hero
+
+# Keys of a state log entry that are not sprite groups
+_JSONL_META_KEYS = ("timestamp", "elapsed_s", "frame", "screen_size")
+
+
+class EntityRecord(NamedTuple):
+  type: str
+  group: str
+  single: bool
+  x: float
+  y: float
+  vx: float
+  vy: float
+  radius: float
+  rotation: float | None
+
+
+class RecordedFrame(NamedTuple):
+  frame: int
+  clock: float
+  elapsed: float
+  entities: list[EntityRecord]
+
+
+def clock_seconds(time: datetime) -> float:
+  return time.hour * 3600 + time.minute * 60 + time.second + time.microsecond / 1e6
+
+
+def format_clock(seconds: float) -> str:
+  millis = int(round(seconds * 1000))
+  hours, millis = divmod(millis, 3_600_000)
+  minutes, millis = divmod(millis, 60_000)
+  secs, millis = divmod(millis, 1000)
+  return f"{hours:02}:{minutes:02}:{secs:02}.{millis:03}"
+
+
+class RecordingWriter:
+  path: str
+  frame_count: int
+
+  def __init__(self, path: str, screen_size: tuple[int, int]) -> None:
+    self.path = path
+    self.frame_count = 0
+    self._file: BinaryIO = open(path, "wb")
+    self._index: list[tuple[int, int]] = []
+    self._names: list[tuple[int, int, str]] = []
+    self._type_ids: dict[str, int] = {}
+    self._group_ids: dict[str, int] = {}
+    self._start_time = datetime.now()
+    self._buffer = bytearray()
+    self._file.write(HEADER.pack(MAGIC, VERSION, *screen_size))
+
+  def _write_chunk(self, tag: bytes, payload: bytes | bytearray) -> int:
+    offset = self._file.tell()
+    self._file.write(CHUNK.pack(tag, len(payload)))
+    self._file.write(payload)
+    return offset
+
+  def _define(self, kind: int, name: str, ids: dict[str, int]) -> int:
+    name_id = ids.get(name)
+    if name_id is None:
+      name_id = len(ids)
+      if name_id > 255:
+        raise ValueError(f"Too many distinct names in recording {self.path}")
+      ids[name] = name_id
+      self._names.append((kind, name_id, name))
+      self._write_chunk(b"NAME", NAME.pack(kind, name_id, len(name.encode())) + name.encode())
+    return name_id
+
+  # Lets empty groups survive a round trip through the recording
+  def declare_group(self, name: str) -> None:
+    self._define(NAME_GROUP, name, self._group_ids)
+
+  def write_frame(self, frame: int, clock: float, elapsed: float,
+                  entities: Iterable[EntityRecord]) -> None:
+    buffer = self._buffer
+    buffer.clear()
+    buffer += bytes(FRAME_HEADER.size)
+    count = 0
+    for entity in entities:
+      kind = NAME_SINGLE if entity.single else NAME_GROUP
+      type_id = self._define(NAME_TYPE, entity.type, self._type_ids)
+      group_id = self._define(kind, entity.group, self._group_ids)
+      rotation = math.nan if entity.rotation is None else entity.rotation
+      buffer += RECORD.pack(type_id, group_id, entity.x, entity.y, entity.vx, entity.vy,
+                            entity.radius, rotation)
+      count += 1
+    FRAME_HEADER.pack_into(buffer, 0, frame, clock, elapsed, count)
+
+    self._index.append((frame, self._write_chunk(b"FRAM", buffer)))
+    self.frame_count += 1
+
+  # logger.StateSink, so a StateLogger can record every frame off the game thread
+  def write(self, snapshot: logger.StateSnapshot) -> None:
+    elapsed = (snapshot.time - self._start_time).total_seconds()
+    for name in (*snapshot.groups, *snapshot.store_groups.values()):
+      self.declare_group(name)
+    self.write_frame(snapshot.frame, clock_seconds(snapshot.time), elapsed,
+                     snapshot_entities(snapshot))
+
+  def flush(self) -> None:
+    self._file.flush()
+
+  def close(self) -> None:
+    payload = bytearray(struct.pack("<I", len(self._index)))
+    for frame, offset in self._index:
+      payload += INDEX_ENTRY.pack(frame, offset)
+    payload += struct.pack("<H", len(self._names))
+    for kind, name_id, name in self._names:
+      payload += NAME.pack(kind, name_id, len(name.encode())) + name.encode()
+
+    index_offset = self._write_chunk(b"INDX", payload)
+    self._file.write(FOOTER.pack(index_offset, END_MAGIC))
+    self._file.close()
+
+  def __enter__(self) -> "RecordingWriter":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+
+def snapshot_entities(snapshot: logger.StateSnapshot) -> Iterator[EntityRecord]:
+  for name, single, group, i in logger.iter_sprites(snapshot):
+    x, y = group.positions[i]
+    vx, vy = group.velocities[i]
+    rotation = None if group.rotations is None else group.rotations[i]
+    yield EntityRecord(type(group.owners[i]).__name__, name, single,
+                       x, y, vx, vy, group.radii[i], rotation)
+
+
+class RecordingReader:
+  path: str
+  screen_size: tuple[int, int]
+  index: list[tuple[int, int]]
+  types: dict[int, str]
+  groups: dict[int, tuple[str, bool]]
+  recovered: bool
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    self._file: BinaryIO = open(path, "rb")
+    magic, version, width, height = HEADER.unpack(self._file.read(HEADER.size))
+    if magic != MAGIC:
+      raise ValueError(f"{path} is not a state recording")
+    if version != VERSION:
+      raise ValueError(f"{path} has unsupported recording version {version}")
+    self.screen_size = (width, height)
+    self.index = []
+    self.types = {}
+    self.groups = {}
+    self.recovered = not self._load_index()
+    if self.recovered:
+      self._scan()
+
+  def __len__(self) -> int:
+    return len(self.index)
+
+  def __iter__(self) -> Iterator[RecordedFrame]:
+    for i in range(len(self.index)):
+      yield self.read_frame(i)
+
+  def __enter__(self) -> "RecordingReader":
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.close()
+
+  def close(self) -> None:
+    self._file.close()
+
+  def _define(self, kind: int, name_id: int, name: str) -> None:
+    if kind == NAME_TYPE:
+      self.types[name_id] = name
+    else:
+      self.groups[name_id] = (name, kind == NAME_SINGLE)
+
+  def _load_index(self) -> bool:
+    f = self._file
+    end = f.seek(0, 2)
+    if end < HEADER.size + FOOTER.size:
+      return False
+    f.seek(end - FOOTER.size)
+    index_offset, end_magic = FOOTER.unpack(f.read(FOOTER.size))
+    if end_magic != END_MAGIC:
+      return False
+
+    f.seek(index_offset)
+    tag, length = CHUNK.unpack(f.read(CHUNK.size))
+    if tag != b"INDX":
+      return False
+    payload = f.read(length)
+
+    (count,) = struct.unpack_from("<I", payload, 0)
+    pos = 4
+    self.index = [INDEX_ENTRY.unpack_from(payload, pos + i * INDEX_ENTRY.size)
+                  for i in range(count)]
+    pos += count * INDEX_ENTRY.size
+    (name_count,) = struct.unpack_from("<H", payload, pos)
+    pos += 2
+    for _ in range(name_count):
+      kind, name_id, length = NAME.unpack_from(payload, pos)
+      pos += NAME.size
+      self._define(kind, name_id, payload[pos:pos + length].decode())
+      pos += length
+    return True
+
+  def _scan(self) -> None:
+    f = self._file
+    f.seek(HEADER.size)
+    while True:
+      offset = f.tell()
+      header = f.read(CHUNK.size)
+      if len(header) < CHUNK.size:
+        break
+      tag, length = CHUNK.unpack(header)
+      payload = f.read(length)
+      if len(payload) < length:
+        break  # truncated mid-chunk
+      if tag == b"NAME":
+        kind, name_id, name_length = NAME.unpack_from(payload, 0)
+        self._define(kind, name_id, payload[NAME.size:NAME.size + name_length].decode())
+      elif tag == b"FRAM":
+        (frame,) = struct.unpack_from("<I", payload, 0)
+        self.index.append((frame, offset))
+      elif tag == b"INDX":
+        break
+
+  def read_frame(self, i: int) -> RecordedFrame:
+    _, offset = self.index[i]
+    f = self._file
+    f.seek(offset)
+    tag, length = CHUNK.unpack(f.read(CHUNK.size))
+    if tag != b"FRAM":
+      raise ValueError(f"Corrupt index in {self.path}: no frame at offset {offset}")
+    payload = f.read(length)
+
+    frame, clock, elapsed, count = FRAME_HEADER.unpack_from(payload, 0)
+    types, groups = self.types, self.groups
+    entities = []
+    for type_id, group_id, x, y, vx, vy, radius, rotation in RECORD.iter_unpack(
+        payload[FRAME_HEADER.size:FRAME_HEADER.size + count * RECORD.size]):
+      group, single = groups[group_id]
+      entities.append(EntityRecord(types[type_id], group, single, x, y, vx, vy, radius,
+                                   None if math.isnan(rotation) else rotation))
+    return RecordedFrame(frame, clock, elapsed, entities)
+
+
+def jsonl_to_recording(src: str, dst: str) -> int:
+  writer: RecordingWriter | None = None
+  with open(src) as lines:
+    for line in lines:
+      if not line.strip():
+        continue
+      entry = json.loads(line)
+      if writer is None:
+        writer = RecordingWriter(dst, tuple(entry.get("screen_size") or (0, 0)))
+
+      entities = []
+      for key, value in entry.items():
+        if key in _JSONL_META_KEYS or not isinstance(value, dict):
+          continue
+        if "sprites" in value:
+          writer.declare_group(key)
+          entities.extend(json_entity(sprite, key, False) for sprite in value["sprites"])
+        else:
+          entities.append(json_entity(value, key, True))
+
+      hours, minutes, seconds = entry["timestamp"].split(":")
+      clock = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+      writer.write_frame(entry["frame"], clock, entry["elapsed_s"], entities)
+
+  if writer is None:
+    raise ValueError(f"{src} has no entries")
+  writer.close()
+  return writer.frame_count
+
+
+def json_entity(sprite: dict, group: str, single: bool) -> EntityRecord:
+  x, y = sprite.get("pos", (0.0, 0.0))
+  vx, vy = sprite.get("vel", (0.0, 0.0))
+  return EntityRecord(sprite["type"], group, single, x, y, vx, vy,
+                      sprite.get("rad", 0.0), sprite.get("rot"))
+
+
+def recording_to_jsonl(src: str, dst: str) -> int:
+  count = 0
+  with RecordingReader(src) as reader, open(dst, "w") as out:
+    group_names = [name for name, single in reader.groups.values() if not single]
+    for recorded in reader:
+      entry = {
+        "timestamp": format_clock(recorded.clock),
+        "elapsed_s": math.floor(recorded.elapsed),
+        "frame": recorded.frame,
+        "screen_size": list(reader.screen_size),
+      }
+      for name in group_names:
+        entry[name] = {"count": 0, "sprites": []}
+      for entity in recorded.entities:
+        info = {
+          "type": entity.type,
+          "pos": [round(entity.x, 2), round(entity.y, 2)],
+          "vel": [round(entity.vx, 2), round(entity.vy, 2)],
+          "rad": round(entity.radius, 2),
+        }
+        if entity.rotation is not None:
+          info["rot"] = round(entity.rotation, 2)
+        if entity.single:
+          entry[entity.group] = info
+        else:
+          entry[entity.group]["sprites"].append(info)
+          entry[entity.group]["count"] += 1
+      out.write(json.dumps(entry) + "\n")
+      count += 1
+  return count
+
+
+# Replays a recording through the game's own draw methods. One stand-in sprite
+# per type is moved to each recorded entity in turn and drawn. Positions are
+# recorded in world coordinates, so the view follows the recorded hero the way
+# the game's camera did
+def view(path: str, start: int = 0, speed: float = 1.0) -> None:
+  from hero import Hero
+  from asteroid import Asteroid
+  from bullet import Bullet
+  from camera import Camera
+  from circleshape import CircleShape
+
+  with RecordingReader(path) as reader:
+    if len(reader) == 0:
+      print(f"{path} has no frames")
+      return
+
+    pygame.display.init()
+    surface = pygame.display.set_mode(reader.screen_size)
+    clock = pygame.time.Clock()
+    camera = Camera(pygame.Rect(0, 0, WORLD_WIDTH, WORLD_HEIGHT), reader.screen_size)
+    CircleShape.view_offset = camera.draw_offset
+    stand_ins = {
+      "Hero": Hero(0, 0),
+      "Bullet": Bullet(0, 0, lambda: None),
+    }
+    # Asteroids draw the outline for their size, which their radius gives
+    # away. Which variant of it isn't recorded, so all of a size look alike
+    asteroid_stand_ins: dict[int, Asteroid] = {}
+
+    position = float(min(max(start, 0), len(reader) - 1))
+    paused = False
+    running = True
+
+    while running:
+      for event in pygame.event.get():
+        match event.type:
+          case pygame.QUIT:
+            running = False
+          case pygame.KEYDOWN:
+            match event.key:
+              case pygame.K_ESCAPE:
+                running = False
+              case pygame.K_SPACE:
+                paused = not paused
+              case pygame.K_RIGHT:
+                position = min(position + 1, len(reader) - 1)
+              case pygame.K_LEFT:
+                position = max(position - 1, 0)
+              case pygame.K_HOME:
+                position = 0
+
+      recorded = reader.read_frame(int(position))
+      for entity in recorded.entities:
+        if entity.type == "Hero":
+          camera.jump_to(entity.x, entity.y)
+          break
+
+      surface.fill("black")
+      offset = camera.draw_offset
+      for entity in recorded.entities:
+        if entity.type == "Asteroid":
+          size = max(1, round(entity.radius / ASTEROID_MIN_RADIUS))
+          stand_in = asteroid_stand_ins.get(size)
+          if stand_in is None:
+            stand_in = asteroid_stand_ins[size] = Asteroid(0, 0, size)
+        else:
+          stand_in = stand_ins.get(entity.type)
+        if stand_in is None:
+          pygame.draw.circle(surface, "gray", (entity.x - offset.x, entity.y - offset.y),
+                             entity.radius, 1)
+          continue
+        stand_in.position = pygame.Vector2(entity.x, entity.y)
+        stand_in.radius = entity.radius
+        if entity.rotation is not None:
+          stand_in.rotation = entity.rotation
+        stand_in.draw(surface)
+
+      pygame.display.set_caption(
+        f"{Path(path).name}  frame {recorded.frame}  ({int(position) + 1}/{len(reader)})"
+        f"{'  [paused]' if paused else ''}")
+      pygame.display.flip()
+      clock.tick(TARGET_FPS)
+
+      if not paused:
+        position = min(position + speed, len(reader) - 1)
+
+
+def main() -> int:
+  parser = argparse.ArgumentParser(description="Binary state recordings")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  view_parser = commands.add_parser("view", help="replay a recording in a window")
+  view_parser.add_argument("recording")
+  view_parser.add_argument("--start", type=int, default=0, help="index of the first frame shown")
+  view_parser.add_argument("--speed", type=float, default=1.0,
+                           help="recorded frames advanced per displayed frame")
+
+  info_parser = commands.add_parser("info", help="print a summary of a recording")
+  info_parser.add_argument("recording")
+
+  to_binary = commands.add_parser("to-binary", help="convert a game_state.jsonl to a recording")
+  to_binary.add_argument("src")
+  to_binary.add_argument("dst")
+
+  to_jsonl = commands.add_parser("to-jsonl", help="convert a recording to the JSONL state log format")
+  to_jsonl.add_argument("src")
+  to_jsonl.add_argument("dst")
+
+  args = parser.parse_args()
+  match args.command:
+    case "view":
+      view(args.recording, args.start, args.speed)
+    case "info":
+      with RecordingReader(args.recording) as reader:
+        first = reader.index[0][0] if reader.index else None
+        last = reader.index[-1][0] if reader.index else None
+        print(f"{args.recording}: {len(reader)} frames ({first}..{last}), "
+              f"screen {reader.screen_size[0]}x{reader.screen_size[1]}"
+              f"{', recovered without index' if reader.recovered else ''}")
+        print(f"  types: {', '.join(reader.types.values())}")
+        print(f"  groups: {', '.join(name for name, _ in reader.groups.values())}")
+    case "to-binary":
+      count = jsonl_to_recording(args.src, args.dst)
+      print(f"Wrote {count} frames to {args.dst}")
+    case "to-jsonl":
+      count = recording_to_jsonl(args.src, args.dst)
+      print(f"Wrote {count} entries to {args.dst}")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
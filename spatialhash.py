@@ -0,0 +1,112 @@
+import math
+from collections.abc import Iterable
+from circleshape import CircleShape
+
+Cell = tuple[int, int]
+
+
+# Uniform grid broad phase. Shapes are bucketed into every cell their bounding
+# square touches, so a query only has to look at the cells around the query
+# shape instead of at every shape in the world. With `swept`, shapes are
+# bucketed and queried by the area they covered over the whole last step, so
+# shapes that only met halfway through it still pair up. Swept queries also
+# leave out shapes whose swept circles don't overlap, which the exact swept
+# test would otherwise have to rule out at a much higher cost
+class SpatialHash:
+  cell_size: float
+  cells: dict[Cell, list[CircleShape]]
+  # Swept circles of the inserted shapes, worked out the first time a query
+  # turns them up
+  swept_circles: dict[CircleShape, tuple[float, float, float]]
+
+  def __init__(self, cell_size: float) -> None:
+    self.cell_size = cell_size
+    self.cells = {}
+    self.swept_circles = {}
+
+  def __len__(self) -> int:
+    return len(self.cells)
+
+  def clear(self) -> None:
+    self.cells.clear()
+    self.swept_circles.clear()
+
+  def cell_range(self, x: float, y: float, radius: float) -> tuple[int, int, int, int]:
+    inv = 1.0 / self.cell_size
+    return (
+      math.floor((x - radius) * inv),
+      math.floor((y - radius) * inv),
+      math.floor((x + radius) * inv),
+      math.floor((y + radius) * inv),
+    )
+
+  def cell_box(self, left: float, top: float, right: float, bottom: float) -> tuple[int, int, int, int]:
+    inv = 1.0 / self.cell_size
+    return math.floor(left * inv), math.floor(top * inv), math.floor(right * inv), math.floor(bottom * inv)
+
+  def insert(self, shape: CircleShape, swept: bool = False) -> None:
+    x, y = shape.position
+    radius = shape.radius
+    if swept:
+      # The box around the shape at both ends of the step
+      left, top = shape.get_previous_position()
+      right, bottom = x, y
+      if left > right:
+        left, right = right, left
+      if top > bottom:
+        top, bottom = bottom, top
+      min_x, min_y, max_x, max_y = self.cell_box(left - radius, top - radius,
+                                                 right + radius, bottom + radius)
+    else:
+      min_x, min_y, max_x, max_y = self.cell_range(x, y, radius)
+    cells = self.cells
+    for cx in range(min_x, max_x + 1):
+      for cy in range(min_y, max_y + 1):
+        bucket = cells.get((cx, cy))
+        if bucket is None:
+          cells[(cx, cy)] = [shape]
+        else:
+          bucket.append(shape)
+
+  def rebuild(self, shapes: Iterable[CircleShape], swept: bool = False) -> None:
+    self.clear()
+    for shape in shapes:
+      self.insert(shape, swept)
+
+  def query(self, shape: CircleShape, swept: bool = False) -> list[CircleShape]:
+    if swept:
+      x, y, radius = shape.get_swept_circle()
+    else:
+      (x, y), radius = shape.position, shape.radius
+    min_x, min_y, max_x, max_y = self.cell_range(x, y, radius)
+    cells = self.cells
+
+    # A shape spanning several cells shows up in each of them; the dict keeps
+    # the first occurrence and preserves insertion order so results stay deterministic
+    found: dict[CircleShape, None] = {}
+    for cx in range(min_x, max_x + 1):
+      for cy in range(min_y, max_y + 1):
+        bucket = cells.get((cx, cy))
+        if bucket is not None:
+          for other in bucket:
+            found[other] = None
+    if not swept:
+      return list(found)
+
+    circles = self.swept_circles
+    overlapping = []
+    for other in found:
+      circle = circles.get(other)
+      if circle is None:
+        circle = circles[other] = other.get_swept_circle()
+      other_x, other_y, other_radius = circle
+      reach = radius + other_radius
+      if (other_x - x) ** 2 + (other_y - y) ** 2 <= reach * reach:
+        overlapping.append(other)
+    return overlapping
+
+  def candidate_pairs(self, shapes: Iterable[CircleShape],
+                      swept: bool = False) -> Iterable[tuple[CircleShape, CircleShape]]:
+    for shape in shapes:
+      for other in self.query(shape, swept):
+        yield other, shape
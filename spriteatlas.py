@@ -0,0 +1,117 @@
+import pygame
+from hero import Hero
+from bullet import BULLET_SIZE
+from mesh import asteroid_outline
+from constants import (
+  ASTEROID_SIZES,
+  ASTEROID_MIN_RADIUS,
+  ASTEROID_SHAPE_VARIANTS,
+  POLYGON_ASTEROIDS_ENABLED,
+  BULLET_RADIUS,
+  HERO_RADIUS,
+  HERO_ROTATION_STEPS,
+  OBJ_LINE_WIDTH,
+)
+
+
+def make_image(extent: int) -> pygame.Surface:
+  image = pygame.Surface((2 * extent + 1, 2 * extent + 1))
+  image.fill("black")
+  return image
+
+
+# Black is the background, so it doubles as the transparent color. Colorkeyed
+# RLE images blit much faster than per-pixel alpha ones. Converting to the
+# display's format isn't safe off the main thread
+def finish_image(image: pygame.Surface) -> pygame.Surface:
+  if pygame.display.get_surface() is not None:
+    image = image.convert()
+  image.set_colorkey("black", pygame.RLEACCEL)
+  return image
+
+
+# Every shape the game draws, rendered once up front. Images are centered on
+# their object's position, so an object at (x, y) is blitted at
+# (x - offset, y - offset). The shapes are only drawn onto plain surfaces
+# here, which may happen on a loader thread; finish() readies them for
+# blitting and has to run on the main thread before the atlas is used
+class SpriteAtlas:
+  # Indexed by size * ASTEROID_SHAPE_VARIANTS + variant: asteroids by their
+  # size and outline, bullets by BULLET_SIZE and variant 0
+  shape_images: list[pygame.Surface]
+  shape_offsets: list[int]
+  hero_images: list[pygame.Surface]
+  hero_offset: int
+  hero_steps: int
+
+  def __init__(self, hero_steps: int = HERO_ROTATION_STEPS) -> None:
+    self.shape_images = []
+    self.shape_offsets = []
+    for size in range(ASTEROID_SIZES + 1):
+      radius = BULLET_RADIUS if size == BULLET_SIZE else size * ASTEROID_MIN_RADIUS
+      extent = int(radius) + 1
+      circle = None
+      for variant in range(ASTEROID_SHAPE_VARIANTS):
+        if size != BULLET_SIZE and POLYGON_ASTEROIDS_ENABLED:
+          image = make_image(extent)
+          points = [(extent + x, extent + y) for x, y in asteroid_outline(size, variant)]
+          pygame.draw.polygon(image, "white", points, OBJ_LINE_WIDTH)
+        else:
+          # Circles look the same in every variant
+          if circle is None:
+            circle = make_image(extent)
+            pygame.draw.circle(circle, "white", (extent, extent), radius, OBJ_LINE_WIDTH)
+          image = circle
+        self.shape_images.append(image)
+        self.shape_offsets.append(extent)
+
+    # The triangle's back corners reach past the radius
+    self.hero_offset = int(HERO_RADIUS * 1.25) + OBJ_LINE_WIDTH
+    self.hero_steps = hero_steps
+    self.hero_images = []
+    center = pygame.Vector2(self.hero_offset, self.hero_offset)
+    for step in range(hero_steps):
+      image = make_image(self.hero_offset)
+      points = Hero.mesh_points(center, step * 360 / hero_steps, HERO_RADIUS)
+      pygame.draw.polygon(image, "white", points, OBJ_LINE_WIDTH)
+      self.hero_images.append(image)
+
+  def finish(self) -> "SpriteAtlas":
+    # Variants sharing an image keep sharing the finished one
+    finished: dict[int, pygame.Surface] = {}
+    def lookup(image: pygame.Surface) -> pygame.Surface:
+      if id(image) not in finished:
+        finished[id(image)] = finish_image(image)
+      return finished[id(image)]
+    self.shape_images = [lookup(image) for image in self.shape_images]
+    self.hero_images = [finish_image(image) for image in self.hero_images]
+    return self
+
+  def asteroid(self, size: int, variant: int, position: pygame.Vector2) -> tuple[pygame.Surface, tuple[float, float]]:
+    index = size * ASTEROID_SHAPE_VARIANTS + variant
+    offset = self.shape_offsets[index]
+    return self.shape_images[index], (position.x - offset, position.y - offset)
+
+  def bullet(self, position: pygame.Vector2) -> tuple[pygame.Surface, tuple[float, float]]:
+    return self.asteroid(BULLET_SIZE, 0, position)
+
+  def hero(self, rotation: float, position: pygame.Vector2) -> tuple[pygame.Surface, tuple[float, float]]:
+    step = round(rotation * self.hero_steps / 360) % self.hero_steps
+    offset = self.hero_offset
+    return self.hero_images[step], (position.x - offset, position.y - offset)
+
+  # Blit list for the rows of the entity store that show up on a screen of
+  # `size` whose top left is at `offset` in the world. Built from the store's
+  # arrays without touching the entities themselves
+  def store_blits(self, store, alpha: float = 1.0, offset: tuple[float, float] = (0.0, 0.0),
+                  size: tuple[int, int] | None = None) -> list[tuple[pygame.Surface, list[float]]]:
+    count = store.count
+    indices = store.sizes[:count] * ASTEROID_SHAPE_VARIANTS + store.shapes[:count]
+    positions = store.positions[:count] if alpha >= 1.0 else store.draw_positions(alpha)
+    extents = indices.choose(self.shape_offsets)[:, None]
+    top_lefts = positions - extents - offset
+    if size is not None:
+      visible = ((top_lefts > -2 * extents - 1) & (top_lefts < size)).all(axis=1)
+      indices, top_lefts = indices[visible], top_lefts[visible]
+    images = self.shape_images
+    return [(images[index], top_left) for index, top_left in zip(indices.tolist(), top_lefts.tolist())]
@@ -1,6 +1,53 @@
+import pygame
+from typing import TYPE_CHECKING
 from gamestatemanager import GameState
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, GAME_OVER_INPUT_DELAY
 
+if TYPE_CHECKING:
+  from main import Game
+  from vectorfont import TextStyle
 
+
+# Holds the last frame of the game that just ended until a key starts the next
 class GameOverState(GameState):
-  def __init__(self) -> None:
+  assets = ("font",)
+  next_states = ("main",)
+  game: "Game"
+  prompt_style: "TextStyle"
+  elapsed: float
+
+  def __init__(self, game: "Game") -> None:
     super().__init__("game_over")
+    self.game = game
+
+  def enter(self) -> None:
+    from vectorfont import TextStyle
+    style = self.game.font.default_style
+    self.prompt_style = TextStyle(size=20, aspect=0.75, weight=2, oblique=0,
+                                  spacing=pygame.Vector2(6, 6), color=style.color)
+    self.elapsed = 0.0
+
+  def handle_event(self, event: pygame.event.Event) -> None:
+    # Keys still being hammered from the game that just ended don't count
+    if event.type == pygame.KEYDOWN and self.elapsed >= GAME_OVER_INPUT_DELAY:
+      self.manager.switch("main")
+
+  def update(self, dt: float) -> None:
+    game = self.game
+    if game.replay is not None:
+      # Nobody is at the keyboard, and the recording goes on with the next game
+      self.manager.switch("main")
+      return
+    self.elapsed += dt
+
+    font = game.font
+    game.surface.fill("black")
+    game.draw_items(1.0)
+    font.centered_text("GAME OVER", pygame.Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT * 0.4))
+    if self.elapsed >= GAME_OVER_INPUT_DELAY:
+      font.centered_text("PRESS ANY KEY", pygame.Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT * 0.6),
+                         self.prompt_style)
+    game.dirty_rects = None
+
+  def exit(self) -> None:
+    pass
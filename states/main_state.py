@@ -1,6 +1,44 @@
+import pygame
+from typing import TYPE_CHECKING
 from gamestatemanager import GameState
 
+if TYPE_CHECKING:
+  from main import Game
 
+
+# Gameplay. Entering it after a game ended resets the world the last game
+# played in rather than building a new one
 class MainState(GameState):
-  def __init__(self) -> None:
+  game: "Game"
+
+  def __init__(self, game: "Game") -> None:
     super().__init__("main")
+    self.game = game
+    # Headless runs never see the game over screen
+    if not game.headless:
+      self.next_states = ("game_over",)
+
+  # Only drawing in atlas mode needs the atlas, so vector play never waits for
+  # it to render. Switching to atlas mode mid game preloads it then
+  @property
+  def assets(self) -> tuple[str, ...]:
+    if not self.game.headless and self.game.draw_mode == "atlas":
+      return ("atlas",)
+    return ()
+
+  def enter(self) -> None:
+    if self.game.reset_pending:
+      self.game.reset()
+
+  def handle_event(self, event: pygame.event.Event) -> None:
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+      self.game.keyboard.request_shot()
+
+  def update(self, dt: float) -> None:
+    game = self.game
+    game.advance(dt)
+    alpha = game.accumulator / game.step_dt if game.interpolation_enabled else 1.0
+    game.draw(alpha)
+
+  def exit(self) -> None:
+    pass
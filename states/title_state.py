@@ -1,6 +1,44 @@
+import pygame
+from typing import TYPE_CHECKING
 from gamestatemanager import GameState
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT
 
+if TYPE_CHECKING:
+  from main import Game
+  from vectorfont import TextStyle
 
+
+# The game's name until a key is pressed. The gameplay world isn't built yet,
+# and whatever the main state draws with loads in the background meanwhile
 class TitleState(GameState):
-  def __init__(self) -> None:
+  assets = ("font",)
+  next_states = ("main",)
+  game: "Game"
+  prompt_style: "TextStyle"
+
+  def __init__(self, game: "Game") -> None:
     super().__init__("title")
+    self.game = game
+
+  def enter(self) -> None:
+    # The font module is loaded by now, along with the font itself
+    from vectorfont import TextStyle
+    style = self.game.font.default_style
+    self.prompt_style = TextStyle(size=20, aspect=0.75, weight=2, oblique=0,
+                                  spacing=pygame.Vector2(6, 6), color=style.color)
+
+  def handle_event(self, event: pygame.event.Event) -> None:
+    if event.type == pygame.KEYDOWN:
+      self.manager.switch("main")
+
+  def update(self, dt: float) -> None:
+    game = self.game
+    font = game.font
+    game.surface.fill("black")
+    font.centered_text("BLASTEROIDS", pygame.Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT * 0.4))
+    font.centered_text("PRESS ANY KEY", pygame.Vector2(SCREEN_WIDTH / 2, SCREEN_HEIGHT * 0.6),
+                       self.prompt_style)
+    game.dirty_rects = None
+
+  def exit(self) -> None:
+    pass
@@ -0,0 +1,195 @@
+import io
+import math
+import heapq
+import random
+import contextlib
+from operator import itemgetter
+import numpy as np
+import pygame
+from typing import Any, Callable
+
+from main import Game
+from inputstate import Controls
+from constants import (
+  SCREEN_WIDTH,
+  SCREEN_HEIGHT,
+  WORLD_WIDTH,
+  WORLD_HEIGHT,
+  HEADLESS_DT,
+  MAX_BULLETS,
+  ASTEROID_MAX_RADIUS,
+)
+
+# Observation layout, per environment:
+#   hero       x, y (0..1 across the world), forward x, forward y, bullets in flight / MAX_BULLETS
+#   asteroids  the nearest OBSERVED_ASTEROIDS, closest first: offset x, offset y
+#              (in screen sizes), velocity x, velocity y (in VELOCITY_SCALE), radius / max
+#              radius. Missing asteroids are all zeros
+OBSERVED_ASTEROIDS = 8
+HERO_FEATURES = 5
+ASTEROID_FEATURES = 5
+OBSERVATION_SIZE = HERO_FEATURES + OBSERVED_ASTEROIDS * ASTEROID_FEATURES
+VELOCITY_SCALE = 100.0
+
+REWARD_ASTEROID_SHOT = 1.0
+REWARD_HERO_HIT = -10.0
+# Episodes nobody loses are cut off after this many steps
+DEFAULT_EPISODE_STEPS = 3600
+
+# Actions are rows of (turn, thrust, shoot): turn and thrust in {-1, 0, 1},
+# shoot 0 or 1. Turning +1 is the same as holding right
+ACTION_SIZE = 3
+
+
+def _controls_for(turn: int, thrust: int, shoot: int) -> Controls:
+  controls = Controls.NONE
+  if turn > 0:
+    controls |= Controls.RIGHT
+  elif turn < 0:
+    controls |= Controls.LEFT
+  if thrust > 0:
+    controls |= Controls.FORWARD
+  elif thrust < 0:
+    controls |= Controls.BACKWARD
+  if shoot:
+    controls |= Controls.SHOOT
+  return controls
+
+
+# Indexed by (turn + 1) * 6 + (thrust + 1) * 2 + shoot
+CONTROLS_TABLE = [_controls_for(turn, thrust, shoot)
+                  for turn in (-1, 0, 1) for thrust in (-1, 0, 1) for shoot in (0, 1)]
+
+
+# Input source whose controls are set from outside before each step
+class ActionInput:
+  controls: Controls
+
+  def __init__(self) -> None:
+    self.controls = Controls.NONE
+
+  def sample(self) -> Controls:
+    return self.controls
+
+
+# N headless games stepped in lockstep. Every step takes one action per game
+# and returns the observations, rewards and done flags of all of them as
+# arrays. A game whose hero is hit, or that runs out of steps, is reset on the
+# spot, so the observation returned with done=True is already the first one of
+# its next episode. Nothing is drawn unless render() is called
+class VecEnv:
+  num_envs: int
+  games: list[Game]
+  inputs: list[ActionInput]
+  episode_steps: int
+  rng: random.Random
+
+  observations: np.ndarray
+  rewards: np.ndarray
+  dones: np.ndarray
+
+  def __init__(self, num_envs: int, seed: int | None = None, entity_store: bool = False,
+               dt: float = HEADLESS_DT, episode_steps: int = DEFAULT_EPISODE_STEPS) -> None:
+    self.num_envs = num_envs
+    self.episode_steps = episode_steps
+    # Seeds each episode, so one seed pins down every episode of every game
+    self.rng = random.Random(seed)
+    self.inputs = [ActionInput() for _ in range(num_envs)]
+    self.games = []
+    self._shots = [0] * num_envs
+
+    # Every Game announces itself on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+      for i in range(num_envs):
+        game = Game(entity_store=entity_store, headless=True, seed=self.next_seed(), fixed_dt=dt)
+        game.input_source = self.inputs[i]
+        # Rendering, when asked for, always shows the latest step
+        game.interpolation_enabled = False
+        game.bus.subscribe("asteroid_shot", self._shot_counter(i))
+        game.running = True
+        self.games.append(game)
+
+    self.observations = np.zeros((num_envs, OBSERVATION_SIZE), dtype=np.float32)
+    self.rewards = np.zeros(num_envs, dtype=np.float32)
+    self.dones = np.zeros(num_envs, dtype=bool)
+
+  def next_seed(self) -> int:
+    return self.rng.randrange(2 ** 63)
+
+  def _shot_counter(self, index: int) -> Callable[..., None]:
+    def listener(**details: Any) -> None:
+      self._shots[index] += 1
+    return listener
+
+  def reset(self) -> np.ndarray:
+    for i, game in enumerate(self.games):
+      self.reset_game(i)
+      self.observe(i, game)
+    return self.observations.copy()
+
+  def reset_game(self, index: int) -> None:
+    game = self.games[index]
+    game.reset(self.next_seed())
+    game.running = True
+
+  def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, ACTION_SIZE)
+    turn = np.clip(actions[:, 0], -1, 1)
+    thrust = np.clip(actions[:, 1], -1, 1)
+    shoot = actions[:, 2] != 0
+    codes = ((turn + 1) * 6 + (thrust + 1) * 2 + shoot).tolist()
+
+    rewards = self.rewards
+    dones = self.dones
+    shots = self._shots
+    for i, game in enumerate(self.games):
+      # The game objects find their groups through class attributes
+      game.bind()
+      self.inputs[i].controls = CONTROLS_TABLE[codes[i]]
+      shots[i] = 0
+      game.step(game.step_dt)
+
+      hit = not game.running
+      done = hit or game.frame >= self.episode_steps
+      rewards[i] = shots[i] * REWARD_ASTEROID_SHOT + (REWARD_HERO_HIT if hit else 0.0)
+      dones[i] = done
+      if done:
+        self.reset_game(i)
+      self.observe(i, game)
+
+    return self.observations.copy(), rewards.copy(), dones.copy()
+
+  # A few dozen asteroids per game at most, which plain Python sorts through
+  # faster than NumPy gets going on arrays that small
+  def observe(self, index: int, game: Game) -> None:
+    hero = game.hero
+    hero_x, hero_y = hero.position
+    forward = hero.get_forward()
+    values = [hero_x / WORLD_WIDTH, hero_y / WORLD_HEIGHT, forward.x, forward.y,
+              hero.bullet_count / MAX_BULLETS]
+
+    candidates = []
+    for asteroid in game.asteroids:
+      x, y = asteroid.position
+      dx, dy = x - hero_x, y - hero_y
+      radius = asteroid.radius
+      candidates.append((math.hypot(dx, dy) - radius, dx, dy, asteroid.velocity, radius))
+    for _, dx, dy, velocity, radius in heapq.nsmallest(OBSERVED_ASTEROIDS, candidates,
+                                                      key=itemgetter(0)):
+      values += (dx / SCREEN_WIDTH, dy / SCREEN_HEIGHT, velocity.x / VELOCITY_SCALE,
+                 velocity.y / VELOCITY_SCALE, radius / ASTEROID_MAX_RADIUS)
+
+    row = self.observations[index]
+    row[:len(values)] = values
+    row[len(values):] = 0.0
+
+  # Draws one of the games onto the shared display surface and returns it
+  def render(self, index: int = 0) -> pygame.Surface:
+    game = self.games[index]
+    game.bind()
+    game.draw()
+    return game.surface
+
+  def close(self) -> None:
+    for game in self.games:
+      game.close_logs()
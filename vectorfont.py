@@ -1,9 +1,15 @@
+import os
+import math
+import struct
+import hashlib
 import pygame
 import pygame.gfxdraw
 import json
-from typing import Callable, TypedDict, cast
+from array import array
+from collections import OrderedDict
+from typing import Callable, Iterator, NamedTuple, TypedDict, cast
 from pathlib import Path
-from constants import TEXT_LINE_WIDTH
+from constants import TEXT_LINE_WIDTH, TEXT_CACHE_ENABLED, TEXT_CACHE_BUDGET_BYTES
 
 Point = list[float]
 VectorPath = list[Point]
@@ -18,6 +24,16 @@ JsonFont = dict[str, JsonGlyph]
 VectorStroke = tuple[pygame.Vector2, pygame.Vector2]
 VectorGlyph = list[VectorStroke]
 
+StyleKey = tuple[float, float, int, float, float, float, tuple[int, int, int, int]]
+
+# Compiled fonts sit next to their JSON source and are rebuilt whenever the
+# source's hash no longer matches the one stored in the header
+COMPILED_SUFFIX = ".vfc"
+COMPILED_MAGIC = b"VFNT"
+COMPILED_VERSION = 1
+COMPILED_HEADER = struct.Struct("<4sH32sII")  # magic, version, source sha256, glyphs, strokes
+COMPILED_ENTRY = struct.Struct("<III")        # code point, first stroke, stroke count
+
 DEFAULT_SPACING = pygame.Vector2(8, 8)
 DEFAULT_TEXT_COLOR = pygame.Color(255, 255, 255)
 
@@ -45,17 +61,175 @@ class TextStyle:
   def oblique_shift(self, y: float) -> float:
     return (self.oblique * self.aspect) * (1.0 - y)
 
+  # Styles are mutable, so cached renders are keyed by the values the style
+  # has right now rather than by the object itself
+  def cache_key(self) -> StyleKey:
+    return (self.size, self.aspect, self.weight, self.oblique,
+            self.spacing.x, self.spacing.y, tuple(self.color))
+
+
+class CachedText(NamedTuple):
+  surface: pygame.Surface
+  offset: pygame.Vector2  # from the text position to the surface's top left
+  size: int  # in bytes
+
+
+# Least recently used cache of pre-rendered strings, bounded by the total
+# byte size of the cached surfaces rather than by the number of entries
+class TextCache:
+  budget: int
+  used: int
+  entries: OrderedDict[tuple[str, StyleKey], CachedText]
+  hits: int
+  misses: int
+  evictions: int
+
+  def __init__(self, budget: int) -> None:
+    self.budget = budget
+    self.used = 0
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def get(self, key: tuple[str, StyleKey]) -> CachedText | None:
+    entry = self.entries.get(key)
+    if entry is None:
+      self.misses += 1
+      return None
+    self.entries.move_to_end(key)
+    self.hits += 1
+    return entry
+
+  def put(self, key: tuple[str, StyleKey], entry: CachedText) -> None:
+    if entry.size > self.budget:
+      return
+    previous = self.entries.pop(key, None)
+    if previous is not None:
+      self.used -= previous.size
+    self.entries[key] = entry
+    self.used += entry.size
+    while self.used > self.budget:
+      _, evicted = self.entries.popitem(last=False)
+      self.used -= evicted.size
+      self.evictions += 1
+
+  def clear(self) -> None:
+    self.entries.clear()
+    self.used = 0
+
+  def stats(self) -> dict[str, float]:
+    lookups = self.hits + self.misses
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "evictions": self.evictions,
+      "entries": len(self.entries),
+      "bytes": self.used,
+      "hit_rate": self.hits / lookups if lookups else 0.0,
+    }
+
+
+# Every stroke of every glyph as one flat run of doubles (x0, y0, x1, y1, already
+# y-flipped) plus a table of where each glyph's strokes start. Loading it is a
+# couple of bulk reads; Vector2 strokes are only built for glyphs that get used
+class CompiledFont:
+  table: dict[str, tuple[int, int]]
+  strokes: array
+
+  def __init__(self, table: dict[str, tuple[int, int]], strokes: array) -> None:
+    self.table = table
+    self.strokes = strokes
+
+  def __len__(self) -> int:
+    return len(self.table)
+
+  @classmethod
+  def from_glyphs(cls, glyphs: dict[str, VectorGlyph]) -> "CompiledFont":
+    table: dict[str, tuple[int, int]] = {}
+    strokes = array("d")
+    for key, glyph in glyphs.items():
+      table[key] = (len(strokes) // 4, len(glyph))
+      for p0, p1 in glyph:
+        strokes.extend((p0.x, p0.y, p1.x, p1.y))
+    return cls(table, strokes)
+
+  @classmethod
+  def load(cls, path: Path, digest: bytes) -> "CompiledFont | None":
+    try:
+      data = path.read_bytes()
+    except OSError:
+      return None
+    if len(data) < COMPILED_HEADER.size:
+      return None
+
+    magic, version, source_digest, glyph_count, stroke_count = COMPILED_HEADER.unpack_from(data)
+    if magic != COMPILED_MAGIC or version != COMPILED_VERSION or source_digest != digest:
+      return None
+    strokes_start = COMPILED_HEADER.size + glyph_count * COMPILED_ENTRY.size
+    if len(data) != strokes_start + stroke_count * 4 * 8:
+      return None
+
+    table = {
+      chr(code): (first, count)
+      for code, first, count in COMPILED_ENTRY.iter_unpack(data[COMPILED_HEADER.size:strokes_start])
+    }
+    strokes = array("d")
+    strokes.frombytes(data[strokes_start:])
+    return cls(table, strokes)
+
+  # Best effort: if the font directory is read-only we just compile again next time
+  def save(self, path: Path, digest: bytes) -> bool:
+    header = COMPILED_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION, digest,
+                                  len(self.table), len(self.strokes) // 4)
+    entries = b"".join(COMPILED_ENTRY.pack(ord(key), first, count)
+                       for key, (first, count) in self.table.items())
+    temp_path = path.with_name(path.name + ".tmp")
+    try:
+      temp_path.write_bytes(header + entries + self.strokes.tobytes())
+      os.replace(temp_path, path)
+    except OSError:
+      return False
+    return True
+
+  def glyph(self, key: str) -> VectorGlyph:
+    first, count = self.table[key]
+    s = self.strokes
+    return [
+      (pygame.Vector2(s[i], s[i + 1]), pygame.Vector2(s[i + 2], s[i + 3]))
+      for i in range(first * 4, (first + count) * 4, 4)
+    ]
+
+
+# Glyph lookup that builds each glyph from the compiled font on first use
+class LazyGlyphs(dict[str, VectorGlyph]):
+  compiled: CompiledFont
+
+  def __init__(self, compiled: CompiledFont) -> None:
+    super().__init__()
+    self.compiled = compiled
+
+  def __missing__(self, key: str) -> VectorGlyph:
+    glyph = self.compiled.glyph(key)
+    self[key] = glyph
+    return glyph
+
 
 class VectorFont:
   surface: pygame.Surface
   name: str
   glyphs: dict[str, VectorGlyph]
   default_style: TextStyle
+  cache: TextCache | None
 
   def __init__(self, surface: pygame.Surface, name: str, path: str) -> None:
     self.surface = surface
     self.name = name
     self.glyphs = {}
+    self.cache = TextCache(TEXT_CACHE_BUDGET_BYTES) if TEXT_CACHE_ENABLED else None
     self.default_style = TextStyle(size=80, aspect=1, weight=TEXT_LINE_WIDTH, oblique=1,
                                    spacing=DEFAULT_SPACING,
                                    color=DEFAULT_TEXT_COLOR)
@@ -64,10 +238,21 @@ class VectorFont:
     data_path = Path(__file__).with_name(path)
     # Intentionally not using a try-catch here. If something fails with loading,
     # then the UI will be broken one way or another, so let's just let the exception go uncaught
-    with open(data_path, "r") as font_file:
-      json_data = cast(JsonFont, json.load(font_file))
-      count = self.create_glyphs(json_data)
-      print(f"  Successfully created {count} glyphs")
+    source = data_path.read_bytes()
+    digest = hashlib.sha256(source).digest()
+    compiled_path = data_path.with_suffix(COMPILED_SUFFIX)
+
+    compiled = CompiledFont.load(compiled_path, digest)
+    if compiled is None:
+      json_data = cast(JsonFont, json.loads(source))
+      self.create_glyphs(json_data)
+      compiled = CompiledFont.from_glyphs(self.glyphs)
+      compiled.save(compiled_path, digest)
+
+    glyphs = LazyGlyphs(compiled)
+    glyphs.update(self.glyphs)
+    self.glyphs = glyphs
+    print(f"  Successfully created {len(compiled)} glyphs")
 
   def add(self, key: str, value: VectorGlyph) -> None:
     self.glyphs[key] = value
@@ -107,35 +292,95 @@ class VectorFont:
     return glyph
   
   def draw_char(self, char: str, pos: pygame.Vector2,
-                _style: TextStyle | None = None) -> None:
-    self.draw_glyph(self.glyphs[char], pos, _style)
+                _style: TextStyle | None = None,
+                _surface: pygame.Surface | None = None) -> None:
+    self.draw_glyph(self.glyphs[char], pos, _style, _surface)
   
   def draw_glyph(self, glyph: VectorGlyph, pos: pygame.Vector2,
-                 _style: TextStyle | None = None) -> None:
+                 _style: TextStyle | None = None,
+                 _surface: pygame.Surface | None = None) -> None:
     style: TextStyle = self.default_style if _style is None else _style
+    surface: pygame.Surface = self.surface if _surface is None else _surface
+    for p0, p1 in self.transform_glyph(glyph, pos, style):
+      if p0 == p1:
+        pygame.draw.circle(surface, style.color, p0, style.weight)
+      else:
+        pygame.draw.line(surface, style.color, p0, p1, style.weight)
+        # pygame.draw.circle(self.surface, style.color, p0, style.weight)
+        # pygame.draw.circle(self.surface, style.color, p1, style.weight)
+
+  def transform_glyph(self, glyph: VectorGlyph, pos: pygame.Vector2,
+                      style: TextStyle) -> Iterator[VectorStroke]:
     size = style.get_size_vector()
     for stroke in glyph:
       p0, p1 = stroke[0].copy(), stroke[1].copy()
       p0.x += style.oblique_shift(p0.y)
       p1.x += style.oblique_shift(p1.y)
       p0, p1 = p0.elementwise() * size, p1.elementwise() * size
-      p0, p1 = p0 + pos, p1 + pos
-      if p0 == p1:
-        pygame.draw.circle(self.surface, style.color, p0, style.weight)
-      else:
-        pygame.draw.line(self.surface, style.color, p0, p1, style.weight)
-        # pygame.draw.circle(self.surface, style.color, p0, style.weight)
-        # pygame.draw.circle(self.surface, style.color, p1, style.weight)
+      yield p0 + pos, p1 + pos
+
+  def transform_text(self, text: str, style: TextStyle) -> Iterator[VectorStroke]:
+    spacing = style.get_size_vector().x + style.spacing.x
+    for i, char in enumerate(text):
+      if char == " " or not char.isprintable():
+        continue
+      yield from self.transform_glyph(self.glyphs[char], pygame.Vector2(i * spacing, 0), style)
 
   def text(self, text: str, pos: pygame.Vector2,
-           _style: TextStyle | None = None) -> None:
+           _style: TextStyle | None = None,
+           _surface: pygame.Surface | None = None) -> None:
     style: TextStyle = self.default_style if _style is None else _style
+
+    if self.cache is not None:
+      surface: pygame.Surface = self.surface if _surface is None else _surface
+      key = (text, style.cache_key())
+      cached = self.cache.get(key)
+      if cached is None:
+        cached = self.render_text(text, style)
+        self.cache.put(key, cached)
+      surface.blit(cached.surface, pos + cached.offset)
+      return
+
     spacing = style.get_size_vector().x + style.spacing.x
     for i, char in enumerate(text):
       if char == " " or not char.isprintable():
         continue
       glyph_pos = pos + pygame.Vector2(i * spacing, 0)
-      self.draw_char(char, glyph_pos, _style)
+      self.draw_char(char, glyph_pos, _style, _surface)
+
+  # Draws the text centered on `center`, for titles and prompts
+  def centered_text(self, text: str, center: pygame.Vector2,
+                    _style: TextStyle | None = None,
+                    _surface: pygame.Surface | None = None) -> None:
+    style: TextStyle = self.default_style if _style is None else _style
+    size = style.get_size_vector()
+    width = len(text) * (size.x + style.spacing.x) - style.spacing.x
+    self.text(text, center - pygame.Vector2(width, size.y) / 2, _style, _surface)
+
+  # Draws the strokes once onto a transparent surface just big enough to hold
+  # them, so the string can be drawn again later with a single blit
+  def render_text(self, text: str, style: TextStyle) -> CachedText:
+    strokes = list(self.transform_text(text, style))
+    if not strokes:
+      return CachedText(pygame.Surface((0, 0), pygame.SRCALPHA), pygame.Vector2(), 0)
+
+    xs = [p.x for stroke in strokes for p in stroke]
+    ys = [p.y for stroke in strokes for p in stroke]
+    pad = style.weight + 1
+    left, top = math.floor(min(xs)) - pad, math.floor(min(ys)) - pad
+    width = math.ceil(max(xs)) + pad - left
+    height = math.ceil(max(ys)) + pad - top
+
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    origin = pygame.Vector2(left, top)
+    for p0, p1 in strokes:
+      p0, p1 = p0 - origin, p1 - origin
+      if p0 == p1:
+        pygame.draw.circle(surface, style.color, p0, style.weight)
+      else:
+        pygame.draw.line(surface, style.color, p0, p1, style.weight)
+
+    return CachedText(surface, origin, width * height * surface.get_bytesize())
 
   def demo(self, _style: TextStyle | None = None) -> None:
     style: TextStyle = self.default_style if _style is None else _style